@@ -0,0 +1,266 @@
+"""
+Admission control for the API.
+
+Every request is assigned a class. Cheap reads (historical, current, anomalies, ...)
+have priority over analyze requests, which fan out into LLM parses and upstream
+calls and are capped at ADMISSION_MAX_ANALYZE_CONCURRENCY. All classes share the
+global ADMISSION_MAX_CONCURRENCY, and each client may have at most
+ADMISSION_MAX_PER_CLIENT requests queued or running (429 beyond that). Clients are
+identified by peer address, or by X-Forwarded-For behind TRUSTED_PROXIES.
+
+When no slot is free, a request waits in a priority queue. It is shed right away
+with 503 and Retry-After if its estimated queue wait already exceeds its class's
+budget, and shed when it has actually waited that long.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import Dict, List, Optional, Tuple, Union
+import asyncio
+import itertools
+import logging
+import math
+import time
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.config import settings
+from app.api.encoding import EVENT_STREAM_PATHS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RequestClass:
+    name: str
+    priority: int  # Lower is served first
+    queue_budget: float  # Seconds a request may wait for a slot
+    max_concurrency: Optional[int] = None  # Cap on this class, within the global limit
+
+def default_classes() -> Dict[str, RequestClass]:
+    return {
+        "read": RequestClass("read", 0, settings.ADMISSION_READ_QUEUE_BUDGET_SECONDS),
+        "analyze": RequestClass(
+            "analyze", 1, settings.ADMISSION_ANALYZE_QUEUE_BUDGET_SECONDS,
+            max_concurrency=settings.ADMISSION_MAX_ANALYZE_CONCURRENCY
+        )
+    }
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Request class for a route, or None for routes that bypass admission control"""
+    # Event streams stay open indefinitely; the live update hub caps them instead
+    if not path.startswith("/api/") or path == "/api/metrics" or path in EVENT_STREAM_PATHS:
+        return None
+    if method == "POST" and path == "/api/weather/analyze":
+        return "analyze"
+    return "read"
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    request_class: RequestClass = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+class AdmissionController:
+    """Concurrency limits and a priority queue over request classes, for one event loop"""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_per_client: Optional[int] = None,
+        classes: Optional[Dict[str, RequestClass]] = None
+    ):
+        self.max_concurrency = max_concurrency or settings.ADMISSION_MAX_CONCURRENCY
+        self.max_per_client = max_per_client or settings.ADMISSION_MAX_PER_CLIENT
+        self.classes = classes or default_classes()
+        self.in_flight = 0
+        self.in_flight_by_class: Dict[str, int] = {name: 0 for name in self.classes}
+        self.by_client: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        # Exponentially weighted mean service time per class, for queue wait estimates
+        self._service_time: Dict[str, float] = {name: 0.05 for name in self.classes}
+        self.stats: Dict[str, int] = {"admitted": 0, "queued_total": 0, "shed": 0, "client_limited": 0}
+
+    def _has_capacity(self, request_class: RequestClass) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            return False
+        limit = request_class.max_concurrency
+        return limit is None or self.in_flight_by_class[request_class.name] < limit
+
+    def _admit(self, request_class: RequestClass) -> None:
+        self.in_flight += 1
+        self.in_flight_by_class[request_class.name] += 1
+        self.stats["admitted"] += 1
+
+    def _estimated_wait(self, request_class: RequestClass) -> float:
+        """Rough wait for a new request: work queued ahead of it spread over the slots it can use"""
+        ahead = sum(1 for waiter in self._waiters if waiter.priority <= request_class.priority)
+        slots = min(self.max_concurrency, request_class.max_concurrency or self.max_concurrency)
+        return (ahead + 1) * self._service_time[request_class.name] / slots
+
+    def _wake(self) -> None:
+        """Hand free slots to waiters in priority order, skipping classes at their cap"""
+        self._waiters.sort()
+        for waiter in list(self._waiters):
+            if self.in_flight >= self.max_concurrency:
+                break
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+            elif self._has_capacity(waiter.request_class):
+                self._waiters.remove(waiter)
+                self._admit(waiter.request_class)
+                waiter.future.set_result(True)
+
+    async def acquire(self, client: str, class_name: str) -> Tuple[str, str, float]:
+        """Wait for a slot. Returns a ticket for release(); raises Rejected when shed."""
+        request_class = self.classes[class_name]
+        if self.by_client.get(client, 0) >= self.max_per_client:
+            self.stats["client_limited"] += 1
+            raise Rejected(429, "Too many concurrent requests from this client", 1)
+        self.by_client[client] = self.by_client.get(client, 0) + 1
+        try:
+            queued_ahead = any(waiter.priority <= request_class.priority for waiter in self._waiters)
+            if not queued_ahead and self._has_capacity(request_class):
+                self._admit(request_class)
+                return client, class_name, time.monotonic()
+
+            estimate = self._estimated_wait(request_class)
+            if estimate > request_class.queue_budget:
+                self.stats["shed"] += 1
+                raise Rejected(503, "Server is busy", estimate)
+
+            self.stats["queued_total"] += 1
+            waiter = _Waiter(request_class.priority, next(self._sequence), request_class, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait({waiter.future}, timeout=request_class.queue_budget)
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            if not waiter.future.done():
+                self._abandon(waiter)
+                self.stats["shed"] += 1
+                raise Rejected(503, "Server is busy", max(self._estimated_wait(request_class), 1))
+            return client, class_name, time.monotonic()
+        except BaseException:
+            self._release_client(client)
+            raise
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            # Admitted just as the wait ended, give the slot back
+            self._release_slot(waiter.request_class.name)
+        else:
+            waiter.future.cancel()
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+
+    def _release_client(self, client: str) -> None:
+        remaining = self.by_client.get(client, 1) - 1
+        if remaining > 0:
+            self.by_client[client] = remaining
+        else:
+            self.by_client.pop(client, None)
+
+    def _release_slot(self, class_name: str) -> None:
+        self.in_flight -= 1
+        self.in_flight_by_class[class_name] -= 1
+        self._wake()
+
+    def release(self, ticket: Tuple[str, str, float]) -> None:
+        client, class_name, admitted_at = ticket
+        elapsed = time.monotonic() - admitted_at
+        self._service_time[class_name] = 0.8 * self._service_time[class_name] + 0.2 * elapsed
+        self._release_client(client)
+        self._release_slot(class_name)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "in_flight_by_class": dict(self.in_flight_by_class),
+            "queue_length": len(self._waiters),
+            "service_time_seconds": {name: round(value, 4) for name, value in self._service_time.items()},
+            **self.stats
+        }
+
+@lru_cache(maxsize=1)
+def _trusted_networks(proxies: Tuple[str, ...]) -> Tuple[Union[IPv4Network, IPv6Network], ...]:
+    networks = []
+    for proxy in proxies:
+        try:
+            networks.append(ip_network(proxy.strip(), strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid TRUSTED_PROXIES entry {proxy!r}")
+    return tuple(networks)
+
+def _is_trusted_proxy(address: str) -> bool:
+    networks = _trusted_networks(tuple(settings.TRUSTED_PROXIES))
+    if not networks:
+        return False
+    try:
+        ip = ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+def client_key(scope: Scope) -> str:
+    """
+    Identify the client by its peer address. X-Forwarded-For is only honoured when the
+    peer is one of TRUSTED_PROXIES, and then the right-most hop that is not a trusted
+    proxy is the client, since anything left of it may have been sent by the client.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _is_trusted_proxy(peer):
+        return peer
+    hops = [
+        hop.strip()
+        for name, value in scope.get("headers") or []
+        if name == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+        if hop.strip()
+    ]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying an AdmissionController to API requests"""
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        class_name = classify(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if class_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            ticket = await self.controller.acquire(client_key(scope), class_name)
+        except Rejected as e:
+            logger.warning(f"Rejected {scope['method']} {scope['path']} ({class_name}): {e.reason}")
+            response = JSONResponse(
+                {"detail": e.reason},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(ticket)
+
+# Create a singleton instance
+admission_controller = AdmissionController()
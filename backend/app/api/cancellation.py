@@ -0,0 +1,51 @@
+"""
+Cancellation of request handlers whose client has gone away.
+
+Starlette keeps running a handler after the client disconnects, so an abandoned
+analyze request would still go on to geocode, fetch and call upstream APIs.
+cancel_on_disconnect races the handler's work against the disconnect and cancels
+the work when the client leaves first. Stages that have not started yet never
+run; a blocking call already running in a worker thread finishes, but its result
+is discarded.
+"""
+from typing import Awaitable, TypeVar
+import asyncio
+import logging
+from fastapi import Request, Response
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# nginx's "client closed request"; the client never sees it, but it shows up in access logs
+CLIENT_CLOSED_REQUEST = 499
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnected before the work finished"""
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # Only used once the request body has been read, so no body messages are lost
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, cancelling it and raising ClientDisconnected if the client leaves first"""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            # Let the work unwind (release limits, close sessions) before responding
+            await asyncio.gather(work, return_exceptions=True)
+    if work in done:
+        return work.result()
+    logger.info(f"Client disconnected, cancelled {request.method} {request.url.path}")
+    raise ClientDisconnected()
+
+def client_closed_response() -> Response:
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
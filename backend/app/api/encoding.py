@@ -0,0 +1,188 @@
+"""
+Content negotiation for weather data responses.
+
+JSON rows (List[WeatherData]) remain the default. Clients can ask for a columnar
+body through the Accept header:
+  - application/vnd.apache.arrow.stream  Arrow IPC stream (requires pyarrow)
+  - application/msgpack                  columnar MessagePack (requires msgpack)
+  - application/vnd.weatherai.columnar+json  columnar JSON
+Columnar bodies are brotli-compressed when the client accepts `br` and brotli is
+installed; gzip is handled for every other response by StreamingGZipMiddleware,
+which leaves server-sent event streams uncompressed.
+"""
+from typing import List, Optional, Tuple
+import json
+import numpy as np
+import pandas as pd
+from fastapi import Request, Response
+from pydantic import BaseModel
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.weatherai.columnar+json"
+EVENT_STREAM = "text/event-stream"
+# Routes that answer with a long-lived server-sent event stream
+EVENT_STREAM_PATHS = ("/api/weather/stream",)
+
+# Media types served by this module, with the aliases clients commonly send
+_MEDIA_TYPE_ALIASES = {
+    ARROW_STREAM: ARROW_STREAM,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    JSON: JSON,
+    "application/*": JSON,
+    "*/*": JSON
+}
+
+def _available(media_type: str) -> bool:
+    if media_type == ARROW_STREAM:
+        return pa is not None
+    if media_type == MSGPACK:
+        return msgpack is not None
+    return True
+
+def _parse_header(value: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-style header into (token, q) pairs, highest q first"""
+    entries = []
+    for position, part in enumerate(value.split(",")):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        entries.append((token.lower(), q, position))
+    entries.sort(key=lambda entry: (-entry[1], entry[2]))
+    return [(token, q) for token, q, _ in entries]
+
+def negotiate_media_type(request: Request) -> str:
+    """Pick the response media type from the Accept header, defaulting to JSON rows"""
+    for token, q in _parse_header(request.headers.get("accept", "")):
+        if q <= 0:
+            continue
+        media_type = _MEDIA_TYPE_ALIASES.get(token)
+        if media_type and _available(media_type):
+            return media_type
+    return JSON
+
+def wants_brotli(request: Request) -> bool:
+    if brotli is None:
+        return False
+    return any(token == "br" and q > 0 for token, q in _parse_header(request.headers.get("accept-encoding", "")))
+
+def _column_values(series: pd.Series) -> list:
+    """Convert a column to a list of JSON/msgpack friendly values (NaN becomes None)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime("%Y-%m-%dT%H:%M:%S").tolist()
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        return np.where(np.isnan(values), None, values).tolist()
+    return series.tolist()
+
+def columnar_payload(frame: pd.DataFrame) -> dict:
+    """
+    Build {city, columns: {name: [values]}} from a columnar weather frame.
+    The city is hoisted out of the columns when the frame holds a single city.
+    """
+    columns = list(frame.columns)
+    city = None
+    if "city" in frame.columns and frame["city"].nunique() <= 1:
+        city = frame["city"].iloc[0] if len(frame) else None
+        columns.remove("city")
+    return {
+        "city": city,
+        "length": len(frame),
+        "columns": {column: _column_values(frame[column]) for column in columns}
+    }
+
+def records(frame: pd.DataFrame) -> List[dict]:
+    """JSON rows of a frame, encoded the way pydantic encodes the matching WeatherData fields"""
+    columns = [_column_values(frame[column]) for column in frame.columns]
+    return [dict(zip(frame.columns, values)) for values in zip(*columns)]
+
+def model_response(model: BaseModel, rows: Optional[pd.DataFrame] = None, headers: Optional[dict] = None) -> Response:
+    """
+    JSON response for a model whose `data` rows are given as a frame, skipping per-row
+    model construction and validation. Only the frame's columns are sent for each row.
+    """
+    body = model.model_dump(mode="json")
+    if rows is not None:
+        body["data"] = records(rows)
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type=JSON, headers=headers)
+
+def _encode_arrow(frame: pd.DataFrame) -> bytes:
+    # Drop the pandas schema metadata, non-Python clients have no use for it
+    table = pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata(None)
+    # Dictionary-encode repeated strings such as city and description
+    for name in ("city", "description", "icon"):
+        if name in table.column_names:
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode_frame(frame: pd.DataFrame, media_type: str) -> bytes:
+    """Encode a columnar weather frame in the given (non-default) media type"""
+    if media_type == ARROW_STREAM:
+        return _encode_arrow(frame)
+    if media_type == MSGPACK:
+        return msgpack.packb(columnar_payload(frame), use_bin_type=True)
+    if media_type == COLUMNAR_JSON:
+        return json.dumps(columnar_payload(frame), separators=(",", ":")).encode()
+    raise ValueError(f"Unsupported media type: {media_type}")
+
+def frame_response(
+    request: Request,
+    frame: pd.DataFrame,
+    media_type: str,
+    headers: Optional[dict] = None
+) -> Response:
+    """Build a Response for a columnar frame, brotli-compressed when the client accepts it"""
+    body = encode_frame(frame, media_type)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept, Accept-Encoding"
+    if wants_brotli(request):
+        body = brotli.compress(body)
+        headers["Content-Encoding"] = "br"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def response_variant(request: Request, media_type: str) -> str:
+    """Identify the representation for ETag purposes (media type plus content coding)"""
+    return f"{media_type};br" if media_type != JSON and wants_brotli(request) else media_type
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that skips event streams: gzip holds small writes back in its buffer,
+    so events would only reach the client once enough of them had piled up.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in EVENT_STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
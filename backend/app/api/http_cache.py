@@ -0,0 +1,41 @@
+from typing import Optional
+from datetime import date
+import hashlib
+import pandas as pd
+from fastapi import Request, Response
+from app.core.config import settings
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given parts (dataset version, request parameters, ...)"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match uses weak comparison, so ignore any W/ prefix
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    """Build an empty 304 response carrying the validators"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def is_past_range(end_date: Optional[str]) -> bool:
+    """Whether a date range ends strictly before today, so its data can no longer change"""
+    if not end_date:
+        return False
+    try:
+        return pd.to_datetime(end_date).date() < date.today()
+    except (ValueError, TypeError):
+        return False
+
+def cache_control_for_range(end_date: Optional[str]) -> str:
+    """Long-lived caching for fully-past ranges, revalidation for anything touching today"""
+    if is_past_range(end_date):
+        return f"public, max-age={settings.HTTP_CACHE_PAST_MAX_AGE}"
+    return "public, no-cache"
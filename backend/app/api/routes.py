@@ -1,18 +1,38 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import Optional, List
-from app.services.weather_service import WeatherService
-from app.models.weather import WeatherResponse, ForecastRequest, AnalysisResponse, WeatherData
-import os
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncIterator, Dict, Optional, List
+from datetime import date
+import asyncio
+import json
 import pandas as pd
-from pathlib import Path
-import random
+from app.api.encoding import JSON, EVENT_STREAM, negotiate_media_type, frame_response, model_response, records, response_variant
+from app.api.admission import admission_controller
+from app.api.cancellation import ClientDisconnected, cancel_on_disconnect, client_closed_response
+from app.api.http_cache import make_etag, etag_matches, not_modified, cache_control_for_range
+from app.core.config import settings
+from app.core.logging_config import logging_snapshot
+from app.services.weather_service import WeatherService
+from app.services.sample_queries import sample_query_pool
+from app.services.import_jobs import import_job_manager
+from app.services.climate_analytics import EVENT_KINDS
+from app.services.hourly_history import hourly_history
+from app.services.forecast_service import forecast_service
+from app.services.analysis_cache import analysis_cache
+from app.services.query_log import query_log
+from app.services.live_updates import TooManySubscribers, live_update_hub
+from app.utils.data_loader import data_manager, get_location_data
+from app.utils.circuit_breaker import circuit_snapshot
+from app.utils.downsampling import DOWNSAMPLE_METHODS
+from app.utils.rate_limiter import upstream_limits
+from app.models.weather import WeatherResponse, ForecastRequest, AnalysisResponse, WeatherData, AnomalyReport, HourlyWeather, ForecastData
+from app.models.jobs import ImportRequest, ImportJobStatus
 
 router = APIRouter()
 weather_service = WeatherService()
 
 @router.get("/weather/current", response_model=WeatherResponse)
 async def get_current_weather(
+    request: Request,
     city: str = Query(..., description="City name"),
     country: Optional[str] = Query(None, description="Country name (optional)")
 ):
@@ -20,156 +40,339 @@ async def get_current_weather(
     Get current weather for a specific city using OpenWeather API
     """
     try:
-        weather = await weather_service.get_current_weather(city, country)
+        weather = await cancel_on_disconnect(request, weather_service.get_current_weather(city, country))
         return weather
+    except ClientDisconnected:
+        return client_closed_response()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/weather/historical", response_model=List[WeatherData])
 async def get_historical_weather(
+    request: Request,
+    response: Response,
     city: str = Query(..., description="City name"),
     country: Optional[str] = Query(None, description="Country name (optional)"),
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    days: Optional[int] = Query(None, description="Number of days before end_date (used when start_date is not given)"),
+    points: Optional[int] = Query(
+        None, ge=3, le=settings.MAX_CHART_POINTS,
+        description="Downsample to at most this many points for charting"
+    ),
+    downsample: str = Query("lttb", description="Downsampling method when points is given: lttb or minmax")
 ):
     """
-    Get historical weather data for a specific city from CSV
+    Get historical weather data for a specific city from CSV.
+    Responses carry a strong ETag; fully-past ranges are cacheable for HTTP_CACHE_PAST_MAX_AGE.
+    Send an Arrow, msgpack or columnar JSON Accept header to get a columnar body instead of JSON rows.
+    Pass `points` to get a chart-ready series whose size does not grow with the range.
     """
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown downsampling method {downsample!r}")
+    
+    media_type = negotiate_media_type(request)
+    # Ranges relative to today change daily, so today's date is part of their identity
+    relative_to = None if end_date else date.today().isoformat()
+    etag = make_etag(
+        data_manager.dataset_version, response_variant(request, media_type),
+        city.lower().strip(), start_date, end_date, days, points, points and downsample, relative_to
+    )
+    cache_control = cache_control_for_range(end_date)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    
     try:
-        historical_data = await weather_service.get_historical_data(city, country, start_date, end_date)
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if media_type != JSON:
+            frame = await cancel_on_disconnect(request, weather_service.get_historical_columns(
+                city, start_date=start_date, end_date=end_date, days=days, points=points, method=downsample
+            ))
+            return frame_response(request, frame, media_type, headers)
+        
+        historical_data = await cancel_on_disconnect(request, weather_service.get_historical_data(
+            city, start_date=start_date, end_date=end_date, days=days, points=points, method=downsample
+        ))
+        response.headers.update(headers)
+        response.headers["Vary"] = "Accept, Accept-Encoding"
         return historical_data
+    except ClientDisconnected:
+        return client_closed_response()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/weather/forecast", response_model=List[ForecastData])
+async def get_weather_forecast(
+    request: Request,
+    city: str = Query(..., description="City name"),
+    days: int = Query(settings.FORECAST_DAYS, ge=1, le=settings.FORECAST_MAX_DAYS, description="Number of days to forecast")
+):
+    """
+    Get a forecast for the days after today: the ensemble median of each field with p10/p90
+    bands (e.g. temperatureP10, temperatureP90). Stations without stored history from the last
+    FORECAST_MAX_HISTORY_AGE_DAYS days are forecast from recent Meteostat history, or get a 404.
+    Station forecasts are precomputed after each dataset reload and served from memory.
+    Send an Arrow, msgpack or columnar JSON Accept header to get a columnar body instead of JSON rows.
+    """
+    media_type = negotiate_media_type(request)
+    # Forecasts for places that are not stations are remade daily, so today's date is part of their identity
+    etag = make_etag(
+        data_manager.dataset_version, settings.FORECAST_MODEL_VERSION, response_variant(request, media_type),
+        city.lower().strip(), days, date.today().isoformat()
+    )
+    cache_control = cache_control_for_range(None)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    
+    try:
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        frame = await cancel_on_disconnect(request, weather_service.get_forecast_columns(city, days))
+        if media_type != JSON:
+            return frame_response(request, frame, media_type, headers)
+        headers["Vary"] = "Accept, Accept-Encoding"
+        return Response(content=json.dumps(records(frame), separators=(",", ":")), media_type=JSON, headers=headers)
+    except ClientDisconnected:
+        return client_closed_response()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _naive_utc(value: str) -> pd.Timestamp:
+    """Parse a query time; hourly history is stored in naive UTC, so offset-aware times are converted to it"""
+    try:
+        stamp = pd.Timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time {value!r}, expected YYYY-MM-DD or an ISO 8601 time")
+    return stamp.tz_convert("UTC").tz_localize(None) if stamp.tzinfo else stamp
+
+@router.get("/weather/hourly", response_model=List[HourlyWeather])
+async def get_hourly_weather(
+    request: Request,
+    city: str = Query(..., description="City name"),
+    start: Optional[str] = Query(None, description="Start time, YYYY-MM-DD or ISO 8601, UTC (defaults to 24 hours before end)"),
+    end: Optional[str] = Query(None, description="End time, YYYY-MM-DD or ISO 8601, UTC (defaults to now)"),
+    resolution: str = Query("hourly", description="hourly, or daily for a rollup of the hours to days")
+):
+    """
+    Get hourly history for a city, fetched from Meteostat on first use and stored by station and month.
+    Only the months the range touches are read. Send a columnar Accept header to get a columnar body.
+    """
+    if resolution not in ("hourly", "daily"):
+        raise HTTPException(status_code=400, detail=f"Unknown resolution {resolution!r}")
+    end = _naive_utc(end) if end else pd.Timestamp.utcnow().tz_localize(None).floor("h")
+    start = _naive_utc(start) if start else end - pd.Timedelta(hours=24)
+    
+    try:
+        get_rows = hourly_history.get_daily if resolution == "daily" else hourly_history.get_hourly
+        rows, station = await cancel_on_disconnect(request, asyncio.to_thread(get_rows, city, start, end))
+        rows = rows.assign(city=station)
+        media_type = negotiate_media_type(request)
+        if media_type != JSON:
+            return frame_response(request, rows, media_type)
+        return Response(content=json.dumps(records(rows), separators=(",", ":")), media_type=JSON)
+    except ClientDisconnected:
+        return client_closed_response()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/weather/interpolated", response_model=List[WeatherData])
+async def get_interpolated_weather(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    days: Optional[int] = Query(None, description="Number of days before end_date (used when start_date is not given)"),
+    elevation: Optional[float] = Query(None, description="Elevation of the place in metres, for the temperature lapse-rate correction")
+):
+    """
+    Get daily conditions for any coordinate, interpolated from the nearest stored stations.
+    The X-Interpolation-Sources header lists the stations used with their distance and weight.
+    Send a columnar Accept header to get a columnar body.
+    """
+    try:
+        frame, sources = await cancel_on_disconnect(request, weather_service.get_interpolated_columns(
+            lat, lon, start_date=start_date, end_date=end_date, days=days, elevation=elevation
+        ))
+        headers = {"X-Interpolation-Sources": json.dumps(sources, separators=(",", ":"))}
+        media_type = negotiate_media_type(request)
+        if media_type != JSON:
+            return frame_response(request, frame, media_type, headers)
+        return Response(content=json.dumps(records(frame), separators=(",", ":")), media_type=JSON, headers=headers)
+    except ClientDisconnected:
+        return client_closed_response()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/weather/stream")
+def stream_live_weather(
+    cities: str = Query(..., description="Comma-separated station names")
+):
+    """
+    Subscribe to live updates for stations as server-sent events. Each station's latest
+    `daily` (stored day) and `current` (current conditions) events are sent right away,
+    then an event whenever either changes. Events carry the same id, event and data
+    fields as any EventSource stream; idle streams get a comment line as a heartbeat.
+    """
+    names = [name.strip() for name in cities.split(",") if name.strip()]
+    if not names:
+        raise HTTPException(status_code=400, detail="No cities given")
+    if len(names) > settings.LIVE_MAX_CITIES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.LIVE_MAX_CITIES} cities per stream")
+    stations, unknown = {}, []
+    for name in names:
+        location_data = get_location_data(name)
+        if location_data:
+            stations[location_data['name'].lower().strip()] = location_data['name']
+        else:
+            unknown.append(name)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown stations: {', '.join(unknown)}")
+    if live_update_hub.full:
+        raise HTTPException(status_code=503, detail="Too many live update subscribers", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        _live_stream(stations), media_type=EVENT_STREAM,
+        # Keep proxies from buffering or caching the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _live_stream(stations: Dict[str, str]) -> AsyncIterator[bytes]:
+    """Subscribe on the event loop the stream is served from, so updates are handed to it"""
+    try:
+        subscription = live_update_hub.subscribe(stations)
+    except TooManySubscribers:
+        # The response has started, so ask the client to come back later instead of a 503
+        yield b"retry: 30000\nevent: error\ndata: {\"detail\":\"Too many live update subscribers\"}\n\n"
+        return
+    async for chunk in live_update_hub.stream(subscription):
+        yield chunk
+
+@router.get("/weather/anomalies", response_model=AnomalyReport)
+async def get_weather_anomalies(
+    request: Request,
+    response: Response,
+    city: str = Query(..., description="City name"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    days: Optional[int] = Query(365, description="Number of days before end_date (used when start_date is not given)"),
+    kind: Optional[List[str]] = Query(None, description="Event kinds to include: heatwave, cold_snap, dry_spell"),
+    threshold: float = Query(2.0, gt=0, description="Minimum |z-score| for a day to count as anomalous")
+):
+    """
+    Get heatwaves, cold snaps, dry spells, anomalous days and record highs/lows for a city.
+    Served from precomputed climate analytics that are updated as new days are ingested.
+    """
+    unknown = set(kind or []) - set(EVENT_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown event kinds: {sorted(unknown)}")
+    
+    relative_to = None if end_date else date.today().isoformat()
+    etag = make_etag(
+        data_manager.dataset_version, "anomalies", city.lower().strip(),
+        start_date, end_date, days, sorted(kind or []), threshold, relative_to
+    )
+    cache_control = cache_control_for_range(end_date)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    
+    try:
+        report = weather_service.get_anomaly_report(
+            city, start_date=start_date, end_date=end_date, days=days, kinds=kind, threshold=threshold
+        )
+        response.headers.update({"ETag": etag, "Cache-Control": cache_control})
+        return report
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/weather/analyze", response_model=AnalysisResponse)
 async def analyze_weather(
-    request: ForecastRequest
+    request: ForecastRequest,
+    http_request: Request
 ):
     """
     Analyze weather data based on natural language query.
     This endpoint can handle both historical data from CSV and future forecasts.
     The query will be parsed using NLP to determine the type of analysis needed.
+    The analysis is cancelled if the client disconnects before it finishes.
+    Rows only carry the fields their format renders: all of them for the text card,
+    none for summaries, and the plotted or tabulated columns for charts and tables.
     """
     try:
-        analysis = await weather_service.analyze_weather(request)
+        analysis, rows = await cancel_on_disconnect(
+            http_request, weather_service.analyze_weather(request.query, request.points)
+        )
+        if rows is not None:
+            return model_response(analysis, rows)
         return analysis
+    except ClientDisconnected:
+        return client_closed_response()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/data/convert-parquet-to-csv")
-def convert_parquet_to_csv():
+@router.post("/data/import", response_model=ImportJobStatus, status_code=202)
+def start_dataset_import(request: ImportRequest):
     """
-    Convert daily_weather.parquet to daily_weather.csv in the data folder.
+    Start importing a Parquet file from the data folder into the weather dataset.
+    The import runs in the background; poll /data/import/{job_id} for progress.
     """
     try:
-        data_dir = Path(__file__).parent.parent.parent / "data"
-        parquet_file = data_dir / "daily_weather.parquet"
-        csv_file = data_dir / "daily_weather.csv"
-
-        if not parquet_file.exists():
-            return JSONResponse(status_code=404, content={"message": f"Parquet file not found at {parquet_file}"})
-
-        df = pd.read_parquet(parquet_file)
-        df.to_csv(csv_file, index=False)
-        return {"message": f"Conversion successful. CSV saved to {csv_file}"}
+        return import_job_manager.submit(request.path, stations_only=request.stations_only)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        return JSONResponse(status_code=500, content={"message": f"Error during conversion: {str(e)}"})
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/data/import/{job_id}", response_model=ImportJobStatus)
+def get_dataset_import(job_id: str):
+    """
+    Get the progress of a dataset import job.
+    """
+    job = import_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return job
 
 @router.get("/sample-queries", response_model=List[str])
-async def get_sample_queries():
+async def get_sample_queries(request: Request):
     """
-    Get dynamically generated sample queries using available city names from the weather data CSV.
-    Returns up to 8 diverse queries covering different use cases and formats.
+    Get sample queries built from the available station names.
+    Returns up to 8 diverse queries covering different use cases and formats,
+    served from a pregenerated pool that is refreshed when the dataset changes.
     """
     try:
-        data_dir = Path(__file__).parent.parent.parent / "data" / "weather"
-        csv_file = data_dir / "capital_cities_weather.csv"
-        if not csv_file.exists():
-            raise HTTPException(status_code=404, detail=f"Weather data file not found at {csv_file}")
-        df = pd.read_csv(csv_file)
-        # Get unique city names
-        cities = df['city'].dropna().unique().tolist()
-        # Select 4 cities if available, otherwise use all available cities
-        sample_cities = cities[:6] if len(cities) >= 4 else cities
-        print(f"Selected cities for sample queries: {sample_cities}")
-        
-        # Define query templates by category
-        query_templates = {
-            "current": [
-                "What's the current weather in {city}?",
-                "Show me today's weather in {city}",
-                "What's the weather like right now in {city}?",
-                "Give me the current temperature in {city}"
-            ],
-            "historical": [
-                "Show me the weather in {city} for the past {days} days",
-                "What was the weather like in {city} last week?",
-                "Show me historical weather data for {city} over the past {days} days",
-                "What were the temperature trends in {city} last month?"
-            ],
-            "forecast": [
-                "What's the weather forecast for {city} for the next {days} days?",
-                "Show me the {days}-day forecast for {city}",
-                "What's the temperature going to be in {city} this week?",
-                "Show me the precipitation forecast for {city} over the next {days} days"
-            ],
-            "format_specific": {
-                "table": [
-                    "Show me the weather in {city} for the next {days} days in a table format",
-                    "Display the temperature trends in {city} as a table",
-                    "Show me the weather data for {city} in a tabular format"
-                ],
-                "chart": [
-                    "Show me the temperature trends in {city} as a chart",
-                    "Display the precipitation forecast for {city} in a graph",
-                    "Show me the weather patterns in {city} as a visualization"
-                ],
-                "text": [
-                    "Give me a text summary of the weather in {city}",
-                    "Describe the weather conditions in {city}",
-                    "Tell me about the weather in {city}"
-                ],
-                "summary": [
-                    "Summarize the weather in {city} for the past week",
-                    "Give me a weather summary for {city}",
-                    "Provide a weather overview for {city}"
-                ]
-            }
-        }
-        
-        # Define time periods and formats
-        days = [3, 5, 7]
-        formats = ["table", "chart", "text", "summary"]
-        
-        queries = []
-        
-        # Generate queries for each city
-        for city in sample_cities:
-            # Add one query from each category
-            queries.append(random.choice(query_templates["current"]).format(city=city))
-            
-            # Add historical query
-            queries.append(random.choice(query_templates["historical"]).format(
-                city=city,
-                days=random.choice(days)
-            ))
-            
-            # Add forecast query
-            queries.append(random.choice(query_templates["forecast"]).format(
-                city=city,
-                days=random.choice(days)
-            ))
-            
-            # Add format-specific query
-            format_type = random.choice(formats)
-            queries.append(random.choice(query_templates["format_specific"][format_type]).format(
-                city=city,
-                days=random.choice(days)
-            ))
-        
-        # Shuffle and limit the number of queries
-        random.shuffle(queries)
-        return queries[:8]  # Return 8 diverse queries
-        
+        tag, body = sample_query_pool.current()
+        etag = f'"{tag}"'
+        cache_control = f"public, max-age={sample_query_pool.seconds_until_rotation()}"
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": cache_control}
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Get the state of the upstream circuit breakers, admission control, upstream rate limits,
+    the forecast and analysis caches, the most asked queries, live update subscribers and the log queue.
+    """
+    return {
+        "circuit_breakers": circuit_snapshot(),
+        "admission": admission_controller.snapshot(),
+        "rate_limits": {name: round(bucket.available, 2) for name, bucket in upstream_limits.items()},
+        "forecasts": forecast_service.snapshot(),
+        "analyses": analysis_cache.snapshot(),
+        "queries": query_log.snapshot(),
+        "live_updates": live_update_hub.snapshot(),
+        "logging": logging_snapshot()
+    }
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # API Settings
@@ -8,17 +8,123 @@ class Settings(BaseSettings):
     
     # Weather API Settings
     OPENWEATHER_API_KEY: Optional[str] = None
+    OPENWEATHER_BASE_URL: str = "https://api.openweathermap.org/data/2.5"
+    OPENWEATHER_GEO_URL: str = "https://api.openweathermap.org/geo/1.0"
+    OPENWEATHER_RATE_LIMIT_PER_MINUTE: int = 60
+    
+    # Geocode Cache Settings
+    GEOCODE_CACHE_FILE: str = "cache/geocode_cache.json"
+    GEOCODE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    GEOCODE_NEGATIVE_TTL_SECONDS: int = 3600
+    
+    # Current Weather Prefetch Settings
+    CURRENT_WEATHER_REFRESH_SECONDS: int = 600
+    CURRENT_WEATHER_MAX_CONCURRENCY: int = 8
     
     # OpenRouter API Settings
     OPENROUTER_API_KEY: Optional[str] = None
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+    OPENROUTER_RATE_LIMIT_PER_MINUTE: int = 20
+    
+    # Meteostat bulk data endpoint (None keeps the library default)
+    METEOSTAT_ENDPOINT: Optional[str] = None
+    METEOSTAT_RATE_LIMIT_PER_MINUTE: int = 120
+    
+    # How long a call may wait for its upstream's rate limit before giving up
+    UPSTREAM_ACQUIRE_TIMEOUT_SECONDS: float = 5.0
+    OPENROUTER_TIMEOUT_SECONDS: float = 20.0
+    OPENWEATHER_TIMEOUT_SECONDS: float = 10.0
+    
+    # Circuit Breaker Settings (per upstream, over a sliding window of calls)
+    CIRCUIT_WINDOW_CALLS: int = 20
+    CIRCUIT_MIN_CALLS: int = 5
+    CIRCUIT_FAILURE_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 5.0
+    CIRCUIT_LLM_SLOW_CALL_SECONDS: float = 10.0
+    CIRCUIT_SLOW_CALL_RATE: float = 0.5
+    CIRCUIT_OPEN_SECONDS: float = 30.0
+    
+    # Admission Control Settings
+    ADMISSION_MAX_CONCURRENCY: int = 64
+    ADMISSION_MAX_ANALYZE_CONCURRENCY: int = 8
+    ADMISSION_MAX_PER_CLIENT: int = 8
+    ADMISSION_READ_QUEUE_BUDGET_SECONDS: float = 0.5
+    ADMISSION_ANALYZE_QUEUE_BUDGET_SECONDS: float = 2.0
+    # Proxy addresses or networks (e.g. "10.0.0.0/8") whose X-Forwarded-For is trusted
+    TRUSTED_PROXIES: List[str] = []
+    
+    # Warm-up Settings (run in the background at startup, /readyz reports when done)
+    WARMUP_ENABLED: bool = True
+    WARMUP_TOP_CITIES: int = 10
     
     # Model Settings
     FORECAST_DAYS: int = 7
+    # Bump when the forecasting engine or ensemble size changes, so cached forecasts are recomputed
+    FORECAST_MODEL_VERSION: str = "moving-average-ensemble-1"
+    # Members drawn per forecast for the p10/p50/p90 bands (1 for a single draw without bands)
+    FORECAST_ENSEMBLE_MEMBERS: int = 200
+    FORECAST_HISTORY_DAYS: int = 30
+    # Forecasts start tomorrow; history ending longer ago than this is not forecast from
+    FORECAST_MAX_HISTORY_AGE_DAYS: int = 10
+    FORECAST_MAX_DAYS: int = 30
+    # Horizons precomputed for every station after each dataset reload
+    FORECAST_PRECOMPUTE_HORIZONS: List[int] = [7, 14]
+    FORECAST_CACHE_SIZE: int = 512
     DEFAULT_CITY: str = "London"
     
     # Data Settings
     DATA_DIR: str = "data"
     HISTORICAL_DATA_FILE: str = "capital_cities_weather.csv"
+    NEAREST_STATION_MAX_KM: float = 50.0
+    IMPORT_BATCH_ROWS: int = 65536
+    
+    # Spatial Interpolation Settings (inverse-distance weighting over the nearest stations)
+    INTERPOLATION_NEIGHBOURS: int = 4
+    INTERPOLATION_POWER: float = 2.0
+    INTERPOLATION_MAX_KM: float = 500.0
+    # Temperature lapse rate used to bring station temperatures to the target elevation
+    LAPSE_RATE_C_PER_KM: float = 6.5
+    
+    # Hourly History Settings (partitioned by station and month under DATA_DIR)
+    HOURLY_DATA_DIR: str = "weather/hourly"
+    HOURLY_PARTITION_CACHE_SIZE: int = 48
+    # Partitions written before their month ended are refetched once older than this
+    HOURLY_REFRESH_SECONDS: int = 3600
+    HOURLY_MAX_DAYS: int = 92
+    
+    # Chart Settings (points per chart after downsampling)
+    CHART_POINT_BUDGET: int = 500
+    MAX_CHART_POINTS: int = 5000
+    
+    # Live Update Settings (server-sent events when a city's current conditions or latest stored day change)
+    LIVE_MAX_SUBSCRIBERS: int = 5000
+    LIVE_MAX_CITIES: int = 50
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+    
+    # Query Log Settings (daily counts of parsed queries under DATA_DIR, used to pre-warm answers)
+    QUERY_LOG_FILE: str = "cache/query_log.json"
+    QUERY_LOG_DAYS: int = 7
+    # Distinct queries kept per day; the least asked are dropped first
+    QUERY_LOG_MAX_ENTRIES: int = 1000
+    QUERY_LOG_SAVE_SECONDS: int = 60
+    # Most-asked queries answered ahead of traffic at startup and after each dataset reload
+    QUERY_PREWARM_TOP_N: int = 20
+    QUERY_PREWARM_BUDGET_SECONDS: float = 30.0
+    ANALYSIS_CACHE_SIZE: int = 256
+    
+    # Logging Settings (records are written by a background thread; LOG_FORMAT is json or text)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    # Per-logger levels, e.g. {"app.utils.nlp_parser": "DEBUG", "uvicorn.access": "WARNING"}
+    LOG_LEVELS: Dict[str, str] = {}
+    # Records beyond this many waiting to be written are dropped and counted
+    LOG_QUEUE_SIZE: int = 10000
+    # Response and payload dumps are logged at most once per interval per call site, truncated
+    LOG_PAYLOAD_INTERVAL_SECONDS: float = 60.0
+    LOG_PAYLOAD_MAX_CHARS: int = 2000
+    
+    # HTTP Caching Settings
+    HTTP_CACHE_PAST_MAX_AGE: int = 7 * 24 * 3600
     
     class Config:
         case_sensitive = True
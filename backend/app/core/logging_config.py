@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else on a record came from `extra` and is logged as a field.
+# uvicorn passes a colored copy of its messages as `color_message`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName", "color_message"}
+# Loggers that uvicorn configures with handlers of its own
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the queue is full the record is
+    dropped and counted instead of waiting for the writer to catch up.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here, where the arguments are still valid,
+        # but leave the rest of the record for the writer's formatter
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class PayloadLimiter:
+    """Allows one payload log per key per interval, counting the ones it suppresses"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: Dict[str, float] = {}
+        self._suppressed: Dict[str, int] = {}
+
+    def allow(self, key: str) -> Optional[int]:
+        """The number suppressed since the last allowed one, or None if this one is suppressed"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < settings.LOG_PAYLOAD_INTERVAL_SECONDS:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return None
+            self._last[key] = now
+            return self._suppressed.pop(key, 0)
+
+_payload_limiter = PayloadLimiter()
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def log_payload(logger: logging.Logger, label: str, payload: Any, level: int = logging.DEBUG) -> None:
+    """
+    Log a response or payload dump, rate limited per logger and label and truncated to
+    LOG_PAYLOAD_MAX_CHARS. Nothing is serialized when the level is disabled.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    suppressed = _payload_limiter.allow(f"{logger.name}:{label}")
+    if suppressed is None:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str, ensure_ascii=False)
+    truncated = len(text) > settings.LOG_PAYLOAD_MAX_CHARS
+    logger.log(level, f"{label}: {text[:settings.LOG_PAYLOAD_MAX_CHARS]}", extra={
+        "payload_chars": len(text),
+        "payload_truncated": truncated,
+        "payload_suppressed": suppressed
+    })
+
+def configure_logging() -> None:
+    """
+    Route every log record through a bounded queue to a background writer thread, so
+    requests never wait on stdout. Also takes over uvicorn's loggers. Safe to call twice.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        writer.setFormatter(JsonFormatter())
+    else:
+        writer.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, writer, respect_handler_level=False)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name in UVICORN_LOGGERS:
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Write out the records still queued and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def logging_snapshot() -> dict:
+    if _queue_handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped
+    }
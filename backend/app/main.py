@@ -1,14 +1,46 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router as api_router
+from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.logging_config import configure_logging, shutdown_logging
+
+# Hand log records to a background writer before the services below start logging
+configure_logging()
+
+from app.api.admission import AdmissionControlMiddleware
+from app.api.encoding import StreamingGZipMiddleware
+from app.api.routes import router as api_router, weather_service
+from app.services.current_weather_prefetcher import current_weather_prefetcher
+from app.services.warmup import warmup
+from app.services.query_log import query_log
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep current conditions for all stations in memory
+    current_weather_prefetcher.start()
+    # Warm caches in the background; /readyz reports 503 until this is done
+    if settings.WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warmup.run, weather_service))
+    else:
+        warmup.mark_ready()
+    yield
+    current_weather_prefetcher.stop()
+    query_log.save()
+    shutdown_logging()
 
 app = FastAPI(
     title="WeatherAI API",
     description="AI-powered weather forecasting and analysis API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Limit concurrency per client and overall, shedding load when the queue gets too long.
+# Added first so it runs innermost and its 429/503 responses still get CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -18,9 +50,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses for clients that accept gzip, except event streams
+app.add_middleware(StreamingGZipMiddleware, minimum_size=1024)
+
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to WeatherAI API"} 
\ No newline at end of file
+    return {"message": "Welcome to WeatherAI API"}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the worker has finished warming up and should get traffic"""
+    status = warmup.status()
+    return JSONResponse(
+        {"status": "ready" if status["ready"] else "warming_up", **status},
+        status_code=200 if status["ready"] else 503
+    )
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ImportRequest(BaseModel):
+    path: str = "daily_weather.parquet"  # Relative to the data directory
+    stations_only: bool = True  # Only import rows for the configured stations
+
+class ImportJobStatus(BaseModel):
+    job_id: str
+    source: str
+    status: str  # pending, running, completed, failed
+    total_rows: Optional[int] = None
+    rows_read: int = 0
+    rows_imported: int = 0
+    row_groups_done: int = 0
+    row_groups_total: Optional[int] = None
+    progress: float = 0.0
+    dataset_version: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
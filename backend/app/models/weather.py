@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -18,6 +18,35 @@ class WeatherData(BaseModel):
         alias_generator=lambda s: ''.join([w.capitalize() if i else w for i, w in enumerate(s.split('_'))])
     )
 
+class ForecastData(WeatherData):
+    """A forecast day: the ensemble median, with its p10/p90 band when the forecast is an ensemble"""
+    temperatureP10: Optional[float] = None
+    temperatureP90: Optional[float] = None
+    humidityP10: Optional[float] = None
+    humidityP90: Optional[float] = None
+    windSpeedP10: Optional[float] = None
+    windSpeedP90: Optional[float] = None
+    pressureP10: Optional[float] = None
+    pressureP90: Optional[float] = None
+
+class HourlyWeather(BaseModel):
+    """An hour of hourly history, or a day of its daily rollup (with min/max temperature)"""
+    time: datetime
+    temperature: Optional[float] = None
+    min_temperature: Optional[float] = None
+    max_temperature: Optional[float] = None
+    dew_point: Optional[float] = None
+    humidity: Optional[float] = None
+    precipitation: Optional[float] = None
+    snow: Optional[float] = None
+    wind_direction: Optional[float] = None
+    wind_speed: Optional[float] = None
+    wind_gust: Optional[float] = None
+    pressure: Optional[float] = None
+    sunshine: Optional[float] = None
+    condition_code: Optional[float] = None
+    city: str
+
 class WeatherResponse(BaseModel):
     forecast: List[WeatherData]
     city: str
@@ -28,8 +57,49 @@ class ForecastRequest(BaseModel):
     city: Optional[str] = None
     format: Optional[str] = None  # text, table, or chart
     days: Optional[int] = 7
+    points: Optional[int] = Field(None, ge=3)  # Point budget for chart answers
+
+class CityAggregate(BaseModel):
+    city: str
+    rank: int
+    days: int
+    avg_temperature: Optional[float] = None
+    max_temperature: Optional[float] = None
+    min_temperature: Optional[float] = None
+    total_precipitation: Optional[float] = None
+    avg_wind_speed: Optional[float] = None
+    avg_pressure: Optional[float] = None
+
+class WeatherEvent(BaseModel):
+    kind: str  # heatwave, cold_snap, or dry_spell
+    start: datetime
+    end: datetime
+    days: int
+    peak: Optional[float] = None  # Hottest max / coldest min temperature, or total precipitation for dry spells
+
+class TemperatureAnomaly(BaseModel):
+    date: datetime
+    temperature: float
+    normal: float  # Day-of-year climatological mean
+    zscore: float
+
+class ClimateRecord(BaseModel):
+    value: float
+    date: datetime
+
+class AnomalyReport(BaseModel):
+    city: str
+    start_date: datetime
+    end_date: datetime
+    events: List[WeatherEvent]
+    anomalies: List[TemperatureAnomaly]
+    record_high: Optional[ClimateRecord] = None
+    record_low: Optional[ClimateRecord] = None
 
 class AnalysisResponse(BaseModel):
     data: List[WeatherData]
     format: Optional[str] = None  # None, text, table, or chart
-    chart_url: Optional[str] = None 
\ No newline at end of file
+    chart_url: Optional[str] = None
+    text_summary: Optional[str] = None
+    comparison: Optional[List[CityAggregate]] = None  # Side-by-side aggregates for multi-city queries
+    anomalies: Optional[AnomalyReport] = None  # Extreme events and anomalous days for event queries 
\ No newline at end of file
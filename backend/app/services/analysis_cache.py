@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+import logging
+import threading
+import pandas as pd
+from app.core.config import settings
+from app.models.weather import AnalysisResponse
+from app.services.query_log import QueryKey
+from app.utils.geocode_cache import GeocodeCache
+from app.utils.data_loader import data_manager
+
+logger = logging.getLogger(__name__)
+
+# Intents whose answers depend only on their QueryKey, the data and the day
+CACHEABLE_INTENTS = ('forecast', 'historical')
+# (query, chart points, dataset version, forecast model version, day)
+AnalysisKey = Tuple[QueryKey, Optional[int], str, str, str]
+Analysis = Tuple[AnalysisResponse, Optional[pd.DataFrame]]
+
+class AnalysisCache:
+    """
+    LRU cache of /api/weather/analyze answers for forecast and historical queries.
+
+    Answers are keyed on the normalized query and chart points, plus the dataset version,
+    forecast model version and day, so a reload, a new model or a new day (which moves
+    relative ranges such as "the last 7 days") is never served an old answer.
+    Cached answers are shared and must not be modified.
+    """
+
+    def __init__(self, size: Optional[int] = None):
+        self.size = size or settings.ANALYSIS_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[AnalysisKey, Analysis]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "prewarmed": 0}
+
+    @staticmethod
+    def key(query: QueryKey, points: Optional[int] = None) -> Optional[AnalysisKey]:
+        """The cache key of a query, or None if its answer is not cacheable"""
+        if query.intent not in CACHEABLE_INTENTS:
+            return None
+        return (
+            query._replace(location=GeocodeCache.normalize(query.location)), points,
+            data_manager.dataset_version, settings.FORECAST_MODEL_VERSION, date.today().isoformat()
+        )
+
+    def get(self, key: AnalysisKey) -> Optional[Analysis]:
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+            self.stats["hits" if analysis is not None else "misses"] += 1
+            return analysis
+
+    def put(self, key: AnalysisKey, analysis: Analysis, prewarmed: bool = False) -> None:
+        with self._lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+            if prewarmed:
+                self.stats["prewarmed"] += 1
+
+    def __contains__(self, key: AnalysisKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), **self.stats}
+
+# Create a singleton instance
+analysis_cache = AnalysisCache()
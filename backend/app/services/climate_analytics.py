@@ -0,0 +1,296 @@
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from app.utils.data_loader import data_manager, TimeSeriesDataManager
+
+logger = logging.getLogger(__name__)
+
+# Days either side of a day-of-year pooled into its climatology
+CLIMATOLOGY_WINDOW_DAYS = 7
+# Event definitions: daily temperature z-score runs and precipitation runs
+HEATWAVE_Z = 1.5
+COLD_SNAP_Z = -1.5
+TEMPERATURE_RUN_DAYS = 3
+DRY_DAY_PRECIPITATION_MM = 1.0
+DRY_SPELL_RUN_DAYS = 14
+# How far before the first new day events are re-detected, so runs spanning
+# the previous end of the data are extended rather than duplicated
+EVENT_LOOKBACK_DAYS = 60
+
+EVENT_KINDS = ('heatwave', 'cold_snap', 'dry_spell')
+# Columns the analytics are computed from; a change to any of them in an already
+# processed day means the city has to be rebuilt
+SOURCE_COLUMNS = ('date', 'city', 'temperature', 'min_temperature', 'max_temperature', 'precipitation')
+
+class ClimateAnalytics:
+    """
+    Precomputed climatology, extreme events and records over the historical store.
+
+    Per-city day-of-year sums are kept as accumulators, so ingesting new days only
+    touches the new rows: the climatology is refreshed from the accumulators, events
+    are re-detected over a short window around the new days, and records are compared
+    against the new rows. Queries are then lookups into these tables.
+
+    A fingerprint of each city's processed rows tells appended days apart from
+    back-filled or corrected ones; a city whose processed rows changed is rebuilt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        # (city_key, day_of_year) -> count, sum, sum of squares of daily mean temperature
+        self._accumulators = pd.DataFrame(columns=['count', 'sum', 'sumsq'], dtype=float)
+        self._climatology = pd.DataFrame(columns=['mean', 'std'], dtype=float)
+        self._processed_until: Dict[str, pd.Timestamp] = {}
+        # city_key -> (row count, hash sum) of the rows processed so far
+        self._fingerprints: Dict[str, Tuple[int, int]] = {}
+        self._events = pd.DataFrame(columns=['city_key', 'city', 'kind', 'start', 'end', 'days', 'peak'])
+        self._records: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _day_of_year(dates: pd.Series) -> np.ndarray:
+        # Fold Feb 29 into Feb 28 so every year has 365 slots
+        doy = dates.dt.dayofyear.to_numpy()
+        leap_shift = dates.dt.is_leap_year.to_numpy() & (doy > 59)
+        return doy - leap_shift
+
+    def _update_accumulators(self, rows: pd.DataFrame) -> None:
+        valid = rows.dropna(subset=['temperature'])
+        if valid.empty:
+            return
+        temperature = valid['temperature'].to_numpy()
+        update = pd.DataFrame({
+            'city_key': valid['city_key'].to_numpy(),
+            'doy': self._day_of_year(valid['date']),
+            'count': np.ones(len(valid)),
+            'sum': temperature,
+            'sumsq': np.square(temperature)
+        }).groupby(['city_key', 'doy']).sum()
+        self._accumulators = update.add(self._accumulators, fill_value=0.0) if not self._accumulators.empty else update
+
+    def _refresh_climatology(self) -> None:
+        """Smoothed day-of-year mean and standard deviation per city, from the accumulators"""
+        frames = []
+        offsets = np.arange(-CLIMATOLOGY_WINDOW_DAYS, CLIMATOLOGY_WINDOW_DAYS + 1)
+        for city_key, table in self._accumulators.groupby(level='city_key'):
+            table = table.droplevel('city_key').reindex(np.arange(1, 366), fill_value=0.0)
+            values = table.to_numpy()
+            # Circular window sum over the day-of-year axis
+            pooled = sum(np.roll(values, shift, axis=0) for shift in offsets)
+            count, total, total_sq = pooled[:, 0], pooled[:, 1], pooled[:, 2]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / count
+                variance = np.maximum(total_sq / count - mean ** 2, 0.0) * count / (count - 1)
+            frames.append(pd.DataFrame({
+                'city_key': city_key,
+                'doy': np.arange(1, 366),
+                'mean': mean,
+                'std': np.sqrt(variance)
+            }))
+        if frames:
+            self._climatology = pd.concat(frames).set_index(['city_key', 'doy'])
+
+    def _zscores(self, rows: pd.DataFrame) -> np.ndarray:
+        keys = pd.MultiIndex.from_arrays([rows['city_key'].to_numpy(), self._day_of_year(rows['date'])])
+        climatology = self._climatology.reindex(keys)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (rows['temperature'].to_numpy() - climatology['mean'].to_numpy()) / climatology['std'].to_numpy()
+
+    @staticmethod
+    def _find_runs(rows: pd.DataFrame, flag: np.ndarray, min_days: int, kind: str, peak_column: str, peak: str) -> pd.DataFrame:
+        """Find runs of consecutive flagged days per city, vectorized over all cities"""
+        if rows.empty:
+            return pd.DataFrame(columns=['city_key', 'city', 'kind', 'start', 'end', 'days', 'peak'])
+        flag = pd.Series(flag, index=rows.index)
+        breaks = (
+            (flag != flag.shift())
+            | (rows['city_key'] != rows['city_key'].shift())
+            | (rows['date'].diff() != pd.Timedelta(days=1))
+        )
+        run_id = breaks.cumsum()
+        flagged = rows[flag.to_numpy()].assign(run_id=run_id[flag])
+        runs = flagged.groupby('run_id').agg(
+            city_key=('city_key', 'first'),
+            city=('city', 'first'),
+            start=('date', 'min'),
+            end=('date', 'max'),
+            days=('date', 'size'),
+            peak=(peak_column, peak)
+        )
+        runs = runs[runs['days'] >= min_days].reset_index(drop=True)
+        runs.insert(2, 'kind', kind)
+        return runs
+
+    def _detect_events(self, rows: pd.DataFrame) -> pd.DataFrame:
+        z = self._zscores(rows)
+        with np.errstate(invalid='ignore'):
+            heat = np.nan_to_num(z, nan=0.0) >= HEATWAVE_Z
+            cold = np.nan_to_num(z, nan=0.0) <= COLD_SNAP_Z
+        dry = (rows['precipitation'] < DRY_DAY_PRECIPITATION_MM).to_numpy()
+        rows = rows.assign(zscore=z)
+        found = [
+            self._find_runs(rows, heat, TEMPERATURE_RUN_DAYS, 'heatwave', 'max_temperature', 'max'),
+            self._find_runs(rows, cold, TEMPERATURE_RUN_DAYS, 'cold_snap', 'min_temperature', 'min'),
+            self._find_runs(rows, dry, DRY_SPELL_RUN_DAYS, 'dry_spell', 'precipitation', 'sum')
+        ]
+        found = [frame for frame in found if not frame.empty]
+        return pd.concat(found, ignore_index=True) if found else self._events.iloc[0:0]
+
+    def _update_records(self, rows: pd.DataFrame) -> None:
+        for column, key, pick in (('max_temperature', 'record_high', 'idxmax'), ('min_temperature', 'record_low', 'idxmin')):
+            valid = rows.dropna(subset=[column])
+            if valid.empty:
+                continue
+            best = valid.loc[getattr(valid.groupby('city_key')[column], pick)()]
+            for row in best.itertuples():
+                record = self._records.setdefault(row.city_key, {'city': row.city})
+                current = record.get(key)
+                value = getattr(row, column)
+                better = current is None or (value > current['value'] if key == 'record_high' else value < current['value'])
+                if better:
+                    record[key] = {'value': float(value), 'date': row.date}
+
+    @staticmethod
+    def _fingerprint(weather: pd.DataFrame, row_hashes: np.ndarray, mask: Optional[np.ndarray] = None) -> Dict[str, Tuple[int, int]]:
+        """Per-city (row count, wrapping sum of row hashes) of the masked rows"""
+        keys = weather['city_key'].to_numpy()
+        if mask is not None:
+            keys, row_hashes = keys[mask], row_hashes[mask]
+        grouped = pd.Series(row_hashes, index=keys).groupby(level=0).agg(['size', 'sum'])
+        return {city_key: (int(size), int(total)) for city_key, size, total in grouped.itertuples()}
+
+    def _forget(self, city_keys: List[str]) -> None:
+        """Drop everything derived from these cities, so their rows are ingested from scratch"""
+        if not self._accumulators.empty:
+            self._accumulators = self._accumulators.drop(index=city_keys, level='city_key', errors='ignore')
+        if not self._events.empty:
+            self._events = self._events[~self._events['city_key'].isin(city_keys).to_numpy()]
+        for city_key in city_keys:
+            self._processed_until.pop(city_key, None)
+            self._fingerprints.pop(city_key, None)
+            self._records.pop(city_key, None)
+
+    def ingest(self, weather: pd.DataFrame) -> int:
+        """
+        Fold any days not yet processed into the analytics. Cities whose processed days were
+        back-filled, corrected or removed are rebuilt. Returns the number of rows ingested.
+        """
+        if weather.empty:
+            return 0
+        with self._lock:
+            columns = [column for column in SOURCE_COLUMNS if column in weather.columns]
+            row_hashes = pd.util.hash_pandas_object(weather[columns], index=False).to_numpy()
+            processed = weather['city_key'].map(pd.Series(self._processed_until, dtype='datetime64[ns]'))
+            seen = (processed.notna() & (weather['date'] <= processed)).to_numpy()
+            current = self._fingerprint(weather, row_hashes, seen)
+            changed = [
+                city_key for city_key, fingerprint in self._fingerprints.items()
+                if current.get(city_key) != fingerprint
+            ]
+            if changed:
+                logger.info(f"Climate analytics rebuilding {len(changed)} cities with changed history")
+                self._forget(changed)
+                processed = weather['city_key'].map(pd.Series(self._processed_until, dtype='datetime64[ns]'))
+
+            new_mask = processed.isna() | (weather['date'] > processed)
+            new_rows = weather[new_mask.to_numpy()]
+            if new_rows.empty:
+                self._built = True
+                return 0
+
+            self._update_accumulators(new_rows)
+            self._refresh_climatology()
+            self._update_records(new_rows)
+
+            # Re-detect events from a little before the first new day of each city.
+            # Older events keep the climatology they were detected against.
+            first_new = new_rows.groupby('city_key')['date'].min() - pd.Timedelta(days=EVENT_LOOKBACK_DAYS)
+            window_start = weather['city_key'].map(first_new)
+            window = weather[(window_start.notna() & (weather['date'] >= window_start)).to_numpy()]
+            detected = self._detect_events(window)
+            kept = self._events
+            if not kept.empty:
+                cutoff = kept['city_key'].map(first_new)
+                kept = kept[~(cutoff.notna() & (kept['end'] >= cutoff)).to_numpy()]
+            self._events = pd.concat([kept, detected], ignore_index=True) if not kept.empty else detected
+
+            self._processed_until.update(new_rows.groupby('city_key')['date'].max().to_dict())
+            ingested = set(new_rows['city_key'].unique())
+            self._fingerprints.update({
+                city_key: fingerprint
+                for city_key, fingerprint in self._fingerprint(weather, row_hashes).items()
+                if city_key in ingested
+            })
+            self._built = True
+            logger.info(f"Climate analytics ingested {len(new_rows)} rows, {len(self._events)} events on record")
+            return len(new_rows)
+
+    def ensure_built(self) -> None:
+        if not self._built:
+            self.ingest(data_manager.cache['weather'])
+
+    def on_reload(self, manager: TimeSeriesDataManager) -> None:
+        if self._built:
+            self.ingest(manager.cache['weather'])
+
+    def get_events(
+        self,
+        city: str,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        kinds: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Events for a city overlapping [start, end]"""
+        self.ensure_built()
+        events = self._events
+        mask = events['city_key'] == city.lower().strip()
+        if start is not None:
+            mask &= events['end'] >= start
+        if end is not None:
+            mask &= events['start'] <= end
+        if kinds:
+            mask &= events['kind'].isin(kinds)
+        selected = events[mask].sort_values('start')
+        return [
+            {
+                'kind': row.kind,
+                'start': row.start,
+                'end': row.end,
+                'days': int(row.days),
+                'peak': None if pd.isna(row.peak) else round(float(row.peak), 1)
+            }
+            for row in selected.itertuples()
+        ]
+
+    def get_anomalies(self, rows: pd.DataFrame, threshold: float = 2.0) -> List[Dict[str, Any]]:
+        """Days in `rows` whose temperature departs from the climatology by at least `threshold` sigma"""
+        self.ensure_built()
+        if rows.empty:
+            return []
+        z = self._zscores(rows)
+        with np.errstate(invalid='ignore'):
+            mask = np.abs(z) >= threshold
+        keys = pd.MultiIndex.from_arrays([rows['city_key'].to_numpy(), self._day_of_year(rows['date'])])
+        normal = self._climatology['mean'].reindex(keys).to_numpy()
+        return [
+            {
+                'date': date,
+                'temperature': round(float(temperature), 1),
+                'normal': round(float(mean), 1),
+                'zscore': round(float(score), 2)
+            }
+            for date, temperature, mean, score in zip(
+                rows['date'][mask], rows['temperature'][mask], normal[mask], z[mask]
+            )
+        ]
+
+    def get_records(self, city: str) -> Dict[str, Any]:
+        """All-time record high and low for a city"""
+        self.ensure_built()
+        return self._records.get(city.lower().strip(), {})
+
+# Create a singleton instance and keep it up to date as new days are ingested
+climate_analytics = ClimateAnalytics()
+data_manager.add_reload_listener(climate_analytics.on_reload)
@@ -0,0 +1,173 @@
+from typing import Callable, Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import threading
+import time
+from app.core.config import settings
+from app.models.weather import WeatherData
+from app.utils.data_loader import data_manager, get_location_data
+from app.utils.circuit_breaker import OPEN, circuit_breakers
+from app.utils.open_weather_api import OpenWeatherAPI
+from app.utils.rate_limiter import TokenBucket, upstream_limits
+
+logger = logging.getLogger(__name__)
+
+class CurrentWeatherPrefetcher:
+    """
+    Keeps current conditions for every known station in memory.
+
+    A background thread refreshes all stations on a fixed cadence using a bounded
+    thread pool against the OpenWeather API, throttled by the shared OpenWeather token bucket.
+    Request handlers only ever read the in-memory snapshot. Update listeners are called
+    with the stations each refresh updated, keyed by lowercase name.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        rate_limiter: Optional[TokenBucket] = None
+    ):
+        self.refresh_seconds = refresh_seconds or settings.CURRENT_WEATHER_REFRESH_SECONDS
+        self.max_concurrency = max_concurrency or settings.CURRENT_WEATHER_MAX_CONCURRENCY
+        self.rate_limiter = rate_limiter or upstream_limits['openweather']
+        self._api: Optional[OpenWeatherAPI] = None
+        self._snapshot: Dict[str, WeatherData] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._update_listeners: List[Callable[[Dict[str, WeatherData]], None]] = []
+        self.last_refresh: Optional[datetime] = None
+
+    def _get_api(self) -> OpenWeatherAPI:
+        if self._api is None:
+            self._api = OpenWeatherAPI(rate_limiter=self.rate_limiter)
+        return self._api
+
+    @staticmethod
+    def _to_weather_data(payload: Dict[str, Any], city: str) -> WeatherData:
+        """Convert an OpenWeather current weather payload to WeatherData"""
+        main = payload.get('main', {})
+        wind = payload.get('wind', {})
+        conditions = (payload.get('weather') or [{}])[0]
+        timestamp = payload.get('dt')
+        return WeatherData(
+            date=datetime.fromtimestamp(timestamp) if timestamp else datetime.now(),
+            temperature=float(main.get('temp', 0.0)),
+            humidity=float(main.get('humidity', 0.0)),
+            windSpeed=float(wind.get('speed', 0.0)),
+            pressure=float(main.get('pressure', 1013.25)),
+            description=str(conditions.get('description', 'Clear')),
+            city=city,
+            icon=str(conditions.get('icon', '01d'))
+        )
+
+    def add_update_listener(self, listener: Callable[[Dict[str, WeatherData]], None]) -> None:
+        """Register a callback invoked, on the refreshing thread, with the stations each refresh updated"""
+        self._update_listeners.append(listener)
+
+    def _notify(self, updated: Dict[str, WeatherData]) -> None:
+        for listener in list(self._update_listeners):
+            try:
+                listener(updated)
+            except Exception as e:
+                logger.error(f"Error in current weather update listener {listener}: {e}")
+
+    def _fetch_station(self, station: Dict[str, Any]) -> Optional[WeatherData]:
+        try:
+            payload = self._get_api().get_weather_by_coordinates(station['latitude'], station['longitude'])
+            return self._to_weather_data(payload, station['name'])
+        except Exception as e:
+            logger.warning(f"Failed to refresh current weather for {station['name']}: {e}")
+            return None
+
+    def refresh_all(self) -> int:
+        """Refresh current conditions for every station. Returns the number of stations updated."""
+        stations = data_manager.get_available_locations()
+        if not stations:
+            logger.warning("No stations available to prefetch current weather for")
+            return 0
+
+        if circuit_breakers['openweather_weather'].state == OPEN:
+            # Keep serving the last snapshot; the next cycle after the circuit half-opens probes again
+            logger.warning("OpenWeather circuit is open, skipping current weather refresh")
+            return 0
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="current-weather") as pool:
+            results = list(pool.map(self._fetch_station, stations))
+
+        updated = {
+            station['name'].lower(): weather
+            for station, weather in zip(stations, results)
+            if weather is not None
+        }
+        with self._lock:
+            self._snapshot.update(updated)
+            self.last_refresh = datetime.now()
+        self._notify(updated)
+
+        logger.info(
+            f"Refreshed current weather for {len(updated)}/{len(stations)} stations "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return len(updated)
+
+    def refresh_city(self, city: str) -> Optional[WeatherData]:
+        """Fetch current conditions for a single city on demand and store them in the snapshot"""
+        location_data = get_location_data(city)
+        if not location_data:
+            return None
+        weather = self._fetch_station({
+            'name': location_data['name'],
+            'latitude': location_data['latitude'],
+            'longitude': location_data['longitude']
+        })
+        if weather is not None:
+            with self._lock:
+                self._snapshot[location_data['name'].lower()] = weather
+            self._notify({location_data['name'].lower(): weather})
+        return weather
+
+    def get(self, city: str) -> Optional[WeatherData]:
+        """Read current conditions for a city from the in-memory snapshot"""
+        with self._lock:
+            return self._snapshot.get(city.lower().strip())
+
+    def snapshot(self) -> List[WeatherData]:
+        with self._lock:
+            return list(self._snapshot.values())
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_all()
+            except Exception as e:
+                logger.error(f"Current weather refresh failed: {e}")
+            self._stop_event.wait(self.refresh_seconds)
+
+    def start(self) -> bool:
+        """Start the background refresh thread. Returns False if the API is not configured."""
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        try:
+            self._get_api()
+        except ValueError as e:
+            logger.warning(f"Current weather prefetcher disabled: {e}")
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="current-weather-prefetcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Current weather prefetcher started (every {self.refresh_seconds}s)")
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background refresh thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+# Create a singleton instance
+current_weather_prefetcher = CurrentWeatherPrefetcher()
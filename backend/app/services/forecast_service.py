@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional, Tuple
+import logging
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+from app.utils.data_loader import data_manager, TimeSeriesDataManager
+from app.utils.forecasting import ensemble_forecast, generate_forecast
+
+logger = logging.getLogger(__name__)
+
+# (location key, horizon in days, model version, data version, first forecast day)
+ForecastKey = Tuple[str, int, str, str, str]
+
+class ForecastService:
+    """
+    Forecasts served from memory, keyed on (city, horizon, model version, data version, day).
+
+    Forecasts cover the days after today. After every dataset reload, and on the first
+    request of each day, the FORECAST_PRECOMPUTE_HORIZONS forecasts of every station with
+    recent enough history are computed in one pass. Other horizons, and places answered
+    from Meteostat rather than the stored dataset, are computed on first request and kept
+    in an LRU cache. Stations whose stored history ends more than
+    FORECAST_MAX_HISTORY_AGE_DAYS ago are forecast from recent history fetched like any
+    other place, or refused when none is available.
+    Forecasts are ensemble medians with p10/p90 bands (see ensemble_forecast) unless
+    FORECAST_ENSEMBLE_MEMBERS is 1.
+    Each forecast draws its noise from a generator seeded by its location and versions,
+    so a shorter horizon is always the start of a longer one and recomputing an evicted
+    entry gives the same answer.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size or settings.FORECAST_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._built = False
+        self._version: Optional[str] = None
+        self._day: Optional[date] = None
+        # city_key -> (station name, the last FORECAST_HISTORY_DAYS stored days)
+        self._histories: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        # city_key -> (station name, last stored day) of stations too out of date to forecast from
+        self._stale: Dict[str, Tuple[str, pd.Timestamp]] = {}
+        # (city key, day) -> (recent history, location) loaded for places without fresh stored history
+        self._live: "OrderedDict[Tuple[str, str], Tuple[pd.DataFrame, str]]" = OrderedDict()
+        self._precomputed: Dict[ForecastKey, pd.DataFrame] = {}
+        self._cache: "OrderedDict[ForecastKey, pd.DataFrame]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "precomputed_runs": 0}
+
+    @staticmethod
+    def _compute(location: str, history: pd.DataFrame, days: int, data_version: str, start: date) -> pd.DataFrame:
+        key = location.lower().strip()
+        seed = zlib.crc32(f"{key}|{settings.FORECAST_MODEL_VERSION}|{data_version}".encode())
+        rng = np.random.default_rng(seed)
+        start = pd.Timestamp(start)
+        if settings.FORECAST_ENSEMBLE_MEMBERS > 1:
+            forecast = ensemble_forecast(history, days, settings.FORECAST_ENSEMBLE_MEMBERS, rng=rng, start=start)
+        else:
+            forecast = generate_forecast(history, days, rng=rng, start=start)
+        forecast['city'] = location
+        return forecast
+
+    @staticmethod
+    def _oldest_usable_day(today: date) -> pd.Timestamp:
+        """Histories ending before this day are too out of date to forecast from"""
+        return pd.Timestamp(today - timedelta(days=settings.FORECAST_MAX_HISTORY_AGE_DAYS))
+
+    def refresh(self, manager: TimeSeriesDataManager = data_manager) -> None:
+        """Precompute the configured horizons, from tomorrow on, for every station of the current dataset"""
+        weather = manager.cache['weather']
+        version = manager.dataset_version
+        today = date.today()
+        start = today + timedelta(days=1)
+        oldest = self._oldest_usable_day(today)
+        horizons = sorted(set(settings.FORECAST_PRECOMPUTE_HORIZONS))
+        histories: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        stale: Dict[str, Tuple[str, pd.Timestamp]] = {}
+        precomputed: Dict[ForecastKey, pd.DataFrame] = {}
+        if not weather.empty:
+            # Days after today are not observations to forecast from
+            observed = weather[weather['date'] <= pd.Timestamp(today)]
+            recent = observed.groupby('city_key', sort=False).tail(settings.FORECAST_HISTORY_DAYS)
+            for city_key, history in recent.groupby('city_key', sort=False):
+                city = history['city'].iloc[0]
+                last_day = history['date'].max()
+                if last_day < oldest:
+                    stale[city_key] = (city, last_day)
+                    continue
+                histories[city_key] = (city, history)
+                if not horizons:
+                    continue
+                # Shorter horizons are the start of the longest one
+                forecast = self._compute(city, history, horizons[-1], version, start)
+                for days in horizons:
+                    key = (city_key, days, settings.FORECAST_MODEL_VERSION, version, start.isoformat())
+                    precomputed[key] = forecast.iloc[:days]
+        with self._lock:
+            self._histories = histories
+            self._stale = stale
+            self._precomputed = precomputed
+            self._version = version
+            self._day = today
+            self._built = True
+            self.stats["precomputed_runs"] += 1
+        logger.info(
+            f"Precomputed {len(precomputed)} forecasts for {len(histories)} stations from {start}, dataset {version}"
+            + (f"; {len(stale)} stations have no history since {oldest:%Y-%m-%d}" if stale else "")
+        )
+
+    def ensure_built(self) -> None:
+        if not self._built or self._version != data_manager.dataset_version or self._day != date.today():
+            self.refresh()
+
+    def on_reload(self, manager: TimeSeriesDataManager) -> None:
+        self.refresh(manager)
+
+    def _lookup(self, key: ForecastKey) -> Optional[pd.DataFrame]:
+        with self._lock:
+            forecast = self._precomputed.get(key)
+            if forecast is None:
+                forecast = self._cache.get(key)
+                if forecast is not None:
+                    self._cache.move_to_end(key)
+            self.stats["hits" if forecast is not None else "misses"] += 1
+            return forecast
+
+    def _store(self, key: ForecastKey, forecast: pd.DataFrame) -> None:
+        with self._lock:
+            self._cache[key] = forecast
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _get_or_compute(self, location: str, history: pd.DataFrame, days: int, data_version: str, start: date) -> pd.DataFrame:
+        key = (location.lower().strip(), days, settings.FORECAST_MODEL_VERSION, data_version, start.isoformat())
+        forecast = self._lookup(key)
+        if forecast is None:
+            forecast = self._compute(location, history, days, data_version, start)
+            self._store(key, forecast)
+        return forecast
+
+    def _load_live(self, city_key: str, today: date, load_history: Callable[[], Tuple[pd.DataFrame, str]]) -> Tuple[pd.DataFrame, str]:
+        """Recent history of a place, loaded once a day"""
+        key = (city_key, today.isoformat())
+        with self._lock:
+            live = self._live.get(key)
+            if live is not None:
+                self._live.move_to_end(key)
+                return live
+        live = load_history()
+        with self._lock:
+            self._live[key] = live
+            while len(self._live) > self.cache_size:
+                self._live.popitem(last=False)
+        return live
+
+    def get_forecast(
+        self,
+        city: str,
+        days: int,
+        load_history: Optional[Callable[[], Tuple[pd.DataFrame, str]]] = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        Forecast for the `days` days after today, and the name of the location it is for.
+        Stations with recent stored history are forecast from the stored dataset. For other
+        places, and stations whose stored history is out of date, `load_history` supplies
+        recent history and the location it belongs to; those forecasts are versioned by
+        the day they were made. Raises ValueError when no recent enough history is found.
+        """
+        if not 1 <= days <= settings.FORECAST_MAX_DAYS:
+            raise ValueError(f"Forecasts cover 1 to {settings.FORECAST_MAX_DAYS} days")
+        self.ensure_built()
+        today = self._day
+        start = today + timedelta(days=1)
+        city_key = city.lower().strip()
+        station = self._histories.get(city_key)
+        if station is None and load_history is not None:
+            history, location = self._load_live(city_key, today, load_history)
+            # The history may come from a nearby stored station
+            station = self._histories.get(location.lower().strip())
+            if station is None:
+                if history.empty:
+                    raise ValueError(f"No historical data found for {location}")
+                history = history[pd.to_datetime(history['date']) <= pd.Timestamp(today)]
+                last_day = pd.to_datetime(history['date']).max() if not history.empty else None
+                if last_day is None or last_day < self._oldest_usable_day(today):
+                    raise ValueError(
+                        f"No weather history for {location} since {self._oldest_usable_day(today):%Y-%m-%d}, "
+                        f"too out of date to forecast from"
+                    )
+                return self._get_or_compute(location, history, days, f"live-{today.isoformat()}", start), location
+        if station is None:
+            if city_key in self._stale:
+                name, last_day = self._stale[city_key]
+                raise ValueError(f"Stored history for {name} ends on {last_day:%Y-%m-%d}, too out of date to forecast from")
+            raise ValueError(f"Location {city} not found in our database")
+        name, history = station
+        return self._get_or_compute(name, history, days, self._version, start), name
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "model_version": settings.FORECAST_MODEL_VERSION,
+                "dataset_version": self._version,
+                "day": self._day.isoformat() if self._day else None,
+                "precomputed": len(self._precomputed),
+                "stale_stations": len(self._stale),
+                "live_histories": len(self._live),
+                "cached": len(self._cache),
+                **self.stats
+            }
+
+# Create a singleton instance and recompute station forecasts as new days are ingested
+forecast_service = ForecastService()
+data_manager.add_reload_listener(forecast_service.on_reload)
@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import logging
+import pandas as pd
+from meteostat import Point, Hourly
+from app.core.config import settings
+from app.utils.circuit_breaker import upstream_call
+from app.utils.data_loader import get_location_data
+from app.utils.hourly_store import HourlyStore, hourly_store, months_between, rollup_daily, METEOSTAT_HOURLY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+class HourlyHistory:
+    """
+    Hourly history per station, fetched from Meteostat Hourly on first use and
+    kept in the month-partitioned hourly store.
+
+    A query fetches only the months it touches that are missing, or that were
+    stored before the month ended and are older than HOURLY_REFRESH_SECONDS. If
+    Meteostat is unavailable the query is answered from whatever is stored.
+    Daily rollups are computed on the fly from the hourly rows, so the daily
+    store and its queries are untouched.
+    """
+
+    def __init__(self, store: Optional[HourlyStore] = None):
+        self.store = store or hourly_store
+
+    def _resolve_station(self, city: str, coordinates: Optional[Dict[str, float]] = None) -> Tuple[str, float, float]:
+        """Name and coordinates of the station for a city, or of the geocoded place itself"""
+        location_data = get_location_data(city)
+        if location_data:
+            return location_data['name'], float(location_data['latitude']), float(location_data['longitude'])
+        if coordinates:
+            return city, coordinates['lat'], coordinates['lon']
+        raise ValueError(f"Location {city} not found in our database")
+
+    def _stale_months(self, station: str, months: List[pd.Period]) -> List[pd.Period]:
+        now = datetime.now()
+        stale = []
+        for month in months:
+            written = self.store.partition_mtime(station, month)
+            incomplete = written is not None and pd.Timestamp(written) < month.end_time
+            if written is None or (incomplete and (now - written).total_seconds() > settings.HOURLY_REFRESH_SECONDS):
+                stale.append(month)
+        return stale
+
+    @staticmethod
+    def _fetch(latitude: float, longitude: float, start: datetime, end: datetime) -> pd.DataFrame:
+        """Hourly rows from Meteostat, in hourly store columns"""
+        with upstream_call('meteostat'):
+            data = Hourly(Point(latitude, longitude), start, end).fetch()
+        return data.reset_index().rename(columns=METEOSTAT_HOURLY_COLUMNS)
+
+    def ingest(self, station: str, latitude: float, longitude: float, start: pd.Timestamp, end: pd.Timestamp) -> int:
+        """Fetch and store the months of [start, end] that are missing or stale. Returns rows stored."""
+        stale = self._stale_months(station, months_between(start, end))
+        if not stale:
+            return 0
+        # One request for the span of stale months, fresh months in between are rewritten as is
+        fetch_start = stale[0].start_time.to_pydatetime()
+        fetch_end = min(stale[-1].end_time.floor('h').to_pydatetime(), datetime.utcnow())
+        logger.info(f"Fetching hourly history for {station} from {fetch_start:%Y-%m} to {fetch_end:%Y-%m}")
+        data = self._fetch(latitude, longitude, fetch_start, fetch_end)
+        if data.empty:
+            # Meteostat reports errors as empty data, so store nothing and retry next time
+            return 0
+        return self.store.write(station, data)
+
+    @staticmethod
+    def solar_offset(longitude: float) -> pd.Timedelta:
+        """Approximate local time offset from UTC, by longitude (no time zone or DST rules)"""
+        return pd.Timedelta(hours=round(longitude / 15))
+
+    def local_now(self, city: str, coordinates: Optional[Dict[str, float]] = None) -> pd.Timestamp:
+        """Current approximate local time at a city's station (see solar_offset), without a time zone"""
+        _, _, longitude = self._resolve_station(city, coordinates)
+        return pd.Timestamp.utcnow().tz_localize(None).floor('min') + self.solar_offset(longitude)
+
+    def get_hourly(
+        self,
+        city: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        coordinates: Optional[Dict[str, float]] = None,
+        local_time: bool = False
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        Hourly rows in [start, end] for a city and the name of the station they belong to.
+        Times are UTC, or approximate local time (see solar_offset) with `local_time`.
+        """
+        if end < start:
+            raise ValueError("End of the range is before its start")
+        if end - start > pd.Timedelta(days=settings.HOURLY_MAX_DAYS):
+            raise ValueError(f"Hourly ranges are limited to {settings.HOURLY_MAX_DAYS} days")
+        station, latitude, longitude = self._resolve_station(city, coordinates)
+        offset = self.solar_offset(longitude) if local_time else pd.Timedelta(0)
+        start, end = start - offset, end - offset
+        try:
+            self.ingest(station, latitude, longitude, start, end)
+        except Exception as e:
+            logger.warning(f"Hourly history for {station} not refreshed, serving stored rows: {e}")
+        hourly = self.store.read(station, start, end)
+        if local_time:
+            hourly = hourly.assign(time=hourly['time'] + offset)
+        return hourly, station
+
+    def get_daily(
+        self,
+        city: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        coordinates: Optional[Dict[str, float]] = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """Daily rollup of the hourly rows in [start, end] for a city"""
+        hourly, station = self.get_hourly(city, start, end, coordinates)
+        return rollup_daily(hourly), station
+
+# Create a singleton instance
+hourly_history = HourlyHistory()
@@ -0,0 +1,215 @@
+from typing import Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import logging
+import os
+import shutil
+import threading
+import uuid
+import pandas as pd
+from app.core.config import settings
+from app.models.jobs import ImportJobStatus
+from app.utils.data_loader import data_manager, STATION_COORDINATES, WEATHER_CSV_PATH
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Column order of the native store (capital_cities_weather.csv)
+STORE_COLUMNS = [
+    'time', 'temperature', 'min_temperature', 'max_temperature', 'precipitation', 'snow',
+    'wind_direction', 'wind_speed', 'wind_gust', 'pressure', 'sunshine', 'city'
+]
+
+# Source column names mapped to store columns. Covers the Meteostat-based
+# "daily_weather.parquet" dataset, raw Meteostat names and our own names.
+PARQUET_COLUMN_MAP = {
+    'date': 'time',
+    'time': 'time',
+    'city_name': 'city',
+    'city': 'city',
+    'avg_temp_c': 'temperature',
+    'tavg': 'temperature',
+    'temperature': 'temperature',
+    'min_temp_c': 'min_temperature',
+    'tmin': 'min_temperature',
+    'min_temperature': 'min_temperature',
+    'max_temp_c': 'max_temperature',
+    'tmax': 'max_temperature',
+    'max_temperature': 'max_temperature',
+    'precipitation_mm': 'precipitation',
+    'prcp': 'precipitation',
+    'precipitation': 'precipitation',
+    'snow_depth_mm': 'snow',
+    'snow': 'snow',
+    'avg_wind_dir_deg': 'wind_direction',
+    'wdir': 'wind_direction',
+    'wind_direction': 'wind_direction',
+    'avg_wind_speed_kmh': 'wind_speed',
+    'wspd': 'wind_speed',
+    'wind_speed': 'wind_speed',
+    'peak_wind_gust_kmh': 'wind_gust',
+    'wpgt': 'wind_gust',
+    'wind_gust': 'wind_gust',
+    'avg_sea_level_pres_hpa': 'pressure',
+    'pres': 'pressure',
+    'pressure': 'pressure',
+    'sunshine_total_min': 'sunshine',
+    'tsun': 'sunshine',
+    'sunshine': 'sunshine'
+}
+
+class ParquetImportJob:
+    """
+    Streams a Parquet file into the native weather store one record batch at a time.
+
+    Rows are mapped to the store's columns, optionally limited to the configured
+    stations, de-duplicated against the existing store and appended to a copy of
+    it, which then atomically replaces the store before the dataset is reloaded.
+    Only one batch is held in memory at a time.
+    """
+
+    def __init__(self, source: Path, stations_only: bool = True):
+        self.source = source
+        self.stations_only = stations_only
+        self._lock = threading.Lock()
+        self.status = ImportJobStatus(
+            job_id=uuid.uuid4().hex[:12],
+            source=str(source),
+            status='pending',
+            created_at=datetime.now()
+        )
+
+    def _update(self, **changes) -> None:
+        with self._lock:
+            self.status = self.status.model_copy(update=changes)
+
+    def snapshot(self) -> ImportJobStatus:
+        with self._lock:
+            return self.status.model_copy()
+
+    @staticmethod
+    def _column_mapping(source_columns: List[str]) -> Dict[str, str]:
+        """Pick one source column per store column, in PARQUET_COLUMN_MAP priority order"""
+        mapping = {}
+        available = set(source_columns)
+        for source, target in PARQUET_COLUMN_MAP.items():
+            if source in available and target not in mapping.values():
+                mapping[source] = target
+        missing = {'time', 'city', 'temperature'} - set(mapping.values())
+        if missing:
+            raise ValueError(f"Parquet file has no columns for {sorted(missing)}")
+        return mapping
+
+    def _map_batch(self, batch: pd.DataFrame, mapping: Dict[str, str], existing_keys: Set[Tuple[str, str]]) -> pd.DataFrame:
+        """Map a source batch to store columns and drop rows that should not be imported"""
+        frame = batch.rename(columns=mapping)
+        frame = frame.reindex(columns=STORE_COLUMNS)
+        frame['time'] = pd.to_datetime(frame['time']).dt.strftime('%Y-%m-%d')
+        frame = frame.dropna(subset=['time', 'city'])
+        if self.stations_only:
+            frame = frame[frame['city'].isin(STATION_COORDINATES)]
+        # Skip days the store already has. Keys of imported rows are not tracked,
+        # so memory stays bounded by the existing store rather than the file.
+        keys = zip(frame['city'].str.lower(), frame['time'])
+        frame = frame[[key not in existing_keys for key in keys]]
+        return frame.drop_duplicates(subset=['city', 'time'])
+
+    def run(self) -> None:
+        tmp_path = WEATHER_CSV_PATH.with_suffix('.import.tmp')
+        try:
+            if pq is None:
+                raise RuntimeError("pyarrow is required to import Parquet files")
+            self._update(status='running', started_at=datetime.now())
+
+            parquet_file = pq.ParquetFile(self.source)
+            metadata = parquet_file.metadata
+            mapping = self._column_mapping(parquet_file.schema_arrow.names)
+            self._update(total_rows=metadata.num_rows, row_groups_total=metadata.num_row_groups)
+            logger.info(f"Importing {metadata.num_rows} rows from {self.source} with mapping {mapping}")
+
+            current = data_manager.cache['weather']
+            existing_keys: Set[Tuple[str, str]] = set()
+            if not current.empty:
+                existing_keys = set(zip(current['city_key'], current['date'].dt.strftime('%Y-%m-%d')))
+
+            # Append to a copy of the store so readers keep a consistent file until the swap
+            WEATHER_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
+            write_header = not WEATHER_CSV_PATH.exists()
+            if not write_header:
+                shutil.copyfile(WEATHER_CSV_PATH, tmp_path)
+
+            rows_read = rows_imported = 0
+            for group in range(metadata.num_row_groups):
+                for batch in parquet_file.iter_batches(
+                    batch_size=settings.IMPORT_BATCH_ROWS,
+                    row_groups=[group],
+                    columns=list(mapping)
+                ):
+                    frame = self._map_batch(batch.to_pandas(), mapping, existing_keys)
+                    rows_read += batch.num_rows
+                    if not frame.empty:
+                        frame.to_csv(tmp_path, mode='w' if write_header else 'a', header=write_header, index=False)
+                        write_header = False
+                        rows_imported += len(frame)
+                    self._update(
+                        rows_read=rows_read,
+                        rows_imported=rows_imported,
+                        progress=rows_read / metadata.num_rows if metadata.num_rows else 1.0
+                    )
+                self._update(row_groups_done=group + 1)
+
+            version = data_manager.dataset_version
+            if rows_imported:
+                os.replace(tmp_path, WEATHER_CSV_PATH)
+                version = data_manager.reload()
+            self._update(
+                status='completed',
+                progress=1.0,
+                dataset_version=version,
+                finished_at=datetime.now()
+            )
+            logger.info(f"Import {self.status.job_id} finished: {rows_imported} of {rows_read} rows imported")
+        except Exception as e:
+            logger.error(f"Import {self.status.job_id} failed: {e}")
+            self._update(status='failed', error=str(e), finished_at=datetime.now())
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+class ImportJobManager:
+    """Runs import jobs one at a time on a background worker, off the request path"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dataset-import")
+        self._jobs: Dict[str, ParquetImportJob] = {}
+
+    def resolve_source(self, path: str) -> Path:
+        """Resolve a path relative to the data directory, refusing anything outside it"""
+        data_dir = Path(settings.DATA_DIR).resolve()
+        source = (data_dir / path).resolve()
+        if data_dir not in source.parents:
+            raise ValueError(f"Import source must be inside the data directory: {path}")
+        if not source.exists():
+            raise FileNotFoundError(f"Parquet file not found at {source}")
+        return source
+
+    def submit(self, path: str, stations_only: bool = True) -> ImportJobStatus:
+        job = ParquetImportJob(self.resolve_source(path), stations_only=stations_only)
+        self._jobs[job.status.job_id] = job
+        self._executor.submit(job.run)
+        return job.snapshot()
+
+    def get(self, job_id: str) -> Optional[ImportJobStatus]:
+        job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def list(self) -> List[ImportJobStatus]:
+        return [job.snapshot() for job in self._jobs.values()]
+
+# Create a singleton instance
+import_job_manager = ImportJobManager()
@@ -0,0 +1,199 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import pandas as pd
+from app.core.config import settings
+from app.models.weather import WeatherData
+from app.services.current_weather_prefetcher import current_weather_prefetcher
+from app.utils.data_loader import data_manager, TimeSeriesDataManager
+
+logger = logging.getLogger(__name__)
+
+# Event kinds: live current conditions, and the latest stored day of a station
+CURRENT, DAILY = "current", "daily"
+# Fields whose change makes a current conditions event; a new observation time alone does not
+CURRENT_FIELDS = ('temperature', 'humidity', 'windSpeed', 'pressure', 'description', 'icon')
+# Stored columns sent in daily events
+DAILY_FIELDS = (
+    'temperature', 'min_temperature', 'max_temperature', 'precipitation', 'snow',
+    'wind_direction', 'wind_speed', 'wind_gust', 'pressure', 'sunshine'
+)
+
+# (event kind, city key)
+EventKey = Tuple[str, str]
+
+class TooManySubscribers(Exception):
+    pass
+
+class Subscription:
+    """
+    One client's cities and the events not yet sent to it. Only the latest event per
+    city and kind is kept, so a slow client never holds more than one of each.
+    """
+
+    def __init__(self, cities: Dict[str, str], loop: asyncio.AbstractEventLoop):
+        self.cities = cities  # city key -> station name
+        self.loop = loop
+        self.pending: Dict[EventKey, bytes] = {}
+        self.wake = asyncio.Event()
+
+    def push(self, events: List[Tuple[EventKey, bytes]]) -> None:
+        for key, body in events:
+            self.pending[key] = body
+        self.wake.set()
+
+    def drain(self) -> bytes:
+        body = b"".join(self.pending.values())
+        self.pending.clear()
+        self.wake.clear()
+        return body
+
+class LiveUpdateHub:
+    """
+    In-process fan-out of current conditions and latest stored days to SSE subscribers.
+
+    The current weather prefetcher and dataset reloads publish every station at once. The
+    hub keeps the latest event of each station, and only stations whose values changed
+    are encoded, once each, and handed to the subscribers of that station with a single
+    callback per event loop. Subscribers get the latest events of their cities when they
+    subscribe, then only changes, with a comment line every LIVE_HEARTBEAT_SECONDS to
+    keep idle connections open.
+    """
+
+    def __init__(self, max_subscribers: Optional[int] = None):
+        self.max_subscribers = max_subscribers or settings.LIVE_MAX_SUBSCRIBERS
+        self._lock = threading.Lock()
+        # Latest (fingerprint, encoded event) of each station and kind
+        self._state: Dict[EventKey, Tuple[Any, bytes]] = {}
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._version: Optional[str] = None
+        self.stats: Dict[str, int] = {"published": 0, "delivered": 0, "subscribed": 0, "rejected": 0}
+
+    def _encode(self, kind: str, data: Dict[str, Any]) -> bytes:
+        payload = json.dumps(data, separators=(",", ":"), default=str)
+        return f"id: {next(self._ids)}\nevent: {kind}\ndata: {payload}\n\n".encode()
+
+    def publish(self, kind: str, records: Dict[str, Tuple[Any, Dict[str, Any]]]) -> int:
+        """
+        Record the latest (fingerprint, data) of stations, keyed by city key, and send the
+        ones whose fingerprint changed to their subscribers. Safe to call from any thread.
+        Returns the number of stations that changed.
+        """
+        deliveries: Dict[asyncio.AbstractEventLoop, Dict[Subscription, List[Tuple[EventKey, bytes]]]] = {}
+        changed = 0
+        with self._lock:
+            for city_key, (fingerprint, data) in records.items():
+                key = (kind, city_key)
+                previous = self._state.get(key)
+                if previous is not None and previous[0] == fingerprint:
+                    continue
+                body = self._encode(kind, data)
+                self._state[key] = (fingerprint, body)
+                changed += 1
+                for subscription in self._subscribers.get(city_key, ()):
+                    deliveries.setdefault(subscription.loop, {}).setdefault(subscription, []).append((key, body))
+            self.stats["published"] += changed
+        for loop, by_subscription in deliveries.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, by_subscription)
+            except RuntimeError:
+                # The loop has closed; its subscriptions are going away with it
+                pass
+        return changed
+
+    def _deliver(self, by_subscription: Dict[Subscription, List[Tuple[EventKey, bytes]]]) -> None:
+        for subscription, events in by_subscription.items():
+            subscription.push(events)
+            self.stats["delivered"] += len(events)
+
+    def on_current(self, updated: Dict[str, WeatherData]) -> None:
+        """Prefetcher update listener: publish current conditions"""
+        self.publish(CURRENT, {
+            city_key: (tuple(getattr(weather, field) for field in CURRENT_FIELDS), weather.model_dump(mode="json"))
+            for city_key, weather in updated.items()
+        })
+
+    def on_reload(self, manager: TimeSeriesDataManager) -> None:
+        """Dataset reload listener: publish each station's latest stored day"""
+        weather = manager.cache['weather']
+        self._version = manager.dataset_version
+        if weather.empty:
+            return
+        latest = weather.loc[weather.groupby('city_key')['date'].idxmax()]
+        fields = [field for field in DAILY_FIELDS if field in latest.columns]
+        records = {}
+        for row in latest[['city_key', 'city', 'date', *fields]].to_dict('records'):
+            data = {'city': row['city'], 'date': row['date'].date().isoformat()}
+            data.update({field: None if pd.isna(row[field]) else float(row[field]) for field in fields})
+            records[row['city_key']] = (tuple(data.items()), data)
+        self.publish(DAILY, records)
+
+    def ensure_built(self) -> None:
+        if self._version != data_manager.dataset_version:
+            self.on_reload(data_manager)
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, cities: Dict[str, str]) -> Subscription:
+        """
+        Subscribe the running event loop to stations, given as city key -> name. The latest
+        event of each is queued right away. Raises TooManySubscribers at LIVE_MAX_SUBSCRIBERS.
+        """
+        self.ensure_built()
+        subscription = Subscription(cities, asyncio.get_running_loop())
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.stats["rejected"] += 1
+                raise TooManySubscribers(f"Live updates are limited to {self.max_subscribers} subscribers")
+            self._count += 1
+            self.stats["subscribed"] += 1
+            for city_key in cities:
+                self._subscribers.setdefault(city_key, set()).add(subscription)
+            initial = [
+                ((kind, city_key), self._state[(kind, city_key)][1])
+                for city_key in cities for kind in (DAILY, CURRENT)
+                if (kind, city_key) in self._state
+            ]
+        subscription.push(initial)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._count -= 1
+            for city_key in subscription.cities:
+                subscribers = self._subscribers.get(city_key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[city_key]
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """The SSE body of a subscription; unsubscribes when the client goes away"""
+        try:
+            # Ask clients to reconnect after 5s if the connection drops
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.wake.wait(), settings.LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield subscription.drain()
+        finally:
+            self.unsubscribe(subscription)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"subscribers": self._count, "stations": len(self._subscribers), **self.stats}
+
+# Create a singleton instance, fed by the prefetcher and by dataset reloads
+live_update_hub = LiveUpdateHub()
+current_weather_prefetcher.add_update_listener(live_update_hub.on_current)
+data_manager.add_reload_listener(live_update_hub.on_reload)
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+import json
+import logging
+import os
+import threading
+import time
+from app.core.config import settings
+from app.utils.geocode_cache import GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+class QueryKey(NamedTuple):
+    """A parsed query reduced to what its answer depends on"""
+    location: str
+    duration: int
+    intent: str
+    format: str
+
+def normalize_query(parsed: Dict[str, Any]) -> Optional[QueryKey]:
+    """
+    Reduce a parsed query to a QueryKey, with the intent it is answered by: forecast,
+    hourly, current or historical. Comparisons and anomaly lookups have no single
+    location and are not logged.
+    """
+    intent = parsed.get('intent')
+    location = parsed.get('location')
+    if intent in ('comparison', 'anomaly') or not location:
+        return None
+    if intent == 'forecast' or parsed.get('direction') == 'future':
+        intent = 'forecast'
+    elif parsed.get('resolution') == 'hourly':
+        intent = 'hourly'
+    elif intent != 'current':
+        intent = 'historical'
+    try:
+        duration = int(parsed.get('duration') or 7)
+    except (TypeError, ValueError):
+        duration = 7
+    return QueryKey(str(location).strip(), duration, intent, parsed.get('format') or 'text')
+
+class QueryLog:
+    """
+    Rolling log of how often each normalized query is asked.
+
+    Counts are kept per day for the last QUERY_LOG_DAYS days, each day holding at most
+    QUERY_LOG_MAX_ENTRIES distinct queries, and saved to QUERY_LOG_FILE so the ranking
+    survives restarts. Queries are counted under their normalized location; the location
+    as last asked is kept to answer them by.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or Path(settings.DATA_DIR) / settings.QUERY_LOG_FILE
+        # day (ISO date) -> entry id -> {location, duration, intent, format, count}
+        self._days: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._last_saved = time.monotonic()
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def _entry_id(key: QueryKey) -> str:
+        return f"{GeocodeCache.normalize(key.location)}|{key.duration}|{key.intent}|{key.format}"
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                self._days = json.load(f)
+            self._expire()
+            logger.info(f"Loaded query log for {len(self._days)} days from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading query log from {self.path}: {e}")
+            self._days = {}
+
+    def _expire(self) -> None:
+        oldest = (date.today() - timedelta(days=settings.QUERY_LOG_DAYS - 1)).isoformat()
+        for day in [day for day in self._days if day < oldest]:
+            del self._days[day]
+
+    def record(self, key: QueryKey) -> bool:
+        """Count one query. Returns True when the log is due to be saved."""
+        today = date.today().isoformat()
+        with self._lock:
+            if today not in self._days:
+                self._days[today] = {}
+                self._expire()
+            entries = self._days[today]
+            entry_id = self._entry_id(key)
+            entry = entries.get(entry_id)
+            if entry is None:
+                if len(entries) >= settings.QUERY_LOG_MAX_ENTRIES:
+                    del entries[min(entries, key=lambda other: entries[other]['count'])]
+                entry = entries[entry_id] = {**key._asdict(), 'count': 0}
+            entry['location'] = key.location
+            entry['count'] += 1
+            self._dirty = True
+            return time.monotonic() - self._last_saved >= settings.QUERY_LOG_SAVE_SECONDS
+
+    def top(self, n: int, intents: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """The n most asked queries over the retained days, most asked first, with their counts"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for day in sorted(self._days):
+                for entry_id, entry in self._days[day].items():
+                    if intents is not None and entry['intent'] not in intents:
+                        continue
+                    total = totals.setdefault(entry_id, {**entry, 'count': 0})
+                    # The latest day's spelling of the location wins
+                    total['location'] = entry['location']
+                    total['count'] += entry['count']
+        return sorted(totals.values(), key=lambda entry: -entry['count'])[:n]
+
+    def top_locations(self, n: int) -> List[str]:
+        """The n most asked locations, as last asked"""
+        counts: Dict[str, Dict[str, Any]] = {}
+        for entry in self.top(len(self._days) * settings.QUERY_LOG_MAX_ENTRIES):
+            location = counts.setdefault(GeocodeCache.normalize(entry['location']), {'name': entry['location'], 'count': 0})
+            location['count'] += entry['count']
+        return [location['name'] for location in sorted(counts.values(), key=lambda location: -location['count'])[:n]]
+
+    def save(self) -> None:
+        """Persist the log to disk atomically, if anything was recorded since the last save"""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._days, separators=(',', ':'))
+            self._dirty = False
+            self._last_saved = time.monotonic()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving query log to {self.path}: {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            days = {day: len(entries) for day, entries in self._days.items()}
+        return {"days": days, "top": self.top(5)}
+
+# Create a singleton instance
+query_log = QueryLog()
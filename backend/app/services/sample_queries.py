@@ -0,0 +1,139 @@
+from typing import List, Optional, Tuple
+import json
+import logging
+import random
+import threading
+import time
+from app.utils.data_loader import data_manager, TimeSeriesDataManager
+
+logger = logging.getLogger(__name__)
+
+# Define query templates by category
+QUERY_TEMPLATES = {
+    "current": [
+        "What's the current weather in {city}?",
+        "Show me today's weather in {city}",
+        "What's the weather like right now in {city}?",
+        "Give me the current temperature in {city}"
+    ],
+    "historical": [
+        "Show me the weather in {city} for the past {days} days",
+        "What was the weather like in {city} last week?",
+        "Show me historical weather data for {city} over the past {days} days",
+        "What were the temperature trends in {city} last month?"
+    ],
+    "forecast": [
+        "What's the weather forecast for {city} for the next {days} days?",
+        "Show me the {days}-day forecast for {city}",
+        "What's the temperature going to be in {city} this week?",
+        "Show me the precipitation forecast for {city} over the next {days} days"
+    ],
+    "format_specific": {
+        "table": [
+            "Show me the weather in {city} for the next {days} days in a table format",
+            "Display the temperature trends in {city} as a table",
+            "Show me the weather data for {city} in a tabular format"
+        ],
+        "chart": [
+            "Show me the temperature trends in {city} as a chart",
+            "Display the precipitation forecast for {city} in a graph",
+            "Show me the weather patterns in {city} as a visualization"
+        ],
+        "text": [
+            "Give me a text summary of the weather in {city}",
+            "Describe the weather conditions in {city}",
+            "Tell me about the weather in {city}"
+        ],
+        "summary": [
+            "Summarize the weather in {city} for the past week",
+            "Give me a weather summary for {city}",
+            "Provide a weather overview for {city}"
+        ]
+    }
+}
+
+# Define time periods and formats
+DAYS = [3, 5, 7]
+FORMATS = ["table", "chart", "text", "summary"]
+
+class SampleQueryPool:
+    """
+    Pregenerated pool of sample query batches.
+
+    Batches are generated once per dataset version and pre-serialized to JSON,
+    so serving one is a constant-time lookup. The served batch rotates every
+    `rotation_seconds`, which keeps responses stable (and cacheable) within a window.
+    """
+
+    def __init__(self, pool_size: int = 32, queries_per_batch: int = 8, rotation_seconds: int = 300):
+        self.pool_size = pool_size
+        self.queries_per_batch = queries_per_batch
+        self.rotation_seconds = rotation_seconds
+        self.version: Optional[str] = None
+        self._batches: List[bytes] = []
+        self._lock = threading.Lock()
+
+    def _generate_batch(self, cities: List[str], rng: random.Random) -> List[str]:
+        queries = []
+
+        # Generate queries for each city
+        for city in cities:
+            # Add one query from each category
+            queries.append(rng.choice(QUERY_TEMPLATES["current"]).format(city=city))
+
+            # Add historical query
+            queries.append(rng.choice(QUERY_TEMPLATES["historical"]).format(
+                city=city,
+                days=rng.choice(DAYS)
+            ))
+
+            # Add forecast query
+            queries.append(rng.choice(QUERY_TEMPLATES["forecast"]).format(
+                city=city,
+                days=rng.choice(DAYS)
+            ))
+
+            # Add format-specific query
+            format_type = rng.choice(FORMATS)
+            queries.append(rng.choice(QUERY_TEMPLATES["format_specific"][format_type]).format(
+                city=city,
+                days=rng.choice(DAYS)
+            ))
+
+        # Shuffle and limit the number of queries
+        rng.shuffle(queries)
+        return queries[:self.queries_per_batch]
+
+    def refresh(self, manager: TimeSeriesDataManager = data_manager) -> None:
+        """Regenerate the pool from the current station list"""
+        cities = manager.station_names()
+        # Select up to 6 cities, otherwise use all available cities
+        sample_cities = cities[:6]
+        rng = random.Random(manager.dataset_version)
+        batches = [
+            json.dumps(self._generate_batch(sample_cities, rng)).encode()
+            for _ in range(self.pool_size)
+        ]
+        with self._lock:
+            self._batches = batches
+            self.version = manager.dataset_version
+        logger.info(f"Generated {len(batches)} sample query batches for dataset {self.version}")
+
+    def current(self) -> Tuple[str, bytes]:
+        """
+        Get the batch for the current rotation window.
+        Returns (tag, body) where tag identifies the batch within this dataset version.
+        """
+        if self.version != data_manager.dataset_version:
+            self.refresh()
+        with self._lock:
+            window = int(time.time() // self.rotation_seconds)
+            index = window % len(self._batches)
+            return f"{self.version}-{index}", self._batches[index]
+
+    def seconds_until_rotation(self) -> int:
+        return self.rotation_seconds - int(time.time()) % self.rotation_seconds
+
+# Create a singleton instance and keep it in sync with dataset reloads
+sample_query_pool = SampleQueryPool()
+data_manager.add_reload_listener(sample_query_pool.refresh)
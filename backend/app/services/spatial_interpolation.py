@@ -0,0 +1,163 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+from app.utils.data_loader import data_manager, TimeSeriesDataManager
+
+logger = logging.getLogger(__name__)
+
+# Stored daily columns estimated by weighting, and those first corrected for elevation
+INTERPOLATED_COLUMNS = [
+    'temperature', 'min_temperature', 'max_temperature', 'precipitation', 'snow',
+    'wind_speed', 'wind_gust', 'pressure', 'sunshine'
+]
+LAPSE_RATE_COLUMNS = ['temperature', 'min_temperature', 'max_temperature']
+# Closer than this, a station is taken as the place itself
+COLOCATED_KM = 0.01
+
+def idw_weights(distances_km: np.ndarray, power: float) -> np.ndarray:
+    """Normalized inverse-distance weights; a station at the place itself gets all the weight"""
+    distances_km = np.asarray(distances_km, dtype=float)
+    colocated = distances_km < COLOCATED_KM
+    if colocated.any():
+        weights = colocated.astype(float)
+    else:
+        weights = distances_km ** -power
+    return weights / weights.sum()
+
+def _weighted_mean(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Weighted mean over the last axis, skipping missing values: each entry is renormalized
+    over the stations that reported it, and is NaN when none did.
+    """
+    present = ~np.isnan(values)
+    total = present @ weights
+    weighted = np.where(present, values, 0.0) @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, weighted / np.where(total > 0, total, 1.0), np.nan)
+
+class StationInterpolator:
+    """
+    Daily conditions for any coordinate, estimated from the nearest stored stations.
+
+    The stored history is kept as dense (variable × day × station) arrays, rebuilt on
+    every dataset reload, so an estimate is a few matrix-vector products over the whole
+    date range. Stations are weighted by inverse distance to the power of
+    INTERPOLATION_POWER. Before weighting, station temperatures are brought to the target
+    elevation with LAPSE_RATE_C_PER_KM; without a target elevation they are brought to the
+    weighted mean elevation of the stations used. Wind direction is averaged as a vector.
+    Stored pressure is already reduced to sea level, so it is not corrected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._dates = pd.DatetimeIndex([])
+        self._columns: Dict[str, int] = {}
+        self._values = np.empty((len(INTERPOLATED_COLUMNS), 0, 0))
+        self._wind = np.empty((2, 0, 0))  # sin and cos of wind direction
+        self._elevations = np.empty(0)
+
+    def refresh(self, manager: TimeSeriesDataManager = data_manager) -> None:
+        """Rebuild the station arrays from the current dataset"""
+        weather = manager.cache['weather']
+        stations = manager.cache['stations']
+        names = manager.station_names()
+        if weather.empty or not names:
+            dates, values, wind = pd.DatetimeIndex([]), np.empty((len(INTERPOLATED_COLUMNS), 0, len(names))), np.empty((2, 0, len(names)))
+        else:
+            columns = [column for column in INTERPOLATED_COLUMNS + ['wind_direction'] if column in weather.columns]
+            daily = weather.groupby(['date', 'city'])[columns].mean().unstack('city')
+            dates = pd.date_range(daily.index.min(), daily.index.max(), freq='D')
+            daily = daily.reindex(dates)
+
+            def matrix(column: str) -> np.ndarray:
+                if column not in columns:
+                    return np.full((len(dates), len(names)), np.nan)
+                return daily[column].reindex(columns=names).to_numpy(dtype=float)
+
+            values = np.stack([matrix(column) for column in INTERPOLATED_COLUMNS])
+            radians = np.deg2rad(matrix('wind_direction'))
+            wind = np.stack([np.sin(radians), np.cos(radians)])
+        elevations = (
+            stations['elevation'].to_numpy(dtype=float) if 'elevation' in stations.columns
+            else np.full(len(names), np.nan)
+        )
+        with self._lock:
+            self._dates, self._values, self._wind = dates, values, wind
+            self._columns = {name: index for index, name in enumerate(names)}
+            self._elevations = elevations
+            self._version = manager.dataset_version
+        logger.info(f"Built interpolation arrays for {len(names)} stations over {len(dates)} days")
+
+    def ensure_built(self) -> None:
+        if self._version != data_manager.dataset_version:
+            self.refresh()
+
+    def on_reload(self, manager: TimeSeriesDataManager) -> None:
+        if self._version is not None:
+            self.refresh(manager)
+
+    def neighbours(self, latitude: float, longitude: float, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(station name, distance_km) of the stations used for a coordinate, closest first"""
+        nearest = data_manager.find_nearest_stations(latitude, longitude, k or settings.INTERPOLATION_NEIGHBOURS)
+        return [
+            (station['name'], distance_km) for station, distance_km in nearest
+            if distance_km <= settings.INTERPOLATION_MAX_KM and station['name'] in self._columns
+        ]
+
+    def interpolate(
+        self,
+        latitude: float,
+        longitude: float,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        elevation: Optional[float] = None,
+        k: Optional[int] = None
+    ) -> Tuple[pd.DataFrame, List[Dict[str, float]]]:
+        """
+        Estimated daily rows in [start, end] for a coordinate, in stored column names, and the
+        stations used with their distance and weight. Empty when no station is within
+        INTERPOLATION_MAX_KM or none has data in the range.
+        """
+        self.ensure_built()
+        used = self.neighbours(latitude, longitude, k)
+        if not used:
+            return pd.DataFrame(columns=['date', *INTERPOLATED_COLUMNS, 'wind_direction']), []
+
+        with self._lock:
+            dates, values, wind, elevations = self._dates, self._values, self._wind, self._elevations
+            indices = np.array([self._columns[name] for name, _ in used])
+        first = dates.searchsorted(start) if start is not None else 0
+        last = dates.searchsorted(end, side='right') if end is not None else len(dates)
+        distances = np.array([distance_km for _, distance_km in used])
+        weights = idw_weights(distances, settings.INTERPOLATION_POWER)
+
+        # Fancy indexing copies, so the correction below leaves the stored arrays alone
+        window = values[:, first:last][:, :, indices]
+        station_elevations = elevations[indices]
+        known = ~np.isnan(station_elevations)
+        if known.any():
+            if elevation is None:
+                elevation = float(np.average(station_elevations[known], weights=weights[known]))
+            correction = np.where(known, station_elevations - elevation, 0.0) * settings.LAPSE_RATE_C_PER_KM / 1000
+            for column in LAPSE_RATE_COLUMNS:
+                window[INTERPOLATED_COLUMNS.index(column)] += correction
+
+        estimates = _weighted_mean(window, weights)
+        sin, cos = _weighted_mean(wind[:, first:last][:, :, indices], weights)
+        frame = pd.DataFrame(estimates.T.round(1), columns=INTERPOLATED_COLUMNS)
+        frame.insert(0, 'date', dates[first:last])
+        frame['wind_direction'] = (np.rad2deg(np.arctan2(sin, cos)).round() % 360)
+        frame = frame.dropna(subset=['temperature']).reset_index(drop=True)
+        sources = [
+            {'station': name, 'distance_km': round(distance_km, 1), 'weight': round(float(weight), 3)}
+            for (name, distance_km), weight in zip(used, weights)
+        ]
+        return frame, sources
+
+# Create a singleton instance and rebuild its arrays as new days are ingested
+station_interpolator = StationInterpolator()
+data_manager.add_reload_listener(station_interpolator.on_reload)
@@ -0,0 +1,125 @@
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime
+import logging
+import threading
+import time
+import pandas as pd
+from app.core.config import settings
+from app.utils.data_loader import data_manager, get_location_data, TimeSeriesDataManager
+from app.utils.hourly_store import hourly_store
+from app.utils.nlp_parser import _fallback_parse
+from app.services.climate_analytics import climate_analytics
+from app.services.forecast_service import forecast_service
+from app.services.analysis_cache import CACHEABLE_INTENTS
+from app.services.query_log import query_log
+from app.services.sample_queries import sample_query_pool
+
+logger = logging.getLogger(__name__)
+
+class Warmup:
+    """
+    Startup warm-up for a worker, run in the background from the app lifespan.
+
+    Builds everything that is otherwise built on the first request: climate
+    analytics, station forecasts and the sample query pool. It then walks the
+    lookup, history, forecast and parsing paths for the top cities, and answers the
+    QUERY_PREWARM_TOP_N most-asked queries of the query log into the analysis cache,
+    so the first real requests do not pay for it. Only those answers may call an
+    upstream, within QUERY_PREWARM_BUDGET_SECONDS. They are answered again after each
+    dataset reload. A step that fails is logged and reported, and does not keep the
+    worker from becoming ready.
+    """
+
+    def __init__(self, top_cities: Optional[int] = None):
+        self.top_cities = top_cities if top_cities is not None else settings.WARMUP_TOP_CITIES
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._ready = threading.Event()
+        self._weather_service: Optional[Any] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def cities(self) -> List[str]:
+        """Cities to preload: the default city, then the most asked stations, then the rest"""
+        names = {name.lower(): name for name in data_manager.station_names()}
+        preferred = [settings.DEFAULT_CITY] + query_log.top_locations(self.top_cities)
+        ordered = [names[name.lower()] for name in preferred if name.lower() in names]
+        ordered += list(names.values())
+        return list(dict.fromkeys(ordered))[:self.top_cities]
+
+    def _step(self, name: str, action: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            detail = action()
+            self.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3), "detail": detail}
+        except Exception as e:
+            logger.error(f"Warm-up step {name} failed: {e}")
+            self.steps[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3), "detail": str(e)}
+
+    @staticmethod
+    def _warm_forecasts() -> int:
+        forecast_service.ensure_built()
+        return forecast_service.snapshot()["precomputed"]
+
+    def _warm_city(self, weather_service: Any, city: str) -> None:
+        get_location_data(city)
+        weather_service._get_city_data(city, days=7)
+        try:
+            forecast_service.get_forecast(city, settings.FORECAST_DAYS)
+        except ValueError as e:
+            # Stations without recent stored history are forecast from fetched history on first request
+            logger.info(f"No stored forecast for {city}: {e}")
+        _fallback_parse(f"What's the weather forecast for {city} for the next 7 days?")
+        _fallback_parse(f"What was it like in {city} yesterday afternoon?")
+        # Hourly partitions of the current month, when the city has any stored
+        month = pd.Timestamp.utcnow().tz_localize(None).to_period('M')
+        hourly_store.read(city, month.start_time, month.end_time)
+
+    def run(self, weather_service: Any) -> None:
+        """Run every warm-up step, then mark the worker ready"""
+        self.started_at = datetime.now()
+        started = time.perf_counter()
+        self._step("climate_analytics", climate_analytics.ensure_built)
+        self._step("forecasts", self._warm_forecasts)
+        self._step("sample_queries", lambda: sample_query_pool.current()[0])
+        cities = self.cities()
+        for city in cities:
+            self._step(f"city:{city}", lambda city=city: self._warm_city(weather_service, city))
+        self._step("top_queries", lambda: self.prewarm_queries(weather_service))
+        self._weather_service = weather_service
+        self.finished_at = datetime.now()
+        self._ready.set()
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s ({len(cities)} cities)")
+
+    @staticmethod
+    def prewarm_queries(weather_service: Any) -> int:
+        """Answer the most asked queries into the analysis cache"""
+        top = query_log.top(settings.QUERY_PREWARM_TOP_N, intents=list(CACHEABLE_INTENTS))
+        return weather_service.prewarm_queries(top)
+
+    def on_reload(self, manager: TimeSeriesDataManager) -> None:
+        """Answers are keyed on the dataset version, so answer the top queries again in the background"""
+        if self._weather_service is not None:
+            threading.Thread(
+                target=self._step, args=("top_queries", lambda: self.prewarm_queries(self._weather_service)),
+                name="query-prewarm", daemon=True
+            ).start()
+
+    def mark_ready(self) -> None:
+        """Mark the worker ready without warming up, e.g. when warm-up is disabled"""
+        self._ready.set()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "steps": dict(self.steps)
+        }
+
+# Create a singleton instance and answer the top queries again as new days are ingested
+warmup = Warmup()
+data_manager.add_reload_listener(warmup.on_reload)
@@ -1,75 +1,86 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
-from app.models.weather import WeatherResponse, ForecastRequest, AnalysisResponse, WeatherData
-from app.utils.nlp_parser import parse_query
-from app.utils.data_loader import get_location_data
-from app.utils.forecasting import generate_forecast
-from meteostat import Point, Daily
+from app.models.weather import WeatherResponse, ForecastRequest, AnalysisResponse, WeatherData, CityAggregate, AnomalyReport
+from app.utils.nlp_parser import parse_query_text, geocode_locations_async, hourly_window
+from app.core.config import settings
+from app.utils.data_loader import data_manager, get_location_data, find_nearest_station
+from app.utils.downsampling import downsample_indices
+from meteostat import Point, Daily, Hourly, Stations
+import asyncio
 import logging
+import time
+import numpy as np
 import pandas as pd
-import os
 from app.utils.open_weather_api import OpenWeatherAPI
+from app.utils.circuit_breaker import CircuitOpenError, UpstreamRateLimited, upstream_call
+from app.services.current_weather_prefetcher import current_weather_prefetcher
+from app.services.climate_analytics import climate_analytics
+from app.services.hourly_history import hourly_history
+from app.services.forecast_service import forecast_service
+from app.services.spatial_interpolation import station_interpolator
+from app.services.query_log import QueryKey, normalize_query, query_log
+from app.services.analysis_cache import analysis_cache
+from app.utils.hourly_store import CONDITION_DESCRIPTIONS
 
 logger = logging.getLogger(__name__)
 
+# Point Meteostat at a mirror or local stand-in when configured
+if settings.METEOSTAT_ENDPOINT:
+    Daily.endpoint = Hourly.endpoint = Stations.endpoint = settings.METEOSTAT_ENDPOINT.rstrip("/") + "/"
+
 class WeatherService:
     def __init__(self):
-        print("\n=== Initializing Weather Service ===")
-        self.csv_path = os.path.join('data', 'weather', 'capital_cities_weather.csv')
-        print(f"CSV path: {self.csv_path}")
         self._load_capital_cities_data()
-        print("===================================\n")
+        
+    @property
+    def capital_cities_data(self) -> pd.DataFrame:
+        """Capital cities weather data, owned (and reloaded) by the data manager"""
+        return data_manager.cache['weather']
         
     def _load_capital_cities_data(self):
-        """Load the capital cities weather data from CSV"""
-        try:
-            print("\n=== Loading Capital Cities Data ===")
-            print(f"Attempting to load from: {self.csv_path}")
-            self.capital_cities_data = pd.read_csv(self.csv_path)
-            print(f"Successfully loaded capital cities data")
-            print(f"Total rows: {len(self.capital_cities_data)}")
-            print(f"Columns: {self.capital_cities_data.columns.tolist()}")
-            print(f"Sample data:\n{self.capital_cities_data.head(2)}")
-            print("================================\n")
-            logger.info(f"Successfully loaded capital cities weather data with {len(self.capital_cities_data)} rows")
-        except Exception as e:
-            print(f"ERROR loading capital cities data: {str(e)}")
-            logger.error(f"Error loading capital cities weather data: {e}")
-            self.capital_cities_data = pd.DataFrame()
+        """Report on the capital cities weather data loaded by the data manager"""
+        if self.capital_cities_data.empty:
+            logger.error("Capital cities weather data is empty")
+            return
+        logger.debug("Capital cities columns: %s, sample:\n%s", self.capital_cities_data.columns.tolist(), self.capital_cities_data.head(2))
+        logger.info(f"Successfully loaded capital cities weather data with {len(self.capital_cities_data)} rows")
+            
+    @staticmethod
+    def _resolve_date_range(
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None
+    ) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """Resolve optional start/end/days into a concrete range, defaulting to the last 7 days"""
+        # Set default date range to last 7 days if not specified
+        if not end_date:
+            end_date = pd.Timestamp.now()
+        else:
+            end_date = pd.to_datetime(end_date)
             
+        if not start_date:
+            if days:
+                start_date = end_date - pd.Timedelta(days=days)
+            else:
+                start_date = end_date - pd.Timedelta(days=7)
+        else:
+            start_date = pd.to_datetime(start_date)
+        return start_date, end_date
+        
     def _get_city_data(self, city: str, start_date: Optional[str] = None, end_date: Optional[str] = None, days: Optional[int] = None) -> pd.DataFrame:
         """Get weather data for a specific city from the capital cities dataset"""
         try:
-            print(f"\n=== Searching for City Data ===")
-            print(f"City: {city}")
-            
-            # Create a copy of the filtered data to avoid SettingWithCopyWarning
-            city_data = self.capital_cities_data[self.capital_cities_data['city'].str.lower() == city.lower()].copy()
-            
-            print(f"Found {len(city_data)} rows for {city}")
+            # Dates and city keys are parsed once by the data manager
+            data = self.capital_cities_data
+            if data.empty:
+                return pd.DataFrame()
+            city_data = data[data['city_key'] == city.lower().strip()]
             
             if city_data.empty:
-                print("No data found for this city")
+                logger.debug(f"No stored data for {city}")
                 return pd.DataFrame()
                 
-            # Convert time column to datetime using loc
-            city_data.loc[:, 'date'] = pd.to_datetime(city_data['time'])
-            
-            # Set default date range to last 7 days if not specified
-            if not end_date:
-                end_date = pd.Timestamp.now()
-            else:
-                end_date = pd.to_datetime(end_date)
-                
-            if not start_date:
-                if days:
-                    start_date = end_date - pd.Timedelta(days=days)
-                else:
-                    start_date = end_date - pd.Timedelta(days=7)
-            else:
-                start_date = pd.to_datetime(start_date)
-            
-            print(f"Filtering data from {start_date} to {end_date}")
+            start_date, end_date = self._resolve_date_range(start_date, end_date, days)
             
             # Filter by date range
             city_data = city_data[
@@ -77,12 +88,9 @@ class WeatherService:
                 (city_data['date'] <= end_date)
             ]
             
-            print(f"After date filtering: {len(city_data)} rows")
-            print(f"Final data sample:\n{city_data.head(2)}")
-            print("==============================\n")
+            logger.debug(f"Found {len(city_data)} rows for {city} from {start_date} to {end_date}")
             return city_data
         except Exception as e:
-            print(f"Error in _get_city_data: {str(e)}")
             logger.error(f"Error getting city data: {e}")
             return pd.DataFrame()
         
@@ -111,9 +119,6 @@ class WeatherService:
     def _convert_to_weather_data(self, data: Dict[str, Any], city: str) -> WeatherData:
         """Convert raw data to WeatherData model"""
         try:
-            print(f"\n=== Converting Weather Data ===")
-            print(f"Input data: {data}")
-            
             # Map column names to expected format
             date_str = data.get('date', data.get('time', data.get('Date', data.get('Time'))))
             temp = data.get('temperature', data.get('Temperature', data.get('TEMP')))
@@ -122,14 +127,6 @@ class WeatherService:
             pressure = data.get('pressure', data.get('Pressure', data.get('PRES')))
             description = data.get('description', data.get('Description', data.get('DESC', 'Clear')))
             
-            print(f"Extracted values:")
-            print(f"Date: {date_str}")
-            print(f"Temperature: {temp}")
-            print(f"Humidity: {humidity}")
-            print(f"Wind: {wind}")
-            print(f"Pressure: {pressure}")
-            print(f"Description: {description}")
-            
             # Convert date string to datetime
             if isinstance(date_str, (str, pd.Timestamp)):
                 date = pd.to_datetime(date_str)
@@ -138,187 +135,814 @@ class WeatherService:
                 
             weather_data = WeatherData(
                 date=date,
-                temperature=float(temp) if temp is not None else 0.0,
-                humidity=float(humidity) if humidity is not None else 0.0,
-                windSpeed=float(wind) if wind is not None else 0.0,
-                pressure=float(pressure) if pressure is not None else 1013.25,
+                # Missing readings come through as None or NaN
+                temperature=float(temp) if not pd.isna(temp) else 0.0,
+                humidity=float(humidity) if not pd.isna(humidity) else 0.0,
+                windSpeed=float(wind) if not pd.isna(wind) else 0.0,
+                pressure=float(pressure) if not pd.isna(pressure) else 1013.25,
                 description=str(description),
                 city=city,
                 icon=self._get_weather_icon(str(description))
             )
-            print(f"Converted WeatherData: {weather_data}")
-            print("==============================\n")
             return weather_data
         except Exception as e:
-            print(f"Error in _convert_to_weather_data: {str(e)}")
             logger.error(f"Error converting data to WeatherData: {e}")
             logger.error(f"Input data: {data}")
             raise
             
-    async def get_historical_data(
+    async def get_current_weather(self, city: str, country: Optional[str] = None) -> WeatherResponse:
+        """
+        Get current weather for a city from the prefetched in-memory snapshot.
+        Cities outside the station set are fetched once on demand and then kept in the snapshot.
+        """
+        current = current_weather_prefetcher.get(city)
+        if current is None:
+            logger.info(f"No prefetched current weather for {city}, fetching on demand")
+            current = await asyncio.to_thread(current_weather_prefetcher.refresh_city, city)
+        if current is None:
+            # OpenWeather is down or its circuit is open: serve the latest stored day instead
+            current = self._latest_stored_weather(city)
+            if current is not None:
+                logger.warning(f"Serving stored weather from {current.date:%Y-%m-%d} as current weather for {city}")
+        if current is None:
+            raise ValueError(f"No current weather available for {city}")
+        
+        return WeatherResponse(
+            forecast=[current],
+            city=current.city,
+            generated_at=current.date
+        )
+        
+    def _latest_stored_weather(self, city: str) -> Optional[WeatherData]:
+        """Most recent stored day for a city's station, the degraded stand-in for current weather"""
+        location_data = get_location_data(city)
+        if not location_data:
+            return None
+        data = self.capital_cities_data
+        if data.empty:
+            return None
+        rows = data[data['city_key'] == location_data['name'].lower().strip()]
+        if rows.empty:
+            return None
+        return self._convert_to_weather_data(rows.loc[rows['date'].idxmax()].to_dict(), location_data['name'])
+        
+    def _get_historical_frame(
         self,
         city: str,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        days: Optional[int] = None
-    ) -> List[WeatherData]:
+        days: Optional[int] = None,
+        coordinates: Optional[Dict[str, float]] = None
+    ) -> Tuple[pd.DataFrame, str]:
         """
-        Get historical weather data for a specific city from the capital cities dataset.
-        Falls back to Meteostat if data is not available in the CSV.
+        Get raw historical rows for a city and the name of the location they belong to.
+        If the city is not a station but its coordinates are known, the nearest station
+        within NEAREST_STATION_MAX_KM is served from stored data instead, and failing that
+        an estimate interpolated from the stations within INTERPOLATION_MAX_KM.
+        Falls back to Meteostat if no stored data is close enough.
         """
-        try:
-            print(f"\n=== Getting Historical Data ===")
-            print(f"City: {city}")
-            print(f"Date range: {start_date} to {end_date}")
-            print(f"Days: {days}")
-            
-            # Try to get data from capital cities CSV first
-            city_data = self._get_city_data(city, start_date, end_date, days)
-            
+        logger.debug(f"Getting historical data for {city}: {start_date} to {end_date}, {days} days")
+        
+        # Try to get data from capital cities CSV first
+        city_data = self._get_city_data(city, start_date, end_date, days)
+        
+        if not city_data.empty:
+            return city_data, city
+        
+        # Not a named station, try the nearest stored station
+        if coordinates:
+            station = find_nearest_station(
+                coordinates['lat'], coordinates['lon'],
+                max_distance_km=settings.NEAREST_STATION_MAX_KM
+            )
+            if station:
+                logger.info(f"Using nearest station {station['name']} ({station['distance_km']:.1f} km from {city})")
+                city_data = self._get_city_data(station['name'], start_date, end_date, days)
+                if not city_data.empty:
+                    return city_data, station['name']
+            
+            # Estimate the place itself from the stations around it
+            start, end = self._resolve_date_range(start_date, end_date, days)
+            city_data, sources = station_interpolator.interpolate(coordinates['lat'], coordinates['lon'], start, end)
             if not city_data.empty:
-                print(f"Found {len(city_data)} rows in capital cities dataset")
-                result = [
-                    self._convert_to_weather_data(record, city)
-                    for record in city_data.to_dict('records')
-                ]
-                print(f"Returning {len(result)} WeatherData objects")
-                return result
-            
-            print("No data found in capital cities dataset, falling back to Meteostat")
+                logger.info(f"Interpolated {city} from {', '.join(source['station'] for source in sources)}")
+                city_data['city'] = city
+                return city_data, city
+        
+        logger.info(f"No stored data for {city}, falling back to Meteostat")
+        
+        # If no data in CSV, fall back to Meteostat
+        # Get location data
+        location_data = get_location_data(city)
+        if not location_data and coordinates:
+            location_data = {'latitude': coordinates['lat'], 'longitude': coordinates['lon']}
+        if not location_data:
+            raise ValueError(f"Location {city} not found in our database")
+            
+        # Set default dates if not provided
+        if not end_date:
+            end_date = datetime.now()
+        else:
+            end_date = pd.to_datetime(end_date)
             
-            # If no data in CSV, fall back to Meteostat
-            # Get location data
-            location_data = get_location_data(city)
-            if not location_data:
-                raise ValueError(f"Location {city} not found in our database")
-                
-            # Set default dates if not provided
-            if not end_date:
-                end_date = datetime.now()
-            else:
-                end_date = pd.to_datetime(end_date)
-                
-            if not start_date:
-                if days:
-                    start_date = end_date - timedelta(days=days)
-                else:
-                    start_date = end_date - timedelta(days=7)
+        if not start_date:
+            if days:
+                start_date = end_date - timedelta(days=days)
             else:
-                start_date = pd.to_datetime(start_date)
-                
-            # Create Point object for the city
-            location = Point(location_data['latitude'], location_data['longitude'])
-            
-            # Get daily weather data
-            data = Daily(location, start_date, end_date)
-            data = data.fetch()
-            
-            if data.empty:
-                raise ValueError(f"No historical data found for {city}")
-            
-            # Reset index to make date a column
-            data = data.reset_index()
-            
-            # Add city name
-            data['city'] = city
-            
-            # Rename columns to match our format
-            data = data.rename(columns={
-                'date': 'date',
-                'tavg': 'temperature',
-                'tmin': 'min_temperature',
-                'tmax': 'max_temperature',
-                'prcp': 'precipitation',
-                'snow': 'snow',
-                'wdir': 'wind_direction',
-                'wspd': 'wind_speed',
-                'wpgt': 'wind_gust',
-                'pres': 'pressure',
-                'tsun': 'sunshine'
-            })
-            
-            logger.info(f"Retrieved {len(data)} rows of historical data from Meteostat")
+                start_date = end_date - timedelta(days=7)
+        else:
+            start_date = pd.to_datetime(start_date)
             
-            # Convert to WeatherData objects
+        # Create Point object for the city
+        location = Point(location_data['latitude'], location_data['longitude'])
+        
+        # Get daily weather data. Meteostat reports HTTP errors as an empty frame, so only
+        # network errors and timeouts count against its circuit.
+        try:
+            with upstream_call('meteostat'):
+                data = Daily(location, start_date, end_date)
+                data = data.fetch()
+        except (CircuitOpenError, UpstreamRateLimited) as e:
+            return self._nearest_stored_frame(city, location_data, start_date, end_date, e)
+        
+        if data.empty:
+            raise ValueError(f"No historical data found for {city}")
+        
+        # Reset index to make date a column
+        data = data.reset_index()
+        
+        # Add city name
+        data['city'] = city
+        
+        # Rename columns to match our format
+        data = data.rename(columns={
+            'date': 'date',
+            'tavg': 'temperature',
+            'tmin': 'min_temperature',
+            'tmax': 'max_temperature',
+            'prcp': 'precipitation',
+            'snow': 'snow',
+            'wdir': 'wind_direction',
+            'wspd': 'wind_speed',
+            'wpgt': 'wind_gust',
+            'pres': 'pressure',
+            'tsun': 'sunshine'
+        })
+        
+        logger.info(f"Retrieved {len(data)} rows of historical data from Meteostat")
+        return data, city
+        
+    def _nearest_stored_frame(
+        self,
+        city: str,
+        location_data: Dict[str, Any],
+        start_date: datetime,
+        end_date: datetime,
+        reason: Exception
+    ) -> Tuple[pd.DataFrame, str]:
+        """Degraded answer while Meteostat is unavailable: the nearest stored station, however far"""
+        station = find_nearest_station(location_data['latitude'], location_data['longitude'])
+        if station:
+            city_data = self._get_city_data(station['name'], f"{start_date:%Y-%m-%d}", f"{end_date:%Y-%m-%d}")
+            if not city_data.empty:
+                logger.warning(
+                    f"{reason}; serving {station['name']} ({station['distance_km']:.0f} km away) for {city}"
+                )
+                return city_data, station['name']
+        raise ValueError(f"Historical data for {city} is temporarily unavailable, try again shortly")
+        
+    def _to_columnar_frame(self, data: pd.DataFrame, city: str) -> pd.DataFrame:
+        """
+        Vectorized equivalent of _convert_to_weather_data over a whole frame.
+        Returns one column per WeatherData field.
+        """
+        n = len(data)
+        description = data['description'].astype(str) if 'description' in data.columns else pd.Series(['Clear'] * n, index=data.index)
+        lowered = description.str.lower()
+        # Same precedence as _get_weather_icon
+        icon = np.select(
+            [
+                lowered.str.contains('clear'),
+                lowered.str.contains('sunny'),
+                lowered.str.contains('partly cloudy'),
+                lowered.str.contains('cloudy'),
+                lowered.str.contains('rain'),
+                lowered.str.contains('thunder'),
+                lowered.str.contains('snow'),
+                lowered.str.contains('mist') | lowered.str.contains('fog')
+            ],
+            ['01d', '01d', '02d', '04d', '10d', '11d', '13d', '50d'],
+            default='01d'
+        )
+        
+        def numeric(column: str, default: float) -> pd.Series:
+            if column not in data.columns:
+                return pd.Series(np.full(n, default), index=data.index)
+            return pd.to_numeric(data[column], errors='coerce').astype(float)
+        
+        dates = data['date'] if 'date' in data.columns else data['time']
+        return pd.DataFrame({
+            'date': pd.to_datetime(dates).to_numpy(),
+            'temperature': numeric('temperature', 0.0).to_numpy(),
+            'humidity': numeric('humidity', 0.0).to_numpy(),
+            'windSpeed': numeric('wind_speed', 0.0).to_numpy(),
+            'pressure': numeric('pressure', 1013.25).to_numpy(),
+            'description': description.to_numpy(),
+            'city': city,
+            'icon': icon
+        })
+        
+    # Stored columns and WeatherData fields drawn by the chart
+    CHART_COLUMNS = ['temperature', 'humidity', 'wind_speed', 'pressure']
+    CHART_FIELDS = ['temperature', 'humidity', 'windSpeed', 'pressure']
+    
+    def _downsample_frame(
+        self,
+        data: pd.DataFrame,
+        points: int,
+        method: str = 'lttb',
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Keep at most `points` rows, chosen so every chart series keeps its shape.
+        `columns` are the series, the stored CHART_COLUMNS by default.
+        """
+        points = min(points, settings.MAX_CHART_POINTS)
+        if len(data) <= points:
+            return data
+        date_column = 'date' if 'date' in data.columns else 'time'
+        data = data.sort_values(date_column, kind='stable')
+        x = pd.to_datetime(data[date_column]).to_numpy().astype('datetime64[s]').astype(np.int64)
+        series = [
+            pd.to_numeric(data[column], errors='coerce').to_numpy(dtype=float)
+            for column in (columns or self.CHART_COLUMNS) if column in data.columns
+        ]
+        return data.iloc[downsample_indices(x, series, points, method)]
+        
+    async def get_historical_data(
+        self,
+        city: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None,
+        coordinates: Optional[Dict[str, float]] = None,
+        points: Optional[int] = None,
+        method: str = 'lttb'
+    ) -> List[WeatherData]:
+        """
+        Get historical weather data for a specific city from the capital cities dataset.
+        If the city is not a station but its coordinates are known, the nearest station
+        within NEAREST_STATION_MAX_KM is served from stored data instead.
+        Falls back to Meteostat if no stored data is close enough.
+        With `points`, the rows are downsampled to at most that many for charting.
+        """
+        try:
+            data, location = await asyncio.to_thread(
+                self._get_historical_frame, city, start_date, end_date, days, coordinates
+            )
+            if points:
+                data = self._downsample_frame(data, points, method)
             result = [
-                self._convert_to_weather_data(record, city)
+                self._convert_to_weather_data(record, location)
                 for record in data.to_dict('records')
             ]
-            
-            print("==============================\n")
             return result
         except Exception as e:
-            print(f"Error in get_historical_data: {str(e)}")
+            logger.error(f"Error getting historical data: {str(e)}")
+            raise Exception(f"Error getting historical data: {str(e)}")
+            
+    async def get_historical_columns(
+        self,
+        city: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None,
+        coordinates: Optional[Dict[str, float]] = None,
+        points: Optional[int] = None,
+        method: str = 'lttb'
+    ) -> pd.DataFrame:
+        """
+        Get historical weather data as a columnar frame with one column per WeatherData field,
+        without materializing per-row models. Used for binary and columnar response encodings.
+        """
+        try:
+            data, location = await asyncio.to_thread(
+                self._get_historical_frame, city, start_date, end_date, days, coordinates
+            )
+            if points:
+                data = self._downsample_frame(data, points, method)
+            return self._to_columnar_frame(data, location)
+        except Exception as e:
             logger.error(f"Error getting historical data: {str(e)}")
             raise Exception(f"Error getting historical data: {str(e)}")
                 
-    async def analyze_weather(self, query: str) -> AnalysisResponse:
-        """Analyze weather data based on natural language query"""
+    # Parsed comparison metrics mapped to the aggregate they rank by
+    COMPARISON_METRICS = {
+        'temperature': 'avg_temperature',
+        'precipitation': 'total_precipitation',
+        'wind_speed': 'avg_wind_speed',
+        'pressure': 'avg_pressure'
+    }
+    
+    def compare_cities(
+        self,
+        cities: Optional[List[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None,
+        metric: str = 'temperature',
+        order: str = 'highest'
+    ) -> List[CityAggregate]:
+        """
+        Rank cities by an aggregate over a date range.
+        All cities are compared when `cities` is empty. The aggregates for every city are
+        computed in a single group-by over the date-sliced dataset, so the cost does not
+        grow with the number of cities compared.
+        """
+        data = self.capital_cities_data
+        if data.empty:
+            return []
+        
+        start, end = self._resolve_date_range(start_date, end_date, days)
+        mask = (data['date'] >= start) & (data['date'] <= end)
+        if cities:
+            mask &= data['city_key'].isin([city.lower().strip() for city in cities])
+        sliced = data[mask]
+        if sliced.empty:
+            return []
+        
+        aggregates = sliced.groupby('city', sort=False).agg(
+            days=('date', 'nunique'),
+            avg_temperature=('temperature', 'mean'),
+            max_temperature=('max_temperature', 'max'),
+            min_temperature=('min_temperature', 'min'),
+            total_precipitation=('precipitation', 'sum'),
+            avg_wind_speed=('wind_speed', 'mean'),
+            avg_pressure=('pressure', 'mean')
+        )
+        rank_by = self.COMPARISON_METRICS.get(metric, 'avg_temperature')
+        aggregates = aggregates.sort_values(rank_by, ascending=(order == 'lowest'), na_position='last').round(1)
+        aggregates['rank'] = np.arange(1, len(aggregates) + 1)
+        # NaN aggregates (e.g. no pressure readings) become None
+        aggregates = aggregates.astype(object).where(aggregates.notna(), None)
+        
+        return [
+            CityAggregate(city=city, **record)
+            for city, record in zip(aggregates.index, aggregates.to_dict('records'))
+        ]
+        
+    def _generate_comparison_summary(self, ranking: List[CityAggregate], metric: str, order: str, days: int) -> str:
+        """Generate a text summary of a city ranking"""
+        rank_by = self.COMPARISON_METRICS.get(metric, 'avg_temperature')
+        units = {'avg_temperature': '°C', 'total_precipitation': ' mm', 'avg_wind_speed': ' km/h', 'avg_pressure': ' hPa'}[rank_by]
+        label = rank_by.replace('_', ' ')
+        lines = [f"Cities ranked by {label} ({order} first) over the last {days} days:"]
+        for aggregate in ranking[:10]:
+            value = getattr(aggregate, rank_by)
+            lines.append(f"{aggregate.rank}. {aggregate.city}: " + (f"{value:.1f}{units}" if value is not None else "n/a"))
+        return "\n".join(lines)
+        
+    def _analyze_comparison(self, parsed: Dict[str, Any]) -> AnalysisResponse:
+        """Answer a multi-city comparison or ranking query"""
+        cities = [] if parsed.get('all_locations') else parsed.get('locations') or []
+        days = parsed.get('duration') or 7
+        metric = parsed.get('metric') or 'temperature'
+        order = parsed.get('order') or 'highest'
+        logger.debug(f"Comparing {cities or 'all cities'} by {metric} ({order}) over {days} days")
+        
+        ranking = self.compare_cities(cities, days=days, metric=metric, order=order)
+        if not ranking:
+            raise ValueError(f"No weather data found for {', '.join(cities) or 'any city'} in the last {days} days")
+        
+        return AnalysisResponse(
+            data=[],
+            format=parsed.get('format', 'table'),
+            text_summary=self._generate_comparison_summary(ranking, metric, order, days),
+            comparison=ranking
+        )
+
+    def get_anomaly_report(
+        self,
+        city: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None,
+        kinds: Optional[List[str]] = None,
+        threshold: float = 2.0
+    ) -> AnomalyReport:
+        """
+        Extreme events, anomalous days and records for a city over a date range.
+        Events, climatology and records are precomputed by climate_analytics, so only
+        the requested slice of the city's data is touched here.
+        """
+        start, end = self._resolve_date_range(start_date, end_date, days)
+        data = self.capital_cities_data
+        rows = data[
+            (data['city_key'] == city.lower().strip()) & (data['date'] >= start) & (data['date'] <= end)
+        ] if not data.empty else data
+        records = climate_analytics.get_records(city)
+        return AnomalyReport(
+            city=records.get('city', city),
+            start_date=start,
+            end_date=end,
+            events=climate_analytics.get_events(city, start, end, kinds),
+            anomalies=climate_analytics.get_anomalies(rows, threshold),
+            record_high=records.get('record_high'),
+            record_low=records.get('record_low')
+        )
+
+    def _generate_anomaly_summary(self, report: AnomalyReport) -> str:
+        """Generate a text summary of an anomaly report"""
+        labels = {'heatwave': 'Heatwave', 'cold_snap': 'Cold snap', 'dry_spell': 'Dry spell'}
+        period = f"{report.start_date:%Y-%m-%d} to {report.end_date:%Y-%m-%d}"
+        if report.events:
+            lines = [f"Extreme events in {report.city} from {period}:"]
+            for event in report.events:
+                peak = ''
+                if event.peak is not None:
+                    peak = f", {event.peak:.1f} mm total" if event.kind == 'dry_spell' else f", peak {event.peak:.1f}°C"
+                lines.append(f"- {labels.get(event.kind, event.kind)}: {event.start:%Y-%m-%d} to {event.end:%Y-%m-%d} ({event.days} days{peak})")
+        else:
+            lines = [f"No heatwaves, cold snaps or dry spells in {report.city} from {period}."]
+        if report.anomalies:
+            strongest = max(report.anomalies, key=lambda anomaly: abs(anomaly.zscore))
+            lines.append(
+                f"Unusually warm or cold days: {len(report.anomalies)}; the most extreme was {strongest.date:%Y-%m-%d} "
+                f"at {strongest.temperature:.1f}°C against a normal of {strongest.normal:.1f}°C."
+            )
+        if report.record_high and report.record_low:
+            lines.append(
+                f"Records on file: high {report.record_high.value:.1f}°C ({report.record_high.date:%Y-%m-%d}), "
+                f"low {report.record_low.value:.1f}°C ({report.record_low.date:%Y-%m-%d})."
+            )
+        return "\n".join(lines)
+
+    def _analyze_anomalies(self, parsed: Dict[str, Any]) -> AnalysisResponse:
+        """Answer an extreme-event query such as "were there any heatwaves in Athens last summer" """
+        location = parsed.get('location')
+        if not location:
+            raise ValueError("No location specified in query")
+        logger.debug(f"Looking up {parsed.get('event_kinds') or 'all'} events for {location}")
+
+        report = self.get_anomaly_report(
+            location,
+            start_date=parsed.get('start_date'),
+            end_date=parsed.get('end_date'),
+            days=parsed.get('duration') or 30,
+            kinds=parsed.get('event_kinds') or None
+        )
+        return AnalysisResponse(
+            data=[],
+            format='text',
+            text_summary=self._generate_anomaly_summary(report),
+            anomalies=report
+        )
+
+    async def _resolve_history(self, parsed: Dict[str, Any], days: int) -> Tuple[pd.DataFrame, str]:
+        """
+        Historical rows for the parsed location, as a columnar frame of WeatherData fields
+        with missing readings filled like _convert_to_weather_data does, and the name of
+        the location they belong to.
+        The geocode is only needed when the name is not a stored station, so it runs
+        concurrently with the local lookup instead of ahead of it.
+        """
+        location = parsed['location']
+        geocoded, local = await asyncio.gather(
+            geocode_locations_async(parsed),
+            asyncio.to_thread(self._get_city_data, location, None, None, days)
+        )
+        if local.empty:
+            # Standardized name, nearest station or Meteostat
+            local, location = await asyncio.to_thread(
+                self._get_historical_frame,
+                geocoded['location'], None, None, days, geocoded.get('coordinates')
+            )
+        return self._to_columnar_frame(local, location).fillna(self.FIELD_DEFAULTS), location
+    
+    # Fill values for missing readings, as in _convert_to_weather_data
+    FIELD_DEFAULTS = {'temperature': 0.0, 'humidity': 0.0, 'windSpeed': 0.0, 'pressure': 1013.25}
+    # WeatherData fields each answer format renders. Text answers show the first row as a
+    # card and summaries show no rows; both are otherwise computed from aggregates.
+    FORMAT_FIELDS = {
+        'table': ['date', 'temperature', 'humidity', 'windSpeed', 'pressure', 'description', 'city'],
+        'chart': ['date', 'temperature', 'humidity', 'windSpeed', 'pressure', 'city']
+    }
+    
+    def _shape_rows(
+        self,
+        frame: pd.DataFrame,
+        requested_format: str,
+        points: Optional[int] = None,
+        extra_fields: Sequence[str] = ()
+    ) -> pd.DataFrame:
+        """
+        The rows and columns of a history frame that an answer in `requested_format` renders.
+        `extra_fields` are kept alongside the FORMAT_FIELDS of charts and tables.
+        """
+        if requested_format == 'summary':
+            return frame.iloc[:0]
+        if requested_format == 'chart':
+            frame = self._downsample_frame(frame, points or settings.CHART_POINT_BUDGET, columns=self.CHART_FIELDS)
+        if requested_format in self.FORMAT_FIELDS:
+            return frame[self.FORMAT_FIELDS[requested_format] + list(extra_fields)]
+        return frame.iloc[:1]
+    
+    def _summarize_frame(self, frame: pd.DataFrame, city: str, generated_at: datetime) -> str:
+        """_generate_summary over a history frame, from aggregates instead of rows"""
+        if len(frame) == 1:
+            row = frame.iloc[0]
+            return f"Current weather in {city}:\n" \
+                   f"Temperature: {row['temperature']:.1f}°C\n" \
+                   f"Humidity: {row['humidity']}%\n" \
+                   f"Wind Speed: {row['windSpeed']} m/s\n" \
+                   f"Conditions: {row['description']}\n" \
+                   f"Last updated: {generated_at}"
+        temperature = frame['temperature'].to_numpy()
+        return f"Weather data for {city}:\n" \
+               f"Average temperature: {temperature.mean():.1f}°C\n" \
+               f"Maximum temperature: {temperature.max():.1f}°C\n" \
+               f"Minimum temperature: {temperature.min():.1f}°C\n" \
+               f"Data generated at: {generated_at}"
+
+    async def _analyze_current(self, parsed: Dict[str, Any]) -> Optional[AnalysisResponse]:
+        """
+        Answer a current-conditions query, with the past week for context.
+        Current conditions and history are fetched concurrently. Returns None when no
+        current conditions are available, so the caller can answer from history instead.
+        """
+        location = parsed['location']
+        current, history = await asyncio.gather(
+            self.get_current_weather(location),
+            self._resolve_history(parsed, 7),
+            return_exceptions=True
+        )
+        if isinstance(current, Exception):
+            logger.warning(f"Current weather unavailable for {location}: {current}")
+            return None
+        
+        summary = self._generate_summary(current)
+        if not isinstance(history, Exception) and not history[0].empty:
+            rows = history[0]
+            week_avg = rows['temperature'].mean()
+            summary += f"\nPast {len(rows)} days average temperature: {week_avg:.1f}°C " \
+                       f"({current.forecast[0].temperature - week_avg:+.1f}°C today)"
+        return AnalysisResponse(
+            data=current.forecast,
+            format=parsed.get('format', 'text'),
+            text_summary=summary
+        )
+
+    def _analyze_hourly(self, parsed: Dict[str, Any], points: Optional[int] = None) -> Tuple[AnalysisResponse, pd.DataFrame]:
+        """Answer a question about a window of hours, in approximate local time"""
+        now = hourly_history.local_now(parsed['location'], parsed.get('coordinates'))
+        window = hourly_window(parsed, now)
+        label = parsed.get('period_label', '')
+        if window is None:
+            raise ValueError(f"{label.capitalize() or 'That time'} has not started yet in {parsed['location']} (local time {now:%H:%M})")
+        start, end = window
+        hourly, station = hourly_history.get_hourly(
+            parsed['location'], start, end, parsed.get('coordinates'), local_time=True
+        )
+        hourly = hourly.dropna(subset=['temperature'])
+        if hourly.empty:
+            raise ValueError(f"No hourly data found for {station} {parsed.get('period_label', '')}".strip())
+        
+        temperature = hourly['temperature']
+        summary = f"Weather in {station} {parsed.get('period_label', '')} " \
+                  f"({hourly['time'].iloc[0]:%a %d %b %H:%M} to {hourly['time'].iloc[-1]:%H:%M}, local time):\n" \
+                  f"Temperature: {temperature.min():.1f}°C to {temperature.max():.1f}°C (average {temperature.mean():.1f}°C)\n" \
+                  f"Humidity: {hourly['humidity'].mean():.0f}%\n" \
+                  f"Precipitation: {hourly['precipitation'].sum():.1f} mm\n" \
+                  f"Wind Speed: {hourly['wind_speed'].mean():.1f} km/h"
+        
+        hourly = hourly.assign(description=hourly['condition_code'].map(CONDITION_DESCRIPTIONS).fillna('Clear'))
+        frame = self._to_columnar_frame(hourly, station).fillna(self.FIELD_DEFAULTS)
+        requested_format = parsed.get('format', 'text')
+        analysis = AnalysisResponse(text_summary=summary, data=[], format=requested_format)
+        return analysis, self._shape_rows(frame, requested_format, points)
+        
+    def _get_forecast_frame(
+        self,
+        city: str,
+        days: int,
+        coordinates: Optional[Dict[str, float]] = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        Forecast for a city as a columnar frame of WeatherData fields, and the name of the
+        location it is for. Stations are served from the forecast cache; other places are
+        forecast from their recent history (see _get_historical_frame).
+        """
+        forecast, location = forecast_service.get_forecast(
+            city, days,
+            lambda: self._get_historical_frame(city, None, None, settings.FORECAST_HISTORY_DAYS, coordinates)
+        )
+        return self._forecast_columns(forecast, location), location
+        
+    # Ensemble band columns of a forecast mapped to the fields they are sent as
+    FORECAST_BAND_FIELDS = {
+        f'{column}_{band}': f'{field}{band.upper()}'
+        for column, field in zip(CHART_COLUMNS, CHART_FIELDS)
+        for band in ('p10', 'p90')
+    }
+    
+    def _forecast_columns(self, forecast: pd.DataFrame, location: str) -> pd.DataFrame:
+        """_to_columnar_frame of a forecast, with its p10/p90 bands (e.g. temperatureP10) when it has them"""
+        frame = self._to_columnar_frame(forecast, location)
+        for column, field in self.FORECAST_BAND_FIELDS.items():
+            if column in forecast.columns:
+                frame[field] = forecast[column].to_numpy()
+        return frame
+        
+    async def get_forecast_columns(self, city: str, days: Optional[int] = None) -> pd.DataFrame:
+        """Forecast for a city as a columnar frame of WeatherData fields"""
+        frame, _ = await asyncio.to_thread(self._get_forecast_frame, city, days or settings.FORECAST_DAYS)
+        return frame
+        
+    async def get_interpolated_columns(
+        self,
+        latitude: float,
+        longitude: float,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: Optional[int] = None,
+        elevation: Optional[float] = None
+    ) -> Tuple[pd.DataFrame, List[Dict[str, float]]]:
+        """
+        Daily conditions estimated for a coordinate from the nearest stations, as a columnar
+        frame of WeatherData fields, and the stations used
+        """
+        start, end = self._resolve_date_range(start_date, end_date, days)
+        data, sources = await asyncio.to_thread(
+            station_interpolator.interpolate, latitude, longitude, start, end, elevation
+        )
+        if not sources:
+            raise ValueError(f"No stations within {settings.INTERPOLATION_MAX_KM:.0f} km of {latitude}, {longitude}")
+        return self._to_columnar_frame(data, f"{latitude:.4f}, {longitude:.4f}"), sources
+        
+    def _summarize_forecast(self, frame: pd.DataFrame, city: str) -> str:
+        temperature = frame['temperature'].to_numpy()
+        summary = f"Forecast for {city}, {len(frame)} day{'s' if len(frame) != 1 else ''} " \
+                  f"from {frame['date'].iloc[0]:%a %d %b %Y}:\n" \
+                  f"Average temperature: {temperature.mean():.1f}°C\n" \
+                  f"Maximum temperature: {temperature.max():.1f}°C\n" \
+                  f"Minimum temperature: {temperature.min():.1f}°C\n"
+        if 'temperatureP10' in frame.columns:
+            summary += f"Likely range (p10 to p90): {frame['temperatureP10'].min():.1f}°C " \
+                       f"to {frame['temperatureP90'].max():.1f}°C\n"
+        return summary + f"Model: {settings.FORECAST_MODEL_VERSION}"
+        
+    async def _analyze_forecast(self, parsed: Dict[str, Any], points: Optional[int] = None) -> Tuple[AnalysisResponse, pd.DataFrame]:
+        """Answer a future-looking query from the forecast cache"""
+        days = min(max(int(parsed.get('duration') or settings.FORECAST_DAYS), 1), settings.FORECAST_MAX_DAYS)
+        location = parsed['location']
         try:
-            print(f"\n=== Analyzing Weather Query ===")
-            print(f"Query: {query}")
-            
-            # Parse the query
-            parsed = parse_query(query)
-            print(f"Parsed query: {parsed}")
+            # Stations need no geocode, so try the cache first
+            forecast, location = await asyncio.to_thread(forecast_service.get_forecast, location, days)
+            frame = self._forecast_columns(forecast, location)
+        except ValueError:
+            parsed = await geocode_locations_async(parsed)
+            frame, location = await asyncio.to_thread(
+                self._get_forecast_frame, parsed['location'], days, parsed.get('coordinates')
+            )
+        requested_format = parsed.get('format', 'text')
+        analysis = AnalysisResponse(
+            text_summary=self._summarize_forecast(frame, location),
+            data=[],
+            format=requested_format
+        )
+        bands = [field for field in self.FORECAST_BAND_FIELDS.values() if field in frame.columns]
+        return analysis, self._shape_rows(frame, requested_format, points, bands)
+        
+    async def analyze_weather(
+        self,
+        query: str,
+        points: Optional[int] = None
+    ) -> Tuple[AnalysisResponse, Optional[pd.DataFrame]]:
+        """
+        Analyze weather data based on natural language query.
+        Blocking stages (LLM parse, geocoding, data access) run in worker threads and
+        independent stages run concurrently. Cancelling the calling task, e.g. when the
+        client disconnects, stops any stage that has not started yet.
+        
+        Historical and forecast answers are shaped by format: the summary is computed from aggregates
+        and the rows come back as a frame holding only what the format renders (see
+        FORMAT_FIELDS), to be encoded as the response's `data`; the AnalysisResponse then
+        has no rows. Other answers return their rows in the AnalysisResponse and no frame.
+        Chart rows are downsampled to `points` (CHART_POINT_BUDGET by default).
+        """
+        try:
+            # Parse the query, geocoding happens per intent below
+            parsed = await asyncio.to_thread(parse_query_text, query)
+            logger.debug(f"Parsed {query!r} as {parsed}")
             
             if not parsed:
-                print("ERROR: Failed to parse query")
                 raise ValueError("Failed to parse query")
             
-            # Get location data
-            location = parsed.get('location')
-            print(f"Location from query: {location}")
-            
-            if not location:
-                print("ERROR: No location specified in query")
-                raise ValueError("No location specified in query")
-            
-            # Get historical data
-            days = parsed.get('duration', 7)
-            print(f"Getting {days} days of historical data")
-            
-            weather_data = await self.get_historical_data(
-                city=location,
-                days=days
-            )
-            
-            if not weather_data:
-                print("ERROR: No weather data found")
-                raise ValueError(f"No weather data found for {location}")
-            
-            print(f"Retrieved {len(weather_data)} days of weather data")
-            
-            # Create response
-            response = WeatherResponse(
-                location=location,
-                data=weather_data,
-                forecast=weather_data,
-                city=location,
-                generated_at=datetime.now()
-            )
-            
-            # Generate summary
-            summary = self._generate_summary(response)
-            print(f"Generated summary: {summary}")
-            
-            # Get the requested format from the parsed query
-            requested_format = parsed.get('format', 'text')
-            print(f"Requested format: {requested_format}")
-            
-            return AnalysisResponse(
-                query=query,
-                response=response,
-                summary=summary,
-                data=weather_data,
-                format=requested_format  # Use the format from parsed query
-            )
+            # Count the query for pre-warming, and serve forecast and historical answers from cache
+            query_key = normalize_query(parsed)
+            if query_key is None:
+                return await self._answer_parsed(parsed, points)
+            if query_log.record(query_key):
+                asyncio.get_running_loop().run_in_executor(None, query_log.save)
+            cache_key = analysis_cache.key(query_key, points)
+            if cache_key is None:
+                return await self._answer_parsed(parsed, points)
+            analysis = analysis_cache.get(cache_key)
+            if analysis is None:
+                analysis = await self._answer_parsed(parsed, points)
+                analysis_cache.put(cache_key, analysis)
+            return analysis
             
         except Exception as e:
-            print(f"ERROR in analyze_weather: {str(e)}")
             logger.error(f"Error analyzing weather: {str(e)}")
             raise Exception(f"Error analyzing weather: {str(e)}")
             
+    async def _answer_parsed(
+        self,
+        parsed: Dict[str, Any],
+        points: Optional[int] = None
+    ) -> Tuple[AnalysisResponse, Optional[pd.DataFrame]]:
+        """Answer a parsed query, routed by its intent (see analyze_weather)"""
+        # Multi-city comparisons and rankings
+        if parsed.get('intent') == 'comparison':
+            parsed = await geocode_locations_async(parsed)
+            return await asyncio.to_thread(self._analyze_comparison, parsed), None
+        
+        # Heatwaves, cold snaps, dry spells and records
+        if parsed.get('intent') == 'anomaly':
+            parsed = await geocode_locations_async(parsed)
+            return await asyncio.to_thread(self._analyze_anomalies, parsed), None
+        
+        # Get location data
+        location = parsed.get('location')
+        if not location:
+            raise ValueError("No location specified in query")
+        
+        # Future-looking queries are answered from the forecast cache
+        if parsed.get('intent') == 'forecast' or parsed.get('direction') == 'future':
+            return await self._analyze_forecast(parsed, points)
+        
+        # Questions about hours ("yesterday afternoon") are answered from hourly history
+        if parsed.get('resolution') == 'hourly':
+            parsed = await geocode_locations_async(parsed)
+            return await asyncio.to_thread(self._analyze_hourly, parsed, points)
+        
+        if parsed.get('intent') == 'current':
+            analysis = await self._analyze_current(parsed)
+            if analysis is not None:
+                return analysis, None
+        
+        # Get historical data
+        days = parsed.get('duration', 7)
+        history, location = await self._resolve_history(parsed, days)
+        
+        if history.empty:
+            raise ValueError(f"No weather data found for {location}")
+        
+        # Generate summary
+        summary = self._summarize_frame(history, location, datetime.now())
+        
+        # Get the requested format from the parsed query
+        requested_format = parsed.get('format', 'text')
+        
+        analysis = AnalysisResponse(
+            text_summary=summary,
+            data=[],
+            format=requested_format  # Use the format from parsed query
+        )
+        return analysis, self._shape_rows(history, requested_format, points)
+        
+    def prewarm_queries(self, entries: List[Dict[str, Any]], budget_seconds: Optional[float] = None) -> int:
+        """
+        Answer query log entries (see QueryLog.top) into the analysis cache, and with it the
+        forecast cache, stopping once `budget_seconds` have passed. Entries that are not
+        cacheable or already cached are skipped. Blocking: run it from a worker thread.
+        Returns the number of answers computed.
+        """
+        budget = budget_seconds if budget_seconds is not None else settings.QUERY_PREWARM_BUDGET_SECONDS
+        return asyncio.run(self._prewarm(entries, time.monotonic() + budget))
+        
+    async def _prewarm(self, entries: List[Dict[str, Any]], deadline: float) -> int:
+        warmed = 0
+        for entry in entries:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Query pre-warm budget spent after {warmed} answers")
+                break
+            query_key = QueryKey(entry['location'], entry['duration'], entry['intent'], entry['format'])
+            cache_key = analysis_cache.key(query_key)
+            if cache_key is None or cache_key in analysis_cache:
+                continue
+            parsed = {
+                **query_key._asdict(),
+                'direction': 'future' if query_key.intent == 'forecast' else 'past'
+            }
+            try:
+                analysis_cache.put(cache_key, await self._answer_parsed(parsed), prewarmed=True)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not pre-warm {query_key}: {e}")
+        return warmed
+        
     def _generate_summary(self, weather: WeatherResponse) -> str:
         """Generate a text summary of the weather data"""
         try:
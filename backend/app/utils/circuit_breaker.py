@@ -0,0 +1,185 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Tuple
+import logging
+import threading
+import time
+from app.core.config import settings
+from app.utils.rate_limiter import TokenBucket, acquire_upstream
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit for {name} is open")
+        self.name = name
+
+class UpstreamRateLimited(Exception):
+    """Raised when a call could not get a token from its upstream's rate limit in time"""
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker over a sliding window of recent calls.
+
+    The circuit opens when, over at least `min_calls` of the last `window` calls, the
+    failure rate or the rate of calls slower than `slow_call_seconds` reaches its
+    threshold. While open, calls fail immediately with CircuitOpenError so callers go
+    straight to their local fallback. After `open_seconds` a single probe call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.window = window or settings.CIRCUIT_WINDOW_CALLS
+        self.min_calls = min_calls or settings.CIRCUIT_MIN_CALLS
+        self.failure_rate = failure_rate or settings.CIRCUIT_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or settings.CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate or settings.CIRCUIT_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or settings.CIRCUIT_OPEN_SECONDS
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=self.window)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "trips": 0}
+
+    def _transition(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit {self.name}: {self._state} -> {state}")
+            self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.stats["trips"] += 1
+        elif state == CLOSED:
+            self._calls.clear()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through now. Claims the probe slot when half-open."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        failed = sum(1 for failure, _ in self._calls if failure)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        return failed / len(self._calls), slow / len(self._calls)
+
+    def record(self, success: bool, duration: float) -> None:
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += 0 if success else 1
+            self.stats["slow_calls"] += 1 if slow else 0
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(CLOSED if success and not slow else OPEN)
+                return
+            self._calls.append((not success, slow))
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                    self._transition(OPEN)
+
+    def release_probe(self) -> None:
+        """Give back a probe slot claimed by allow() without recording an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed upstream call through the breaker, recording its outcome and latency"""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        except BaseException:
+            # Interrupted rather than failed, so nothing to record
+            self.release_probe()
+            raise
+        self.record(True, time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            failure_rate, slow_rate = self._rates()
+            return {
+                "state": state,
+                "window_calls": len(self._calls),
+                "failure_rate": round(failure_rate, 3),
+                "slow_call_rate": round(slow_rate, 3),
+                "seconds_until_probe": round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+                    if state == OPEN else None,
+                **self.stats
+            }
+
+# One breaker per upstream endpoint, and the rate limit each one draws from
+circuit_breakers: Dict[str, CircuitBreaker] = {
+    "openrouter": CircuitBreaker("openrouter", slow_call_seconds=settings.CIRCUIT_LLM_SLOW_CALL_SECONDS),
+    "openweather_geo": CircuitBreaker("openweather_geo"),
+    "openweather_weather": CircuitBreaker("openweather_weather"),
+    "meteostat": CircuitBreaker("meteostat")
+}
+BREAKER_UPSTREAMS = {
+    "openrouter": "openrouter",
+    "openweather_geo": "openweather",
+    "openweather_weather": "openweather",
+    "meteostat": "meteostat"
+}
+
+@contextmanager
+def upstream_call(name: str, bucket: Optional[TokenBucket] = None) -> Iterator[None]:
+    """
+    Guard a call to an upstream: fail fast while its circuit is open, wait for its rate
+    limit, then record the call's outcome. Time spent waiting for the rate limit is not
+    held against the upstream.
+    """
+    breaker = circuit_breakers[name]
+    if breaker.state == OPEN:
+        breaker.allow()  # Counts the rejection
+        raise CircuitOpenError(name)
+    if bucket is not None:
+        acquired = bucket.acquire(timeout=settings.UPSTREAM_ACQUIRE_TIMEOUT_SECONDS)
+    else:
+        acquired = acquire_upstream(BREAKER_UPSTREAMS[name])
+    if not acquired:
+        raise UpstreamRateLimited(f"{BREAKER_UPSTREAMS[name]} rate limit reached")
+    with breaker.guard():
+        yield
+
+def circuit_snapshot() -> Dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in circuit_breakers.items()}
@@ -1,91 +1,196 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple
+import hashlib
 import logging
+import threading
 from pathlib import Path
 from app.core.config import settings
 from meteostat import Point, Daily
+from app.utils.spatial_index import StationIndex
 
 logger = logging.getLogger(__name__)
 
+WEATHER_CSV_PATH = Path(settings.DATA_DIR) / "weather" / settings.HISTORICAL_DATA_FILE
+
+# Coordinates of the configured weather stations (capital cities)
+STATION_COORDINATES = {
+    'London': (51.5074, -0.1278),
+    'Paris': (48.8566, 2.3522),
+    'Berlin': (52.5200, 13.4050),
+    'Rome': (41.9028, 12.4964),
+    'Madrid': (40.4168, -3.7038),
+    'Amsterdam': (52.3676, 4.9041),
+    'Brussels': (50.8503, 4.3517),
+    'Vienna': (48.2082, 16.3738),
+    'Bern': (46.9480, 7.4474),
+    'Oslo': (59.9139, 10.7522),
+    'Stockholm': (59.3293, 18.0686),
+    'Copenhagen': (55.6761, 12.5683),
+    'Helsinki': (60.1699, 24.9384),
+    'Dublin': (53.3498, -6.2603),
+    'Lisbon': (38.7223, -9.1393),
+    'Athens': (37.9838, 23.7275),
+    'Warsaw': (52.2297, 21.0122),
+    'Prague': (50.0755, 14.4378),
+    'Budapest': (47.4979, 19.0402),
+    'Bucharest': (44.4268, 26.1025),
+    'Istanbul': (41.0082, 28.9784),
+    'Moscow': (55.7558, 37.6173),
+    'Tokyo': (35.6762, 139.6503),
+    'Beijing': (39.9042, 116.4074),
+    'New York': (40.7128, -74.0060),
+    'Los Angeles': (34.0522, -118.2437),
+    'Sydney': (-33.8688, 151.2093),
+    'Dubai': (25.2048, 55.2708),
+    'Singapore': (1.3521, 103.8198),
+    'Mumbai': (19.0760, 72.8777)
+}
+
+# Approximate elevation of the configured weather stations, in metres above sea level
+STATION_ELEVATIONS = {
+    'London': 11, 'Paris': 35, 'Berlin': 34, 'Rome': 21, 'Madrid': 667, 'Amsterdam': -2,
+    'Brussels': 13, 'Vienna': 190, 'Bern': 540, 'Oslo': 23, 'Stockholm': 28, 'Copenhagen': 14,
+    'Helsinki': 17, 'Dublin': 20, 'Lisbon': 77, 'Athens': 70, 'Warsaw': 100, 'Prague': 235,
+    'Budapest': 102, 'Bucharest': 70, 'Istanbul': 39, 'Moscow': 156, 'Tokyo': 40, 'Beijing': 44,
+    'New York': 10, 'Los Angeles': 89, 'Sydney': 39, 'Dubai': 5, 'Singapore': 15, 'Mumbai': 14
+}
+
+# ISO 3166 alpha-2 codes, matching what the OpenWeather geocoding API returns
+COUNTRY_CODES = {
+    'United Kingdom': 'GB',
+    'France': 'FR',
+    'Germany': 'DE',
+    'Italy': 'IT',
+    'Spain': 'ES',
+    'Netherlands': 'NL',
+    'Belgium': 'BE',
+    'Austria': 'AT',
+    'Switzerland': 'CH',
+    'Norway': 'NO',
+    'Sweden': 'SE',
+    'Denmark': 'DK',
+    'Finland': 'FI',
+    'Ireland': 'IE',
+    'Portugal': 'PT',
+    'Greece': 'GR',
+    'Poland': 'PL',
+    'Czech Republic': 'CZ',
+    'Hungary': 'HU',
+    'Romania': 'RO',
+    'Turkey': 'TR',
+    'Russia': 'RU',
+    'Japan': 'JP',
+    'China': 'CN',
+    'United States': 'US',
+    'Australia': 'AU',
+    'United Arab Emirates': 'AE',
+    'Singapore': 'SG',
+    'India': 'IN'
+}
+
 class TimeSeriesDataManager:
     def __init__(self):
         self.cache = {}
+        self.dataset_version = None
+        self._reload_listeners: List[Callable[['TimeSeriesDataManager'], None]] = []
+        self._reload_lock = threading.Lock()
         self._initialize_cache()
         
     def _initialize_cache(self):
-        """Initialize cache with weather stations data"""
-        print("\n=== Initializing Data Manager Cache ===")
-        self.cache['stations'] = self._load_stations_data()
-        print(f"Cache initialized with {len(self.cache['stations'])} stations")
-        print("=====================================\n")
+        """Initialize cache with the weather dataset and stations data"""
+        # Build the new cache completely before swapping it in, so readers
+        # never see a half-loaded dataset during a reload
+        cache = {'weather': self._load_weather_data()}
+        cache['stations'] = self._load_stations_data(cache['weather'])
+        self.station_index = StationIndex(cache['stations'])
+        self.cache = cache
+        self.dataset_version = self._compute_dataset_version()
+        logger.info(f"Cache initialized with {len(self.cache['stations'])} stations, dataset version {self.dataset_version}")
+        
+    def _compute_dataset_version(self) -> str:
+        """Identify the dataset on disk by path, modification time and size"""
+        if not WEATHER_CSV_PATH.exists():
+            return "builtin"
+        stat = WEATHER_CSV_PATH.stat()
+        fingerprint = f"{WEATHER_CSV_PATH}:{stat.st_mtime_ns}:{stat.st_size}"
+        return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+        
+    def _load_weather_data(self) -> pd.DataFrame:
+        """Load the daily weather dataset"""
+        try:
+            if not WEATHER_CSV_PATH.exists():
+                logger.warning(f"Weather data file not found at {WEATHER_CSV_PATH}")
+                return pd.DataFrame()
+            df = pd.read_csv(WEATHER_CSV_PATH)
+            # Parse dates and normalize city names once, rather than on every query
+            df['date'] = pd.to_datetime(df['time'])
+            df['city_key'] = df['city'].str.lower()
+            # Keep each city's rows in date order (imports append out of order),
+            # preserving the order in which cities first appear
+            city_order = pd.factorize(df['city'])[0]
+            df = df.iloc[np.lexsort((df['date'].to_numpy(), city_order))].reset_index(drop=True)
+            logger.info(f"Loaded {len(df)} rows of weather data from {WEATHER_CSV_PATH}")
+            return df
+        except Exception as e:
+            logger.error(f"Error loading weather data: {e}")
+            return pd.DataFrame()
+            
+    def reload(self) -> str:
+        """Reload the weather dataset from disk and notify listeners. Returns the new dataset version."""
+        with self._reload_lock:
+            self._initialize_cache()
+        for listener in list(self._reload_listeners):
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"Error in dataset reload listener {listener}: {e}")
+        return self.dataset_version
+        
+    def add_reload_listener(self, listener: Callable[['TimeSeriesDataManager'], None]) -> None:
+        """Register a callback invoked with the data manager after every dataset reload"""
+        self._reload_listeners.append(listener)
+        
+    def station_names(self) -> List[str]:
+        """Names of all stations, in dataset order"""
+        return self.cache['stations']['city_name'].tolist() if not self.cache['stations'].empty else []
         
-    def _load_stations_data(self) -> pd.DataFrame:
+    def _load_stations_data(self, weather_df: pd.DataFrame) -> pd.DataFrame:
         """Load weather stations data"""
         try:
-            print("\n=== Loading Weather Stations Data ===")
             logger.info("Loading weather stations data")
             
-            # Try to load from CSV first
-            csv_path = Path("data/weather/capital_cities_weather.csv")
-            print(f"Looking for CSV at: {csv_path.absolute()}")
-            if csv_path.exists():
-                print("Found CSV file, loading data...")
-                df = pd.read_csv(csv_path)
+            # Derive stations from the weather dataset first
+            if not weather_df.empty:
+                df = weather_df
+                # The Meteostat export has no coordinate columns, so fill them
+                # in from the configured station coordinates
+                if 'latitude' not in df.columns or 'longitude' not in df.columns:
+                    df = df[['city']].drop_duplicates()
+                    df = df[df['city'].isin(STATION_COORDINATES)].copy()
+                    df['latitude'] = df['city'].map(lambda c: STATION_COORDINATES[c][0])
+                    df['longitude'] = df['city'].map(lambda c: STATION_COORDINATES[c][1])
                 # Get unique cities with their coordinates
-                stations_df = df[['city', 'latitude', 'longitude']].drop_duplicates()
+                stations_df = df[['city', 'latitude', 'longitude']].drop_duplicates().reset_index(drop=True)
                 
                 # Add country information
                 stations_df['country'] = stations_df['city'].apply(self._get_country)
+                stations_df['country_code'] = stations_df['country'].map(COUNTRY_CODES).fillna('')
                 stations_df['station_id'] = stations_df['city']
                 stations_df['city_name'] = stations_df['city']
+                stations_df['elevation'] = stations_df['city'].map(STATION_ELEVATIONS)
                 
                 # Add a searchable name column (lowercase, no special characters)
                 stations_df['search_name'] = stations_df['city_name'].str.lower().str.replace(r'[^a-z0-9\s]', '')
                 
-                print(f"Successfully loaded {len(stations_df)} stations from CSV")
-                print(f"Sample stations:\n{stations_df.head(2)}")
+                logger.debug("Sample stations:\n%s", stations_df.head(2))
                 logger.info(f"Loaded {len(stations_df)} weather stations from CSV")
                 return stations_df
             
             # Fallback to hardcoded data if CSV doesn't exist
-            print("CSV file not found, using hardcoded data")
             logger.warning("CSV file not found, using hardcoded data")
             
-            # Define major cities with their coordinates
-            stations_data = {
-                'London': (51.5074, -0.1278),
-                'Paris': (48.8566, 2.3522),
-                'Berlin': (52.5200, 13.4050),
-                'Rome': (41.9028, 12.4964),
-                'Madrid': (40.4168, -3.7038),
-                'Amsterdam': (52.3676, 4.9041),
-                'Brussels': (50.8503, 4.3517),
-                'Vienna': (48.2082, 16.3738),
-                'Bern': (46.9480, 7.4474),
-                'Oslo': (59.9139, 10.7522),
-                'Stockholm': (59.3293, 18.0686),
-                'Copenhagen': (55.6761, 12.5683),
-                'Helsinki': (60.1699, 24.9384),
-                'Dublin': (53.3498, -6.2603),
-                'Lisbon': (38.7223, -9.1393),
-                'Athens': (37.9838, 23.7275),
-                'Warsaw': (52.2297, 21.0122),
-                'Prague': (50.0755, 14.4378),
-                'Budapest': (47.4979, 19.0402),
-                'Bucharest': (44.4268, 26.1025),
-                'Istanbul': (41.0082, 28.9784),
-                'Moscow': (55.7558, 37.6173),
-                'Tokyo': (35.6762, 139.6503),
-                'Beijing': (39.9042, 116.4074),
-                'New York': (40.7128, -74.0060),
-                'Los Angeles': (34.0522, -118.2437),
-                'Sydney': (-33.8688, 151.2093),
-                'Dubai': (25.2048, 55.2708),
-                'Singapore': (1.3521, 103.8198),
-                'Mumbai': (19.0760, 72.8777)
-            }
-            
             # Convert to DataFrame
             df = pd.DataFrame([
                 {
@@ -93,9 +198,11 @@ class TimeSeriesDataManager:
                     'city_name': city,
                     'latitude': lat,
                     'longitude': lon,
-                    'country': self._get_country(city)
+                    'country': self._get_country(city),
+                    'country_code': COUNTRY_CODES.get(self._get_country(city), ''),
+                    'elevation': STATION_ELEVATIONS.get(city)
                 }
-                for city, (lat, lon) in stations_data.items()
+                for city, (lat, lon) in STATION_COORDINATES.items()
             ])
             
             # Add a searchable name column (lowercase, no special characters)
@@ -146,44 +253,45 @@ class TimeSeriesDataManager:
     def get_location_data(self, location: str) -> Optional[Dict[str, Any]]:
         """Get data for a specific location"""
         try:
-            print(f"\n=== Getting Location Data ===")
-            print(f"Searching for location: {location}")
-            logger.info(f"Getting location data for {location}")
+            logger.debug(f"Getting location data for {location}")
             stations_df = self.cache['stations']
             
             if stations_df.empty:
-                print("ERROR: No stations data available in cache")
                 logger.error("No stations data available")
                 return None
             
             # Clean the search location
             search_location = location.lower().strip()
-            print(f"Cleaned search location: {search_location}")
             
             # Try exact match first
             location_data = stations_df[stations_df['city_name'].str.lower() == search_location]
-            print(f"Exact match results: {len(location_data)} rows")
             
             # If no exact match, try partial match
             if location_data.empty:
-                print("No exact match found, trying partial match...")
                 location_data = stations_df[stations_df['city_name'].str.lower().str.contains(search_location)]
                 if not location_data.empty:
-                    print(f"Found partial match: {location_data['city_name'].tolist()}")
                     logger.info(f"Found partial match for {location}: {location_data['city_name'].tolist()}")
             
             # If still no match, try fuzzy matching
             if location_data.empty:
-                print("No partial match found, trying fuzzy match...")
                 from difflib import get_close_matches
                 matches = get_close_matches(search_location, stations_df['city_name'].str.lower().tolist(), n=1, cutoff=0.6)
                 if matches:
-                    print(f"Found fuzzy match: {matches[0]}")
                     location_data = stations_df[stations_df['city_name'].str.lower() == matches[0]]
                     logger.info(f"Found fuzzy match for {location}: {location_data['city_name'].tolist()}")
             
+            # If still no match, fall back to the nearest station to a previously geocoded location
+            if location_data.empty:
+                from app.utils.geocode_cache import geocode_cache
+                hit, geocoded = geocode_cache.get(location)
+                if hit and geocoded:
+                    nearest = self.find_nearest_stations(geocoded['lat'], geocoded['lon'], k=1)
+                    if nearest and nearest[0][1] <= settings.NEAREST_STATION_MAX_KM:
+                        station, distance_km = nearest[0]
+                        location_data = stations_df[stations_df['city_name'] == station['name']]
+                        logger.info(f"Found nearby station for {location}: {station['name']} ({distance_km:.1f} km)")
+            
             if location_data.empty:
-                print(f"ERROR: Location {location} not found in stations")
                 logger.warning(f"Location {location} not found in stations")
                 return None
                 
@@ -194,14 +302,20 @@ class TimeSeriesDataManager:
                 'latitude': location_data.iloc[0]['latitude'],
                 'longitude': location_data.iloc[0]['longitude']
             }
-            print(f"Found location data: {result}")
-            logger.info(f"Found location data: {result}")
+            logger.debug(f"Found location data: {result}")
             return result
         except Exception as e:
-            print(f"ERROR in get_location_data: {str(e)}")
             logger.error(f"Error getting location data: {e}")
             return None
             
+    def find_nearest_stations(self, latitude: float, longitude: float, k: int = 1) -> List[Tuple[Dict[str, Any], float]]:
+        """Get the k stations closest to a coordinate as (station, distance_km) pairs"""
+        return self.station_index.nearest(latitude, longitude, k)
+        
+    def find_stations_within(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Get all stations within radius_km of a coordinate as (station, distance_km) pairs"""
+        return self.station_index.within(latitude, longitude, radius_km)
+            
     def get_available_locations(self) -> List[Dict[str, Any]]:
         """Get list of available weather stations"""
         try:
@@ -211,6 +325,7 @@ class TimeSeriesDataManager:
                     'id': row['station_id'],
                     'name': row['city_name'],
                     'country': row['country'],
+                    'country_code': row['country_code'],
                     'latitude': row['latitude'],
                     'longitude': row['longitude']
                 })
@@ -227,6 +342,16 @@ def get_location_data(location: str) -> Optional[Dict[str, Any]]:
     """Get location data"""
     return data_manager.get_location_data(location)
 
+def find_nearest_station(latitude: float, longitude: float, max_distance_km: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Get the closest station to a coordinate, optionally limited to max_distance_km"""
+    nearest = data_manager.find_nearest_stations(latitude, longitude, k=1)
+    if not nearest:
+        return None
+    station, distance_km = nearest[0]
+    if max_distance_km is not None and distance_km > max_distance_km:
+        return None
+    return {**station, 'distance_km': distance_km}
+
 def load_historical_data() -> pd.DataFrame:
     """Load all historical weather data"""
     return data_manager.get_historical_weather(
@@ -0,0 +1,119 @@
+from typing import Sequence
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are split into
+    budget - 2 buckets, and from each bucket the point forming the largest triangle
+    with the previously kept point and the mean of the next bucket is kept. `x` must
+    be ascending and `y` free of NaN.
+    """
+    n = len(y)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    # Mean of each bucket, and the last point standing in for the bucket after the last one
+    counts = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])[1:]
+    next_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])[1:]
+
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(budget - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[a] - next_x[bucket]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+def minmax_indices(y: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Indices of the lowest and highest point of each of budget // 2 equal-count buckets,
+    so every peak and trough survives. `y` must be free of NaN.
+    """
+    n = len(y)
+    buckets = budget // 2
+    if budget >= n or buckets < 1:
+        return np.arange(n)
+
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))  # By bucket, then by value within the bucket
+    first = np.flatnonzero(np.diff(bucket)) + 1
+    starts = np.concatenate(([0], first))
+    ends = np.concatenate((first, [n])) - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+def triangle_areas(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Area of the triangle each point forms with its neighbours, on x and y scaled to
+    [0, 1]: how much of the line's shape is lost without it. NaN points, and the
+    first and last points, get an area of 0.
+    """
+    areas = np.zeros(len(y))
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) < 3:
+        return areas
+    xs, ys = x[valid], y[valid]
+    xs = (xs - xs[0]) / ((xs[-1] - xs[0]) or 1.0)
+    ys = (ys - ys.min()) / ((ys.max() - ys.min()) or 1.0)
+    areas[valid[1:-1]] = 0.5 * np.abs(
+        (xs[:-2] - xs[2:]) * (ys[1:-1] - ys[:-2]) - (xs[:-2] - xs[1:-1]) * (ys[2:] - ys[:-2])
+    )
+    return areas
+
+def downsample_indices(x: np.ndarray, series: Sequence[np.ndarray], budget: int, method: str = "lttb") -> np.ndarray:
+    """
+    Ascending row indices that keep at most `budget` points of several series sharing `x`.
+
+    Series that are all NaN or constant (e.g. a missing reading filled with a default)
+    are left out, and the others get an equal share of the budget, with NaNs skipped.
+    The rows kept for any series are kept for all of them. Since series share many rows,
+    the union is then topped up to the budget with the rows forming the largest
+    triangles in any series; when the budget is too small to give every series the
+    minimum a method needs, the union is thinned evenly back to `budget` rows.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}, expected one of {DOWNSAMPLE_METHODS}")
+    n = len(x)
+    if n <= budget:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    informative = []
+    for values in series:
+        values = np.asarray(values, dtype=np.float64)
+        if np.isnan(values).all() or np.nanmin(values) == np.nanmax(values):
+            continue
+        informative.append(values)
+    if not informative:
+        # Nothing to keep the shape of, spread the rows evenly
+        return np.unique(np.linspace(0, n - 1, budget).round().astype(np.int64))
+
+    share = budget // len(informative)
+    kept = []
+    for values in informative:
+        valid = np.flatnonzero(~np.isnan(values))
+        if method == "lttb":
+            picked = lttb_indices(x[valid], values[valid], max(share, 3))
+        else:
+            picked = minmax_indices(values[valid], max(share, 2))
+        kept.append(valid[picked])
+    indices = np.unique(np.concatenate(kept))
+    if len(indices) > budget:
+        # Keep the first and last rows and an even spread of the others
+        indices = indices[np.linspace(0, len(indices) - 1, budget).round().astype(np.int64)]
+    elif len(indices) < budget:
+        areas = np.max([triangle_areas(x, values) for values in informative], axis=0)
+        areas[indices] = -1.0
+        extra = np.argsort(-areas, kind="stable")[:budget - len(indices)]
+        indices = np.union1d(indices, extra)
+    return indices
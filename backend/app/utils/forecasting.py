@@ -1,84 +1,127 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
-def _validate_float(value: float, min_val: float, max_val: float) -> float:
-    """Validate and clamp float values to ensure they are within valid ranges"""
-    if pd.isna(value) or np.isinf(value):
-        return (min_val + max_val) / 2  # Return middle value if invalid
-    return max(min_val, min(max_val, value))
+# Forecast variables, in the order of the last axis of an ensemble
+FORECAST_VARIABLES = ('temperature', 'humidity', 'wind_speed', 'pressure')
+# Valid range of each variable, in FORECAST_VARIABLES order
+VALID_RANGES = np.array([
+    [-20, 40],  # Reasonable temperature range
+    [20, 100],  # Humidity must be between 20% and 100%
+    [0, 50],  # Reasonable wind speed range
+    [950, 1050]  # Reasonable pressure range
+], dtype=float)
+# Mean and standard deviation used when the history has no such column
+VARIABLE_DEFAULTS = {
+    'humidity': (60.0, 10.0),
+    'wind_speed': (10.0, 5.0),
+    'pressure': (1013.25, 5.0)
+}
+# Quantiles of an ensemble forecast: the bands and the median used as the forecast value
+ENSEMBLE_QUANTILES = {'p10': 0.1, 'p50': 0.5, 'p90': 0.9}
 
-def _get_weather_description(temp: float) -> str:
-    """Get weather description based on temperature"""
-    if temp < 5:
-        return "Cold"
-    elif temp < 15:
-        return "Cool"
-    elif temp < 25:
-        return "Mild"
-    else:
-        return "Warm"
+def _validate_float(values: np.ndarray, min_val: np.ndarray, max_val: np.ndarray) -> np.ndarray:
+    """Validate and clamp values to ensure they are within valid ranges"""
+    values = np.asarray(values, dtype=float)
+    # Use the middle value where invalid
+    return np.where(np.isfinite(values), np.clip(values, min_val, max_val), (min_val + max_val) / 2)
 
-def generate_forecast(historical_data: pd.DataFrame, days: int) -> pd.DataFrame:
+def _get_weather_description(temp: np.ndarray) -> np.ndarray:
+    """Get weather descriptions based on temperature"""
+    return np.select([temp < 5, temp < 15, temp < 25], ["Cold", "Cool", "Mild"], default="Warm")
+
+def _forecast_parameters(
+    historical_data: pd.DataFrame,
+    days: int,
+    start: Optional[pd.Timestamp] = None
+) -> Tuple[pd.Timestamp, np.ndarray, np.ndarray]:
     """
-    Generate weather forecast using historical data
+    First forecast date (the day after the last observed one unless `start` is given),
+    the expected value of each variable on each forecast day (days × variables) and the
+    standard deviation of the noise around it.
     """
-    # Simple moving average forecast
-    forecast_data = []
-    
-    # Convert date strings to datetime objects
-    historical_data['date'] = pd.to_datetime(historical_data['date'])
-    last_date = historical_data['date'].max()
-    
+    last_date = pd.to_datetime(historical_data['date']).max().normalize()
+    start = last_date + timedelta(days=1) if start is None else pd.Timestamp(start).normalize()
+    if start <= last_date:
+        raise ValueError(f"Forecasts must start after the last observed day ({last_date:%Y-%m-%d})")
+
     # Calculate trends and patterns from historical data
-    temp_trend = historical_data['temperature'].diff().mean()  # Temperature trend
-    temp_std = historical_data['temperature'].std()  # Temperature variation
-    temp_mean = historical_data['temperature'].mean()  # Average temperature
-    
-    humidity_mean = historical_data['humidity'].mean() if 'humidity' in historical_data.columns else 60.0
-    humidity_std = historical_data['humidity'].std() if 'humidity' in historical_data.columns else 10.0
-    
-    wind_mean = historical_data['wind_speed'].mean() if 'wind_speed' in historical_data.columns else 10.0
-    wind_std = historical_data['wind_speed'].std() if 'wind_speed' in historical_data.columns else 5.0
-    
-    pressure_mean = historical_data['pressure'].mean() if 'pressure' in historical_data.columns else 1013.25
-    pressure_std = historical_data['pressure'].std() if 'pressure' in historical_data.columns else 5.0
-    
-    # Generate forecast for each day
-    for i in range(days):
-        forecast_date = last_date + timedelta(days=i+1)
-        
-        # Generate temperature with trend and seasonal variation
-        temp = temp_mean + (temp_trend * (i + 1)) + np.random.normal(0, temp_std * 0.5)
-        temp = _validate_float(temp, -20, 40)  # Reasonable temperature range
-        
-        # Generate other parameters with realistic variations
-        humidity = _validate_float(
-            humidity_mean + np.random.normal(0, humidity_std * 0.5),
-            20, 100  # Humidity must be between 20% and 100%
-        )
-        
-        wind = _validate_float(
-            wind_mean + np.random.normal(0, wind_std * 0.5),
-            0, 50  # Reasonable wind speed range
-        )
-        
-        pressure = _validate_float(
-            pressure_mean + np.random.normal(0, pressure_std * 0.5),
-            950, 1050  # Reasonable pressure range
-        )
-        
-        # Get weather description based on temperature
-        description = _get_weather_description(temp)
-        
-        forecast_data.append({
-            'date': forecast_date.isoformat(),
-            'temperature': round(temp, 1),
-            'humidity': round(humidity, 1),
-            'wind_speed': round(wind, 1),
-            'pressure': round(pressure, 1),
-            'description': description
-        })
-    
-    return pd.DataFrame(forecast_data) 
\ No newline at end of file
+    temperature = historical_data['temperature']
+    means, stds = [temperature.mean()], [temperature.std()]
+    for variable in FORECAST_VARIABLES[1:]:
+        if variable in historical_data.columns:
+            means.append(historical_data[variable].mean())
+            stds.append(historical_data[variable].std())
+        else:
+            mean, std = VARIABLE_DEFAULTS[variable]
+            means.append(mean)
+            stds.append(std)
+
+    expected = np.tile(np.array(means, dtype=float), (days, 1))
+    # Temperature follows its mean day-to-day change, counted from the last observed day
+    lead = (start - last_date).days
+    expected[:, 0] += temperature.diff().mean() * np.arange(lead, lead + days)
+    return start, expected, np.array(stds, dtype=float) * 0.5
+
+def generate_ensemble(
+    historical_data: pd.DataFrame,
+    days: int,
+    members: int,
+    rng: Optional[np.random.Generator] = None,
+    start: Optional[pd.Timestamp] = None
+) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    Draw `members` forecasts at once as a (members × days × variables) array, variables in
+    FORECAST_VARIABLES order, and return it with the forecast dates. The forecast covers
+    `days` days from `start`, by default the day after the last observed one.
+    Noise is drawn day by day, so the first days of a longer ensemble are the same as a
+    shorter ensemble drawn from the same seed.
+    """
+    start, expected, scale = _forecast_parameters(historical_data, days, start)
+    noise = (rng or np.random).normal(0, scale, size=(days, members, len(FORECAST_VARIABLES)))
+    values = _validate_float(expected[:, np.newaxis, :] + noise, VALID_RANGES[:, 0], VALID_RANGES[:, 1])
+    dates = pd.date_range(start, periods=days, freq='D')
+    return dates, values.transpose(1, 0, 2)
+
+def generate_forecast(
+    historical_data: pd.DataFrame,
+    days: int,
+    rng: Optional[np.random.Generator] = None,
+    start: Optional[pd.Timestamp] = None
+) -> pd.DataFrame:
+    """
+    Generate weather forecast using historical data: a single draw of the ensemble model.
+    Pass a seeded `rng` for a reproducible forecast; the historical data is not modified.
+    """
+    dates, ensemble = generate_ensemble(historical_data, days, 1, rng, start)
+    values = ensemble[0]
+    forecast = pd.DataFrame(values.round(1), columns=list(FORECAST_VARIABLES))
+    forecast.insert(0, 'date', [day.isoformat() for day in dates])
+    forecast['description'] = _get_weather_description(values[:, 0])
+    return forecast
+
+def ensemble_forecast(
+    historical_data: pd.DataFrame,
+    days: int,
+    members: int,
+    rng: Optional[np.random.Generator] = None,
+    start: Optional[pd.Timestamp] = None
+) -> pd.DataFrame:
+    """
+    Forecast from an ensemble of `members` draws: one row per day with the median (p50) of
+    each variable as its value, and `<variable>_p10` and `<variable>_p90` columns as its band.
+    """
+    dates, ensemble = generate_ensemble(historical_data, days, members, rng, start)
+    quantiles = dict(zip(
+        ENSEMBLE_QUANTILES,
+        np.quantile(ensemble, list(ENSEMBLE_QUANTILES.values()), axis=0).round(1)
+    ))
+    forecast = pd.DataFrame({'date': [day.isoformat() for day in dates]})
+    for index, variable in enumerate(FORECAST_VARIABLES):
+        forecast[variable] = quantiles['p50'][:, index]
+    for index, variable in enumerate(FORECAST_VARIABLES):
+        forecast[f'{variable}_p10'] = quantiles['p10'][:, index]
+        forecast[f'{variable}_p90'] = quantiles['p90'][:, index]
+    forecast['description'] = _get_weather_description(forecast['temperature'].to_numpy())
+    return forecast
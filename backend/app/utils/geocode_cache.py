@@ -0,0 +1,119 @@
+from typing import Dict, Any, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from app.core.config import settings
+from app.utils.data_loader import data_manager
+
+logger = logging.getLogger(__name__)
+
+class GeocodeCache:
+    """
+    Persistent cache of geocoding results keyed by normalized place name.
+
+    Entries map to {name, lat, lon, country}. Stations from the data manager are
+    seeded without expiry so known cities never hit the network; network results
+    expire after `ttl_seconds` and "not found" results after the shorter
+    `negative_ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl_seconds: Optional[int] = None,
+        negative_ttl_seconds: Optional[int] = None
+    ):
+        self.path = path or Path(settings.DATA_DIR) / settings.GEOCODE_CACHE_FILE
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.GEOCODE_CACHE_TTL_SECONDS
+        self.negative_ttl_seconds = (
+            negative_ttl_seconds if negative_ttl_seconds is not None else settings.GEOCODE_NEGATIVE_TTL_SECONDS
+        )
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+        self.seed_from_stations()
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """Normalize a place name: strip accents and punctuation, lowercase, collapse whitespace"""
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+        name = re.sub(r'[^a-z0-9\s-]', ' ', name.lower())
+        return re.sub(r'\s+', ' ', name).strip()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            now = time.time()
+            self._entries = {
+                key: entry for key, entry in entries.items()
+                if entry.get('expires_at') is None or entry['expires_at'] > now
+            }
+            logger.info(f"Loaded {len(self._entries)} geocode cache entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading geocode cache from {self.path}: {e}")
+            self._entries = {}
+
+    def save(self) -> None:
+        """Persist the cache to disk atomically"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with self._lock:
+                payload = json.dumps(self._entries)
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving geocode cache to {self.path}: {e}")
+
+    def seed_from_stations(self) -> int:
+        """Add every known station as a non-expiring entry. Returns the number of stations seeded."""
+        stations = data_manager.get_available_locations()
+        with self._lock:
+            for station in stations:
+                self._entries[self.normalize(station['name'])] = {
+                    'value': {
+                        'name': station['name'],
+                        'lat': float(station['latitude']),
+                        'lon': float(station['longitude']),
+                        'country': station.get('country_code') or station['country']
+                    },
+                    'expires_at': None
+                }
+        return len(stations)
+
+    def get(self, name: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Look up a place name.
+        Returns (hit, value); a hit with value None is a cached "not found".
+        """
+        key = self.normalize(name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry['expires_at'] is not None and entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return False, None
+            return True, entry['value']
+
+    def put(self, name: str, value: Optional[Dict[str, Any]]) -> None:
+        """Store a geocoding result, or None for a place that could not be found"""
+        ttl = self.ttl_seconds if value is not None else self.negative_ttl_seconds
+        with self._lock:
+            self._entries[self.normalize(name)] = {
+                'value': value,
+                'expires_at': time.time() + ttl
+            }
+        self.save()
+
+# Create a singleton instance
+geocode_cache = GeocodeCache()
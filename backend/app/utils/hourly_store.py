@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the hourly store, in order. Times are UTC.
+HOURLY_COLUMNS = [
+    'time', 'temperature', 'dew_point', 'humidity', 'precipitation', 'snow', 'wind_direction',
+    'wind_speed', 'wind_gust', 'pressure', 'sunshine', 'condition_code'
+]
+
+# Meteostat Hourly columns mapped to store columns
+METEOSTAT_HOURLY_COLUMNS = {
+    'time': 'time',
+    'temp': 'temperature',
+    'dwpt': 'dew_point',
+    'rhum': 'humidity',
+    'prcp': 'precipitation',
+    'snow': 'snow',
+    'wdir': 'wind_direction',
+    'wspd': 'wind_speed',
+    'wpgt': 'wind_gust',
+    'pres': 'pressure',
+    'tsun': 'sunshine',
+    'coco': 'condition_code'
+}
+
+# Meteostat weather condition codes (coco) mapped to descriptions
+CONDITION_DESCRIPTIONS = {
+    1: 'Clear', 2: 'Fair', 3: 'Cloudy', 4: 'Overcast', 5: 'Fog', 6: 'Freezing Fog',
+    7: 'Light Rain', 8: 'Rain', 9: 'Heavy Rain', 10: 'Freezing Rain', 11: 'Heavy Freezing Rain',
+    12: 'Sleet', 13: 'Heavy Sleet', 14: 'Light Snowfall', 15: 'Snowfall', 16: 'Heavy Snowfall',
+    17: 'Rain Shower', 18: 'Heavy Rain Shower', 19: 'Sleet Shower', 20: 'Heavy Sleet Shower',
+    21: 'Snow Shower', 22: 'Heavy Snow Shower', 23: 'Lightning', 24: 'Hail', 25: 'Thunderstorm',
+    26: 'Heavy Thunderstorm', 27: 'Storm'
+}
+
+# How hours roll up into a day of the daily store (wind_direction is averaged as a vector)
+DAILY_ROLLUP = {
+    'temperature': 'mean',
+    'humidity': 'mean',
+    'precipitation': 'sum',
+    'snow': 'max',
+    'wind_speed': 'mean',
+    'wind_gust': 'max',
+    'pressure': 'mean',
+    'sunshine': 'sum'
+}
+
+def _station_key(city: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', city.lower().strip()).strip('_')
+
+def months_between(start: pd.Timestamp, end: pd.Timestamp) -> List[pd.Period]:
+    """Calendar months touched by [start, end]"""
+    return list(pd.period_range(start.to_period('M'), end.to_period('M'), freq='M'))
+
+# Columns of a daily rollup, matching the daily store
+DAILY_COLUMNS = [
+    'time', 'temperature', 'min_temperature', 'max_temperature', 'humidity', 'precipitation',
+    'snow', 'wind_direction', 'wind_speed', 'wind_gust', 'pressure', 'sunshine'
+]
+
+def rollup_daily(hourly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate hourly rows to one row per day with the daily store's columns:
+    mean/min/max temperature, summed precipitation and sunshine, and so on.
+    """
+    if hourly.empty:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    day = hourly['time'].dt.floor('D')
+    grouped = hourly.groupby(day, sort=True)
+    daily = grouped.agg(DAILY_ROLLUP)
+    # sum() of a day without readings is 0, keep it missing instead
+    counts = grouped[['precipitation', 'sunshine']].count()
+    daily[['precipitation', 'sunshine']] = daily[['precipitation', 'sunshine']].where(counts > 0)
+    daily['min_temperature'] = grouped['temperature'].min()
+    daily['max_temperature'] = grouped['temperature'].max()
+    radians = np.deg2rad(hourly['wind_direction'].astype(float))
+    vectors = pd.DataFrame({'sin': np.sin(radians), 'cos': np.cos(radians)}, index=hourly.index).groupby(day).mean()
+    daily['wind_direction'] = np.rad2deg(np.arctan2(vectors['sin'], vectors['cos'])).round() % 360
+    daily.index.name = 'time'
+    return daily.reset_index()[DAILY_COLUMNS]
+
+class HourlyStore:
+    """
+    Hourly observations partitioned by station and month, one Parquet file per
+    partition: <root>/<station>/<YYYY-MM>.parquet.
+
+    Range reads only open the partitions the range touches. Recently read
+    partitions are kept in a small LRU cache, checked against the file's
+    modification time, so repeated queries over the same months stay in memory
+    without the whole store ever being loaded.
+    """
+
+    def __init__(self, root: Optional[Path] = None, cache_size: Optional[int] = None):
+        self.root = root or Path(settings.DATA_DIR) / settings.HOURLY_DATA_DIR
+        self.cache_size = cache_size or settings.HOURLY_PARTITION_CACHE_SIZE
+        self._cache: "OrderedDict[Path, Tuple[int, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes read-merge-replace of partitions between writers
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _require_pyarrow() -> None:
+        if pq is None:
+            raise RuntimeError("pyarrow is required for hourly storage")
+
+    def partition_path(self, city: str, month: pd.Period) -> Path:
+        return self.root / _station_key(city) / f"{month.strftime('%Y-%m')}.parquet"
+
+    def partition_mtime(self, city: str, month: pd.Period) -> Optional[datetime]:
+        """When a partition was last written, or None if it does not exist"""
+        path = self.partition_path(city, month)
+        return datetime.fromtimestamp(path.stat().st_mtime) if path.exists() else None
+
+    def months(self, city: str) -> List[pd.Period]:
+        """Months stored for a station"""
+        directory = self.root / _station_key(city)
+        if not directory.exists():
+            return []
+        return sorted(pd.Period(path.stem, freq='M') for path in directory.glob('*.parquet'))
+
+    def _read_partition(self, path: Path) -> pd.DataFrame:
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return pd.DataFrame(columns=HOURLY_COLUMNS)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(path)
+                return cached[1]
+        self._require_pyarrow()
+        frame = pq.read_table(path).to_pandas()
+        with self._lock:
+            self._cache[path] = (mtime, frame)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return frame
+
+    def read(
+        self,
+        city: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Hourly rows of a station in [start, end], reading only the partitions the range touches"""
+        parts = [self._read_partition(self.partition_path(city, month)) for month in months_between(start, end)]
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame(columns=columns or HOURLY_COLUMNS)
+        frame = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        times = frame['time']
+        frame = frame[(times >= start) & (times <= end)]
+        if columns:
+            frame = frame[['time', *[column for column in columns if column != 'time']]]
+        return frame.reset_index(drop=True)
+
+    def write(self, city: str, hourly: pd.DataFrame) -> int:
+        """
+        Merge hourly rows into a station's partitions, newer rows winning for the same hour.
+        Each partition is replaced atomically. Returns the number of rows written.
+        """
+        self._require_pyarrow()
+        hourly = hourly.reindex(columns=HOURLY_COLUMNS)
+        hourly['time'] = pd.to_datetime(hourly['time'])
+        hourly = hourly.dropna(subset=['time'])
+        with self._write_lock:
+            written = sum(
+                self._write_partition(city, month, rows)
+                for month, rows in hourly.groupby(hourly['time'].dt.to_period('M'))
+            )
+        logger.info(f"Stored {written} hourly rows for {city}")
+        return written
+
+    def _write_partition(self, city: str, month: pd.Period, rows: pd.DataFrame) -> int:
+        path = self.partition_path(city, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existing = self._read_partition(path)
+        merged = pd.concat([existing, rows], ignore_index=True) if not existing.empty else rows
+        merged = merged.drop_duplicates(subset=['time'], keep='last').sort_values('time', kind='stable')
+        merged = merged.astype({column: 'float64' for column in HOURLY_COLUMNS[1:]}).reset_index(drop=True)
+        temporary = path.with_suffix('.parquet.tmp')
+        pq.write_table(pa.Table.from_pandas(merged, preserve_index=False), temporary)
+        os.replace(temporary, path)
+        return len(rows)
+
+# Create a singleton instance
+hourly_store = HourlyStore()
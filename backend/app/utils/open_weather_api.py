@@ -2,66 +2,62 @@ import os
 import requests
 import logging
 from typing import Dict, Optional
+from app.core.config import settings
+from app.core.logging_config import log_payload
 from app.utils.data_loader import get_location_data
+from app.utils.circuit_breaker import upstream_call
+from app.utils.rate_limiter import TokenBucket
 
 logger = logging.getLogger(__name__)
 
 class OpenWeatherAPI:
-    def __init__(self):
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None, session: Optional[requests.Session] = None):
         self.api_key = os.getenv("OPENWEATHER_API_KEY")
-        print(f"\n=== OpenWeatherAPI Initialization ===")
-        print(f"API Key present: {'Yes' if self.api_key else 'No'}")
         if not self.api_key:
             raise ValueError("OPENWEATHER_API_KEY environment variable is not set")
-        self.base_url = "https://api.openweathermap.org/data/2.5"
-        print(f"Base URL: {self.base_url}")
-        print("=====================================\n")
+        self.base_url = settings.OPENWEATHER_BASE_URL.rstrip("/")
+        self.rate_limiter = rate_limiter
+        self.session = session or requests.Session()
+        logger.info(f"OpenWeather client using {self.base_url}")
         
     def get_weather(self, city: str, type: str = "current") -> Optional[Dict]:
         """Get weather data for a city"""
         try:
-            print(f"\n=== Getting Weather Data ===")
-            print(f"City: {city}")
-            print(f"Type: {type}")
+            logger.debug(f"Getting {type} weather for {city}")
             
             # Get location data
-            print("Fetching location data...")
             location_data = get_location_data(city)
             if not location_data:
-                print(f"Location data not found for {city}")
                 logger.error(f"Location data not found for {city}")
                 return None
             
-            print(f"Location data found: {location_data}")
-                
-            # Construct API URL
-            url = f"{self.base_url}/weather"
-            params = {
-                "lat": location_data["latitude"],
-                "lon": location_data["longitude"],
-                "appid": self.api_key,
-                "units": "metric"  # Use metric units (Celsius)
-            }
-            
-            print(f"Making API request to: {url}")
-            print(f"With parameters: {params}")
-            
-            # Make API request
-            response = requests.get(url, params=params)
-            print(f"Response status code: {response.status_code}")
-            
-            response.raise_for_status()
-            data = response.json()
-            print(f"Response data: {data}")
-            print("==============================\n")
+            data = self.get_weather_by_coordinates(location_data["latitude"], location_data["longitude"])
+            log_payload(logger, "OpenWeather response", data)
             
             return data
             
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {str(e)}")
             logger.error(f"Error getting weather data: {e}")
             return None
         except Exception as e:
-            print(f"Unexpected error: {str(e)}")
             logger.error(f"Unexpected error: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+    def get_weather_by_coordinates(self, lat: float, lon: float, timeout: Optional[float] = None) -> Dict:
+        """
+        Get current weather for a coordinate pair.
+        Raises requests exceptions, or CircuitOpenError while OpenWeather is failing,
+        so callers can decide how to handle failures.
+        """
+        url = f"{self.base_url}/weather"
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": "metric"  # Use metric units (Celsius)
+        }
+        with upstream_call("openweather_weather", bucket=self.rate_limiter):
+            response = self.session.get(url, params=params, timeout=timeout or settings.OPENWEATHER_TIMEOUT_SECONDS)
+            logger.debug(f"GET {url} lat={lat} lon={lon} -> {response.status_code}")
+            response.raise_for_status()
+            return response.json()
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+
+
+class TokenBucket:
+    """Thread-safe token bucket for keeping upstream API calls under a rate limit"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size (defaults to one second worth of tokens)
+        """
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls: int) -> "TokenBucket":
+        """Create a bucket allowing `calls` requests per minute, bursting up to a minute's worth"""
+        return cls(rate=calls / 60.0, capacity=float(calls))
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens without waiting. Returns False if not enough are available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Block until tokens are available.
+        Returns False if they could not be acquired within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        """Number of tokens currently available"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+# Shared limits per upstream API, so every caller in the process draws from the same budget
+upstream_limits: Dict[str, TokenBucket] = {
+    "openrouter": TokenBucket.per_minute(settings.OPENROUTER_RATE_LIMIT_PER_MINUTE),
+    "openweather": TokenBucket.per_minute(settings.OPENWEATHER_RATE_LIMIT_PER_MINUTE),
+    "meteostat": TokenBucket.per_minute(settings.METEOSTAT_RATE_LIMIT_PER_MINUTE)
+}
+
+def acquire_upstream(name: str, timeout: Optional[float] = None) -> bool:
+    """Take a token for a call to the named upstream, waiting up to UPSTREAM_ACQUIRE_TIMEOUT_SECONDS"""
+    timeout = settings.UPSTREAM_ACQUIRE_TIMEOUT_SECONDS if timeout is None else timeout
+    return upstream_limits[name].acquire(timeout=timeout)
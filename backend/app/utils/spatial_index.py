@@ -0,0 +1,66 @@
+from typing import Dict, Any, List, Tuple
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+def _to_unit_vectors(lat, lon) -> np.ndarray:
+    """Convert latitude/longitude in degrees to 3D unit vectors"""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+class StationIndex:
+    """
+    Nearest-neighbour index over station coordinates.
+
+    Stations are stored as unit vectors on the sphere, so a query is a single
+    matrix-vector product (cosine of the central angle) followed by a partial
+    sort. For the station counts this service handles (tens to a few thousand)
+    that is faster than building and walking a tree, and needs nothing beyond NumPy.
+    """
+
+    def __init__(self, stations: pd.DataFrame):
+        if stations.empty:
+            self._records: List[Dict[str, Any]] = []
+            self._vectors = np.empty((0, 3))
+            return
+        self._records = [
+            {
+                'id': row['station_id'],
+                'name': row['city_name'],
+                'country': row['country'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude'])
+            }
+            for _, row in stations.iterrows()
+        ]
+        self._vectors = _to_unit_vectors(stations['latitude'].to_numpy(), stations['longitude'].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _central_angles(self, lat: float, lon: float) -> np.ndarray:
+        cos_angle = self._vectors @ _to_unit_vectors(lat, lon)
+        return np.arccos(np.clip(cos_angle, -1.0, 1.0))
+
+    def _result(self, indices: np.ndarray, angles: np.ndarray) -> List[Tuple[Dict[str, Any], float]]:
+        return [(self._records[i], float(angles[i] * EARTH_RADIUS_KM)) for i in indices]
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to k (station, distance_km) pairs, closest first"""
+        if not self._records or k <= 0:
+            return []
+        angles = self._central_angles(lat, lon)
+        k = min(k, len(angles))
+        candidates = np.argpartition(angles, k - 1)[:k]
+        return self._result(candidates[np.argsort(angles[candidates])], angles)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Return all (station, distance_km) pairs within radius_km, closest first"""
+        if not self._records:
+            return []
+        angles = self._central_angles(lat, lon)
+        candidates = np.flatnonzero(angles <= radius_km / EARTH_RADIUS_KM)
+        return self._result(candidates[np.argsort(angles[candidates])], angles)
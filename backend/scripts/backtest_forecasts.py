@@ -0,0 +1,268 @@
+"""
+Rolling-origin backtest of the forecasting models over the stored daily history.
+
+For every city, a forecast is made from each origin (every --step days) using the
+FORECAST_HISTORY_DAYS days before it, and scored against the --horizon days after it.
+Cities are backtested in parallel across processes. For each model, variable and
+horizon the report gives:
+- MAE and RMSE of the forecast value (the ensemble median)
+- CRPS of the whole ensemble, which equals MAE for single-draw models
+It also gives each model's runtime, so accuracy and speed can be compared.
+
+    python scripts/backtest_forecasts.py
+    python scripts/backtest_forecasts.py --models moving-average,ensemble --members 100,400 --jobs 4 --json backtest.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+from app.core.config import settings
+from app.utils.forecasting import FORECAST_VARIABLES, generate_ensemble
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# A model maps (history, days, members, rng) to a (members × days × variables) array
+Model = Callable[[pd.DataFrame, int, int, np.random.Generator], np.ndarray]
+
+def _moving_average(history: pd.DataFrame, days: int, members: int, rng: np.random.Generator) -> np.ndarray:
+    """The single-draw forecast of generate_forecast"""
+    return generate_ensemble(history, days, 1, rng)[1]
+
+def _ensemble(history: pd.DataFrame, days: int, members: int, rng: np.random.Generator) -> np.ndarray:
+    return generate_ensemble(history, days, members, rng)[1]
+
+def _persistence(history: pd.DataFrame, days: int, members: int, rng: np.random.Generator) -> np.ndarray:
+    """Baseline: the last observed value of each variable, held for every day"""
+    last = [
+        history[variable].dropna().iloc[-1] if variable in history.columns and history[variable].notna().any() else np.nan
+        for variable in FORECAST_VARIABLES
+    ]
+    return np.tile(np.array(last, dtype=float), (1, days, 1))
+
+MODELS: Dict[str, Model] = {
+    "persistence": _persistence,
+    "moving-average": _moving_average,
+    "ensemble": _ensemble
+}
+# Models whose output depends on the ensemble size
+ENSEMBLE_MODELS = {"ensemble"}
+
+def crps_ensemble(members: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    """
+    CRPS of an ensemble (members on axis 0) against observations, as
+    E|X - y| - E|X - X'| / 2, with the pairwise term computed from the sorted
+    members in O(M log M) instead of O(M²).
+    """
+    count = members.shape[0]
+    spread = np.abs(members - observed).mean(axis=0)
+    ordered = np.sort(members, axis=0)
+    weights = (2 * np.arange(1, count + 1) - count - 1).reshape((count,) + (1,) * (members.ndim - 1))
+    return spread - (weights * ordered).sum(axis=0) / count ** 2
+
+@dataclass
+class Scores:
+    """Error sums per (horizon, variable), for merging across cities"""
+    abs_error: np.ndarray
+    sq_error: np.ndarray
+    crps: np.ndarray
+    count: np.ndarray
+    seconds: float = 0.0
+    forecasts: int = 0
+
+    @classmethod
+    def empty(cls, horizon: int) -> "Scores":
+        shape = (horizon, len(FORECAST_VARIABLES))
+        return cls(np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape))
+
+    def merge(self, other: "Scores") -> None:
+        self.abs_error += other.abs_error
+        self.sq_error += other.sq_error
+        self.crps += other.crps
+        self.count += other.count
+        self.seconds += other.seconds
+        self.forecasts += other.forecasts
+
+@dataclass
+class BacktestTask:
+    city: str
+    index: int
+    history: pd.DataFrame
+    models: List[Tuple[str, str, int]]  # (label, model name, members)
+    horizon: int
+    step: int
+    history_days: int
+    seed: int
+
+def backtest_city(task: BacktestTask) -> Dict[str, Scores]:
+    """Score every model on one city's rolling origins"""
+    history = task.history
+    observed = history.reindex(columns=list(FORECAST_VARIABLES)).to_numpy(dtype=float)
+    origins = range(task.history_days, len(history) - task.horizon + 1, task.step)
+    results = {}
+    for label, name, members in task.models:
+        model = MODELS[name]
+        rng = np.random.default_rng([task.seed, task.index])
+        scores = Scores.empty(task.horizon)
+        for origin in origins:
+            window = history.iloc[origin - task.history_days:origin]
+            start = time.perf_counter()
+            ensemble = model(window, task.horizon, members, rng)
+            scores.seconds += time.perf_counter() - start
+            scores.forecasts += 1
+
+            truth = observed[origin:origin + task.horizon]
+            valid = ~np.isnan(truth) & ~np.isnan(ensemble).any(axis=0)
+            error = np.where(valid, np.median(ensemble, axis=0) - truth, 0.0)
+            scores.abs_error += np.abs(error)
+            scores.sq_error += error ** 2
+            scores.crps += np.where(valid, crps_ensemble(ensemble, np.nan_to_num(truth)), 0.0)
+            scores.count += valid
+        results[label] = scores
+    return results
+
+def load_history(path: Path) -> Dict[str, pd.DataFrame]:
+    """Daily rows per city, in date order, with the date column the forecasting models expect"""
+    data = pd.read_csv(path)
+    data['date'] = pd.to_datetime(data['time'])
+    return {
+        city: rows.sort_values('date').reset_index(drop=True)
+        for city, rows in data.groupby('city', sort=False)
+    }
+
+def _model_specs(models: List[str], members: List[int]) -> List[Tuple[str, str, int]]:
+    specs = []
+    for name in models:
+        if name not in MODELS:
+            raise SystemExit(f"Unknown model {name!r}, expected one of {sorted(MODELS)}")
+        if name in ENSEMBLE_MODELS:
+            specs += [(f"{name}-{count}", name, count) for count in members]
+        else:
+            specs.append((name, name, 1))
+    return specs
+
+def run_backtest(
+    histories: Dict[str, pd.DataFrame],
+    specs: List[Tuple[str, str, int]],
+    horizon: int,
+    step: int,
+    history_days: int,
+    seed: int,
+    jobs: int
+) -> Dict[str, Scores]:
+    tasks = [
+        BacktestTask(city, index, history, specs, horizon, step, history_days, seed)
+        for index, (city, history) in enumerate(histories.items())
+    ]
+    totals = {label: Scores.empty(horizon) for label, _, _ in specs}
+    if jobs == 1:
+        results = map(backtest_city, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(backtest_city, tasks)
+    try:
+        for task, result in zip(tasks, results):
+            for label, scores in result.items():
+                totals[label].merge(scores)
+            logger.info(f"  {task.city}: done")
+    finally:
+        if jobs != 1:
+            executor.shutdown()
+    return totals
+
+def summarize(totals: Dict[str, Scores], report_horizons: List[int]) -> List[dict]:
+    """Per model: runtime, and MAE/RMSE/CRPS per variable and horizon (variables never observed are left out)"""
+    report = []
+    for label, scores in totals.items():
+        count = np.where(scores.count > 0, scores.count, np.nan)
+        mae, rmse, crps = scores.abs_error / count, np.sqrt(scores.sq_error / count), scores.crps / count
+        variables = {}
+        for index, variable in enumerate(FORECAST_VARIABLES):
+            if not scores.count[:, index].any():
+                continue
+            variables[variable] = [
+                {
+                    "horizon": day + 1,
+                    "mae": round(float(mae[day, index]), 4),
+                    "rmse": round(float(rmse[day, index]), 4),
+                    "crps": round(float(crps[day, index]), 4),
+                    "n": int(scores.count[day, index])
+                }
+                for day in range(len(count))
+            ]
+        report.append({
+            "model": label,
+            "forecasts": scores.forecasts,
+            "model_seconds": round(scores.seconds, 3),
+            "ms_per_forecast": round(1000 * scores.seconds / max(scores.forecasts, 1), 4),
+            "variables": variables
+        })
+
+    for entry in report:
+        logger.info(f"\n{entry['model']}: {entry['forecasts']} forecasts, "
+                    f"{entry['model_seconds']:.2f}s in the model ({entry['ms_per_forecast']:.3f} ms each)")
+        for variable, rows in entry["variables"].items():
+            shown = [row for row in rows if row["horizon"] in report_horizons]
+            cells = "  ".join(
+                f"h{row['horizon']}: MAE {row['mae']:.2f} RMSE {row['rmse']:.2f} CRPS {row['crps']:.2f}"
+                for row in shown
+            )
+            logger.info(f"  {variable:<12} {cells}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the forecasting models over the stored history")
+    parser.add_argument("--csv", type=Path, default=BACKEND_DIR / settings.DATA_DIR / "weather" / settings.HISTORICAL_DATA_FILE)
+    parser.add_argument("--models", default=",".join(MODELS), help=f"Comma-separated models: {', '.join(MODELS)}")
+    parser.add_argument("--members", default=str(settings.FORECAST_ENSEMBLE_MEMBERS), help="Ensemble size(s), e.g. 50,200")
+    parser.add_argument("--horizon", type=int, default=14, help="Days forecast from each origin")
+    parser.add_argument("--step", type=int, default=7, help="Days between forecast origins")
+    parser.add_argument("--history-days", type=int, default=settings.FORECAST_HISTORY_DAYS, help="Days of history per forecast")
+    parser.add_argument("--cities", help="Comma-separated cities (default: all)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--report-horizons", default="1,3,7,14", help="Horizons shown in the log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the full per-horizon results to this file")
+    args = parser.parse_args()
+
+    histories = load_history(args.csv)
+    if args.cities:
+        wanted = {city.strip().lower() for city in args.cities.split(",")}
+        histories = {city: rows for city, rows in histories.items() if city.lower() in wanted}
+    if not histories:
+        raise SystemExit("No cities to backtest")
+    specs = _model_specs(args.models.split(","), [int(value) for value in args.members.split(",")])
+
+    logger.info(f"Backtesting {len(specs)} model(s) on {len(histories)} cities with {args.jobs} process(es)")
+    start = time.perf_counter()
+    totals = run_backtest(histories, specs, args.horizon, args.step, args.history_days, args.seed, args.jobs)
+    elapsed = time.perf_counter() - start
+    report = summarize(totals, [int(value) for value in args.report_horizons.split(",")])
+    logger.info(f"\nBacktest took {elapsed:.1f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "model_version": settings.FORECAST_MODEL_VERSION,
+                "horizon": args.horizon,
+                "step": args.step,
+                "history_days": args.history_days,
+                "cities": list(histories),
+                "seconds": round(elapsed, 3),
+                "models": report
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Local stand-ins for the upstream APIs the backend calls, for tests, local
+development and load testing without touching the paid services.
+
+One server answers for all upstreams, routed by path:
+  OpenRouter   POST /api/v1/chat/completions
+  OpenWeather  GET  /data/2.5/weather?lat=..&lon=..
+               GET  /data/2.5/forecast?lat=..&lon=..
+               GET  /geo/1.0/direct?q=..
+  Meteostat    GET  /stations/slim.csv.gz
+               GET  /daily/<station>.csv.gz
+               GET  /hourly/<year>/<station>.csv.gz
+
+Responses are deterministic and synthetic. Latency, jitter and errors can be
+injected for every upstream or for one of them:
+    python scripts/fake_upstreams.py --port 8081 --latency 0.05 \\
+        --latency openrouter=1.5 --error-rate openweather=0.02
+
+Point the backend at it with the variables printed on startup (see upstream_env).
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from app.utils.data_loader import STATION_COORDINATES, COUNTRY_CODES, data_manager
+
+logger = logging.getLogger(__name__)
+
+UPSTREAMS = ("openrouter", "openweather", "meteostat")
+
+# Synthetic Meteostat station ids, one per configured station
+STATION_IDS = {city: f"F{index:04d}" for index, city in enumerate(sorted(STATION_COORDINATES))}
+
+@dataclass
+class Fault:
+    """Latency and error injection for one upstream"""
+    latency: float = 0.0  # Seconds added to every request
+    jitter: float = 0.0  # Extra uniformly distributed seconds
+    error_rate: float = 0.0  # Fraction of requests answered with error_status
+    error_status: int = 503
+
+@dataclass
+class FaultConfig:
+    upstreams: Dict[str, Fault] = field(default_factory=lambda: {name: Fault() for name in UPSTREAMS})
+    stats: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+def upstream_env(base_url: str) -> Dict[str, str]:
+    """Environment variables pointing the backend at a fake upstream server"""
+    base_url = base_url.rstrip("/")
+    return {
+        "OPENROUTER_API_KEY": "test",
+        "OPENROUTER_BASE_URL": f"{base_url}/api/v1",
+        "OPENWEATHER_API_KEY": "test",
+        "OPENWEATHER_BASE_URL": f"{base_url}/data/2.5",
+        "OPENWEATHER_GEO_URL": f"{base_url}/geo/1.0",
+        "METEOSTAT_ENDPOINT": f"{base_url}/"
+    }
+
+def _seed(*parts) -> int:
+    return int(hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()[:8], 16)
+
+def current_weather_payload(lat: float, lon: float, at: Optional[int] = None) -> dict:
+    """Build a synthetic current weather payload that varies smoothly with location and time"""
+    now = at or int(time.time())
+    phase = (now % 86400) / 86400 * 2 * math.pi
+    temp = 25 - abs(lat) * 0.4 + 5 * math.sin(phase + lon / 57.3)
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "main": {
+            "temp": round(temp, 2),
+            "feels_like": round(temp - 1, 2),
+            "pressure": 1013,
+            "humidity": int(50 + 30 * math.cos(phase))
+        },
+        "wind": {"speed": round(3 + 2 * abs(math.sin(phase)), 2), "deg": 180},
+        "dt": now,
+        "name": "Fake"
+    }
+
+def forecast_payload(lat: float, lon: float) -> dict:
+    """5 day / 3 hour forecast in the shape of /data/2.5/forecast"""
+    start = int(time.time()) // 10800 * 10800
+    entries = []
+    for step in range(40):
+        at = start + step * 10800
+        current = current_weather_payload(lat, lon, at)
+        entries.append({
+            "dt": at,
+            "main": current["main"],
+            "weather": current["weather"],
+            "wind": current["wind"],
+            "dt_txt": datetime.utcfromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S")
+        })
+    return {"cod": "200", "cnt": len(entries), "list": entries, "city": {"coord": {"lat": lat, "lon": lon}}}
+
+def country_code(city: str) -> str:
+    """ISO country code of a configured station"""
+    return COUNTRY_CODES.get(data_manager._get_country(city), "XX")
+
+def geocode_payload(query: str) -> list:
+    """Resolve a city name against the configured station list"""
+    name = query.split(",")[0].strip().lower()
+    for city, (lat, lon) in STATION_COORDINATES.items():
+        if city.lower() == name:
+            return [{"name": city, "lat": lat, "lon": lon, "country": country_code(city)}]
+    return []
+
+def chat_completion_payload(prompt: str) -> dict:
+    """
+    Answer the query parser's prompt the way the model does: a JSON object, usually
+    wrapped in a Markdown code fence. Only enough of the query is understood to give
+    the backend realistic parse results.
+    """
+    match = re.search(r"from the query: (.*)", prompt)
+    query = match.group(1).strip() if match else prompt
+    lowered = query.lower()
+    location = next((city for city in STATION_COORDINATES if city.lower() in lowered), "London")
+    days_match = re.search(r"(\d+)\s*days?", lowered)
+    duration = int(days_match.group(1)) if days_match else 30 if "month" in lowered else 7
+    current = any(word in lowered for word in ("current", "now", "right now", "like in"))
+    parsed = {
+        "location": location,
+        "duration": 1 if current else duration,
+        "direction": "current" if current else "past",
+        "intent": "current" if current else "historical",
+        "format": "chart" if "chart" in lowered or "graph" in lowered else "text" if current else "table"
+    }
+    content = f"```json\n{json.dumps(parsed, indent=2)}\n```"
+    return {
+        "id": f"gen-{_seed(query, time.time())}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "google/gemma-3-27b-it:free",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split())}
+    }
+
+def _gzip_csv(rows) -> bytes:
+    text = "\n".join(",".join("" if value is None else str(value) for value in row) for row in rows) + "\n"
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as gz:
+        gz.write(text.encode())
+    return buffer.getvalue()
+
+def meteostat_stations_file() -> bytes:
+    """stations/slim.csv.gz: one station per configured city, with daily data up to yesterday"""
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    rows = []
+    for city, station_id in STATION_IDS.items():
+        lat, lon = STATION_COORDINATES[city]
+        rows.append([
+            station_id, city, country_code(city), None, None, None, lat, lon, 50, "UTC",
+            "2000-01-01", yesterday, "2000-01-01", yesterday, "2000-01-01", yesterday
+        ])
+    return _gzip_csv(rows)
+
+def meteostat_daily_file(station_id: str) -> Optional[bytes]:
+    """daily/<station>.csv.gz: ten years of synthetic seasonal daily data"""
+    city = next((name for name, sid in STATION_IDS.items() if sid == station_id), None)
+    if city is None:
+        return None
+    lat, _ = STATION_COORDINATES[city]
+    rng = random.Random(_seed(station_id))
+    base = 25 - abs(lat) * 0.4
+    amplitude = 10 if lat >= 0 else -10
+    rows = []
+    day = date.today() - timedelta(days=3650)
+    while day < date.today():
+        season = math.cos((day.timetuple().tm_yday - 200) / 365.25 * 2 * math.pi)
+        tavg = base + amplitude * season + rng.gauss(0, 2.5)
+        rain = max(0.0, rng.gauss(-1, 4))
+        rows.append([
+            day.isoformat(), round(tavg, 1), round(tavg - 4 - rng.random() * 2, 1), round(tavg + 4 + rng.random() * 2, 1),
+            round(rain, 1), None, rng.randint(0, 359), round(8 + rng.random() * 10, 1), None,
+            round(1013 + rng.gauss(0, 6), 1), None
+        ])
+        day += timedelta(days=1)
+    return _gzip_csv(rows)
+
+def meteostat_hourly_file(station_id: str, year: int) -> Optional[bytes]:
+    """hourly/<year>/<station>.csv.gz: synthetic hourly data with a daily cycle, up to now"""
+    city = next((name for name, sid in STATION_IDS.items() if sid == station_id), None)
+    if city is None or year > date.today().year:
+        return None
+    lat, lon = STATION_COORDINATES[city]
+    rng = random.Random(_seed(station_id, year))
+    base = 25 - abs(lat) * 0.4
+    amplitude = 10 if lat >= 0 else -10
+    now = datetime.utcnow()
+    rows = []
+    hour = datetime(year, 1, 1)
+    while hour.year == year and hour < now:
+        season = math.cos((hour.timetuple().tm_yday - 200) / 365.25 * 2 * math.pi)
+        # Warmest mid-afternoon local solar time
+        local_hour = (hour.hour + lon / 15) % 24
+        daily = -4 * math.cos((local_hour - 3) / 24 * 2 * math.pi)
+        temp = base + amplitude * season + daily + rng.gauss(0, 1)
+        rows.append([
+            hour.date().isoformat(), f"{hour.hour:02d}", round(temp, 1), round(temp - 5, 1), rng.randint(40, 95),
+            round(max(0.0, rng.gauss(-0.5, 0.8)), 1), None, rng.randint(0, 359), round(8 + rng.random() * 10, 1),
+            None, round(1013 + rng.gauss(0, 4), 1), None, rng.choice([1, 2, 3, 4, 7, 8])
+        ])
+        hour += timedelta(hours=1)
+    return _gzip_csv(rows)
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    config = FaultConfig()
+    protocol_version = "HTTP/1.1"
+
+    @staticmethod
+    def _upstream(path: str) -> Optional[str]:
+        if path.startswith("/api/v1/"):
+            return "openrouter"
+        if path.startswith(("/data/2.5/", "/geo/1.0/")):
+            return "openweather"
+        if path.startswith(("/stations/", "/daily/", "/hourly/")):
+            return "meteostat"
+        return None
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload, status: int = 200):
+        self._send(json.dumps(payload).encode(), "application/json", status)
+
+    def _inject_faults(self, upstream: str) -> bool:
+        """Apply latency and maybe answer with an error. Returns True if an error was sent."""
+        fault = self.config.upstreams[upstream]
+        delay = fault.latency + (random.random() * fault.jitter if fault.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        self.config.count(upstream)
+        if fault.error_rate and random.random() < fault.error_rate:
+            self.config.count(f"{upstream}_errors")
+            self._send_json({"error": {"code": fault.error_status, "message": "Injected failure"}}, fault.error_status)
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            return self._send_json(self.config.stats)
+        upstream = self._upstream(url.path)
+        if upstream is None:
+            return self._send_json({"cod": "404", "message": "Not found"}, 404)
+        if self._inject_faults(upstream):
+            return
+
+        if url.path.endswith(("/data/2.5/weather", "/data/2.5/forecast")):
+            try:
+                lat, lon = float(params["lat"]), float(params["lon"])
+            except (KeyError, ValueError):
+                return self._send_json({"cod": "400", "message": "wrong latitude"}, 400)
+            if url.path.endswith("/weather"):
+                return self._send_json(current_weather_payload(lat, lon))
+            return self._send_json(forecast_payload(lat, lon))
+        if url.path.endswith("/geo/1.0/direct"):
+            return self._send_json(geocode_payload(params.get("q", "")))
+        if url.path == "/stations/slim.csv.gz":
+            return self._send(meteostat_stations_file(), "application/gzip")
+        daily = re.fullmatch(r"/daily/(\w+)\.csv\.gz", url.path)
+        if daily:
+            body = meteostat_daily_file(daily.group(1))
+            if body is not None:
+                return self._send(body, "application/gzip")
+        hourly = re.fullmatch(r"/hourly/(\d{4})/(\w+)\.csv\.gz", url.path)
+        if hourly:
+            body = meteostat_hourly_file(hourly.group(2), int(hourly.group(1)))
+            if body is not None:
+                return self._send(body, "application/gzip")
+        self._send_json({"cod": "404", "message": "Not found"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        upstream = self._upstream(url.path)
+        if upstream != "openrouter" or not url.path.endswith("/chat/completions"):
+            return self._send_json({"error": {"code": 404, "message": "Not found"}}, 404)
+        if self._inject_faults(upstream):
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send_json({"error": {"code": 401, "message": "No auth credentials found"}}, 401)
+        messages = payload.get("messages") or [{}]
+        self._send_json(chat_completion_payload(messages[-1].get("content", "")))
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def _apply_option(config: FaultConfig, attribute: str, values, cast) -> None:
+    """Apply "value" (every upstream) or "upstream=value" options in the order given"""
+    for value in values or []:
+        name, _, raw = value.rpartition("=")
+        targets = [name] if name else list(UPSTREAMS)
+        for target in targets:
+            if target not in config.upstreams:
+                raise SystemExit(f"Unknown upstream {target!r}, expected one of {', '.join(UPSTREAMS)}")
+            setattr(config.upstreams[target], attribute, cast(raw))
+
+def build_config(args: argparse.Namespace) -> FaultConfig:
+    config = FaultConfig()
+    _apply_option(config, "latency", args.latency, float)
+    _apply_option(config, "jitter", args.jitter, float)
+    _apply_option(config, "error_rate", args.error_rate, float)
+    _apply_option(config, "error_status", args.error_status, int)
+    return config
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    help_suffix = "; VALUE or UPSTREAM=VALUE, repeatable"
+    parser.add_argument("--latency", action="append", help="Seconds of latency per request" + help_suffix)
+    parser.add_argument("--jitter", action="append", help="Extra random latency in seconds" + help_suffix)
+    parser.add_argument("--error-rate", action="append", help="Fraction of requests that fail" + help_suffix)
+    parser.add_argument("--error-status", action="append", help="HTTP status of injected failures" + help_suffix)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake OpenRouter, OpenWeather and Meteostat servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    FakeUpstreamHandler.config = build_config(args)
+    server = ThreadingHTTPServer((args.host, args.port), FakeUpstreamHandler)
+    server.daemon_threads = True
+    base_url = f"http://{args.host}:{args.port}"
+    logger.info(f"Fake upstreams listening on {base_url}")
+    for name, fault in FakeUpstreamHandler.config.upstreams.items():
+        logger.info(f"  {name}: {fault}")
+    logger.info("Backend environment:\n" + "\n".join(f"  {key}={value}" for key, value in upstream_env(base_url).items()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
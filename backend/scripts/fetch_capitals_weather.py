@@ -1,9 +1,14 @@
 import pandas as pd
 from datetime import datetime, timedelta
-from meteostat import Point, Daily
+from meteostat import Point, Daily, Hourly
+import argparse
 import logging
 from pathlib import Path
 import os
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from app.utils.hourly_store import hourly_store, METEOSTAT_HOURLY_COLUMNS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -82,7 +87,37 @@ def fetch_weather_data(city: str, lat: float, lon: float, start_date: datetime,
         logger.error(f"Error fetching data for {city}: {e}")
         return pd.DataFrame()
 
+def fetch_hourly_data(city: str, lat: float, lon: float, start_date: datetime, end_date: datetime) -> int:
+    """Fetch hourly weather data for a city using Meteostat and add it to the hourly store."""
+    try:
+        logger.info(f"Fetching hourly weather data for {city}")
+        data = Hourly(Point(lat, lon), start_date, end_date).fetch()
+        if data.empty:
+            return 0
+        data = data.reset_index().rename(columns=METEOSTAT_HOURLY_COLUMNS)
+        return hourly_store.write(city, data)
+    except Exception as e:
+        logger.error(f"Error fetching hourly data for {city}: {e}")
+        return 0
+
+def main_hourly(days: int):
+    """Backfill the hourly store (partitioned by station and month) for every capital"""
+    end_date = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    total = 0
+    for city, (lat, lon) in CAPITAL_CITIES.items():
+        total += fetch_hourly_data(city, lat, lon, start_date, end_date)
+    logger.info(f"Stored {total} hourly rows under {hourly_store.root}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Fetch weather history for the capital cities from Meteostat")
+    parser.add_argument("--hourly", action="store_true", help="Backfill the hourly store instead of the daily CSV")
+    parser.add_argument("--days", type=int, default=90, help="Days of hourly history to backfill")
+    args = parser.parse_args()
+    if args.hourly:
+        main_hourly(args.days)
+        return
+    
     # Create data directory if it doesn't exist
     data_dir = Path("data/weather")
     data_dir.mkdir(parents=True, exist_ok=True)
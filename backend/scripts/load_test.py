@@ -0,0 +1,304 @@
+"""
+Open-loop load test for the analyze and historical routes.
+
+Requests are fired on a fixed schedule at each target rate of a ramp, whether or
+not earlier requests have finished, and latency is measured from the scheduled
+send time so a slow server cannot hide its queueing. Requests shed by admission
+control (503) or refused by the per-client cap (429) are counted apart from
+failures. A stage is saturated when the error rate, shed rate, p95 latency or
+achieved throughput misses its target; the saturation point is the last target
+rate before that.
+
+Every request comes from this one client, so against a running server
+ADMISSION_MAX_PER_CLIENT caps the load it can apply; spawned servers get a cap
+above --max-in-flight.
+
+Against a running server:
+    python scripts/load_test.py --base-url http://127.0.0.1:8000 --workers 2 --rps 5,10,20,40
+
+Spawning the fake upstreams and one server per worker count:
+    python scripts/load_test.py --spawn --workers 1,2,4 --rps 5,10,20,40,80 --latency openrouter=0.8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+from app.utils.data_loader import data_manager
+from scripts.fake_upstreams import add_fault_arguments, upstream_env
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+FALLBACK_QUERIES = [
+    "Show me the weather in London for the past 7 days",
+    "What was the temperature in Paris last month as a chart?",
+    "Give me a table of the weather in Tokyo for the past 14 days"
+]
+
+@dataclass
+class StageResult:
+    target_rps: float
+    sent: int
+    ok: int
+    errors: int
+    shed: int  # 503 from admission control
+    throttled: int  # 429 from the per-client cap
+    achieved_rps: float
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+    saturated: bool
+    reason: str = ""
+
+class RequestMix:
+    """Weighted mix of analyze and historical requests"""
+
+    def __init__(self, base_url: str, weights: Dict[str, float], rng: random.Random):
+        self.base_url = base_url.rstrip("/")
+        self.rng = rng
+        self.kinds = [kind for kind, weight in weights.items() if weight > 0]
+        self.weights = [weights[kind] for kind in self.kinds]
+        self.queries = self._load_queries()
+        weather = data_manager.cache["weather"]
+        self.cities = data_manager.station_names()
+        self.first_day, self.last_day = weather["date"].min(), weather["date"].max()
+
+    def _load_queries(self) -> List[str]:
+        try:
+            response = requests.get(f"{self.base_url}/api/sample-queries", timeout=10)
+            response.raise_for_status()
+            return response.json() or FALLBACK_QUERIES
+        except requests.RequestException:
+            return FALLBACK_QUERIES
+
+    def next(self) -> Tuple[str, Callable[[requests.Session, float], requests.Response]]:
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "analyze":
+            query = self.rng.choice(self.queries)
+            return kind, lambda session, timeout: session.post(
+                f"{self.base_url}/api/weather/analyze", json={"query": query}, timeout=timeout
+            )
+        days = self.rng.choice([7, 30, 90, 365])
+        span = max((self.last_day - self.first_day).days - days, 0)
+        end = self.first_day + np.timedelta64(days + self.rng.randint(0, span), "D")
+        params = {"city": self.rng.choice(self.cities), "end_date": f"{end:%Y-%m-%d}", "days": days}
+        return kind, lambda session, timeout: session.get(
+            f"{self.base_url}/api/weather/historical", params=params, timeout=timeout
+        )
+
+_local = threading.local()
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def run_stage(mix: RequestMix, rps: float, duration: float, timeout: float, max_in_flight: int,
+              slo_p95: float, max_error_rate: float) -> StageResult:
+    latencies: List[float] = []
+    outcomes = {"errors": 0, "shed": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    def fire(send, scheduled: float) -> None:
+        try:
+            status = send(_session(), timeout).status_code
+        except requests.RequestException:
+            status = None
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            if status is not None and status < 400:
+                latencies.append(elapsed)
+            elif status == 503:
+                outcomes["shed"] += 1
+            elif status == 429:
+                outcomes["throttled"] += 1
+            else:
+                outcomes["errors"] += 1
+
+    total = int(rps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for index in range(total):
+            scheduled = start + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            _, send = mix.next()
+            executor.submit(fire, send, scheduled)
+    elapsed = max(time.perf_counter() - start, duration)
+
+    ok = len(latencies)
+    achieved = ok / elapsed
+    quantiles = np.percentile(latencies, [50, 95, 99]).tolist() if latencies else [None, None, None]
+    errors, shed, throttled = outcomes["errors"], outcomes["shed"], outcomes["throttled"]
+    error_rate = errors / total if total else 0.0
+    shed_rate = shed / total if total else 0.0
+    reasons = []
+    if error_rate > max_error_rate:
+        reasons.append(f"error rate {error_rate:.1%}")
+    if shed_rate > max_error_rate:
+        reasons.append(f"shed rate {shed_rate:.1%}")
+    if throttled:
+        reasons.append(f"{throttled} over the per-client cap")
+    if quantiles[1] is None or quantiles[1] > slo_p95:
+        reasons.append(f"p95 above {slo_p95}s")
+    if achieved < 0.9 * rps:
+        reasons.append(f"throughput {achieved:.1f} rps")
+    return StageResult(
+        target_rps=rps, sent=total, ok=ok, errors=errors, shed=shed, throttled=throttled,
+        achieved_rps=round(achieved, 2),
+        p50=quantiles[0], p95=quantiles[1], p99=quantiles[2],
+        saturated=bool(reasons), reason=", ".join(reasons)
+    )
+
+def run_ramp(base_url: str, args: argparse.Namespace) -> List[StageResult]:
+    mix = RequestMix(base_url, args.mix, random.Random(args.seed))
+    results = []
+    for rps in args.rps:
+        result = run_stage(mix, rps, args.duration, args.timeout, args.max_in_flight, args.slo_p95, args.max_error_rate)
+        results.append(result)
+        p95 = f"{result.p95:.3f}s" if result.p95 is not None else "n/a"
+        logger.info(
+            f"  {rps:>7.1f} rps -> {result.achieved_rps:>7.2f} rps ok, "
+            f"{result.errors} errors, {result.shed} shed, {result.throttled} throttled, p95 {p95}"
+            + (f"  SATURATED ({result.reason})" if result.saturated else "")
+        )
+        if result.saturated:
+            break
+    return results
+
+def saturation_point(results: List[StageResult]) -> float:
+    healthy = [result.target_rps for result in results if not result.saturated]
+    return max(healthy) if healthy else 0.0
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float, successes: int = 1) -> None:
+    """Wait until `url` has answered 200 `successes` times in a row"""
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            streak = streak + 1 if requests.get(url, timeout=2).status_code == 200 else 0
+        except requests.RequestException:
+            streak = 0
+        if streak >= successes:
+            return
+        time.sleep(0.5 if streak == 0 else 0.05)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+@contextmanager
+def _spawned(command: List[str], url: str, env: Dict[str, str], timeout: float, successes: int = 1) -> Iterator[None]:
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        _wait_until_up(url, process, timeout, successes)
+        yield
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def _fault_flags(args: argparse.Namespace) -> List[str]:
+    flags = []
+    for option in ("latency", "jitter", "error_rate", "error_status"):
+        for value in getattr(args, option) or []:
+            flags += [f"--{option.replace('_', '-')}", value]
+    return flags
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    weights = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("analyze", "historical"):
+            raise argparse.ArgumentTypeError(f"Unknown request kind {kind!r}")
+        weights[kind] = float(weight or 1)
+    return weights
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the saturation point of the WeatherAI API per worker")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server to test when not spawning")
+    parser.add_argument("--spawn", action="store_true", help="Start fake upstreams and one server per worker count")
+    parser.add_argument("--workers", default="1", help="Worker count(s) of the server, e.g. 1,2,4")
+    parser.add_argument("--rps", default="2,5,10,20,40,80", help="Comma-separated target rates of the ramp")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per stage")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("analyze=1,historical=1"))
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--slo-p95", type=float, default=2.0, help="p95 latency above which a stage is saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Client-side concurrency cap")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    args.rps = [float(value) for value in args.rps.split(",")]
+    worker_counts = [int(value) for value in args.workers.split(",")]
+
+    report = []
+    if args.spawn:
+        upstream_port = _free_port()
+        upstream_url = f"http://127.0.0.1:{upstream_port}"
+        env = {**os.environ, **upstream_env(upstream_url)}
+        # All requests come from this client; keep the per-client cap out of the measurement
+        env["ADMISSION_MAX_PER_CLIENT"] = str(args.max_in_flight + 1)
+        fake = [sys.executable, "scripts/fake_upstreams.py", "--port", str(upstream_port), *_fault_flags(args)]
+        with _spawned(fake, f"{upstream_url}/_stats", env, timeout=60):
+            for workers in worker_counts:
+                port = _free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                server = [
+                    sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                    "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+                ]
+                logger.info(f"workers={workers}")
+                # Ramp only once warm-up is done; workers share the port, so ask each of them
+                # (most likely) by wanting several ready answers in a row
+                with _spawned(server, f"{base_url}/readyz", env, timeout=300, successes=4 * workers):
+                    results = run_ramp(base_url, args)
+                report.append((workers, results))
+    else:
+        logger.info(f"workers={worker_counts[0]} at {args.base_url}")
+        report.append((worker_counts[0], run_ramp(args.base_url, args)))
+
+    logger.info("\nSaturation point")
+    for workers, results in report:
+        point = saturation_point(results)
+        logger.info(f"  workers={workers}: {point:.1f} rps total, {point / workers:.1f} rps per worker")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([
+                {
+                    "workers": workers,
+                    "saturation_rps": saturation_point(results),
+                    "saturation_rps_per_worker": saturation_point(results) / workers,
+                    "stages": [asdict(result) for result in results]
+                }
+                for workers, results in report
+            ], f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -34,14 +34,16 @@ function App() {
             const result = await weatherService.analyzeWeather(query);
             console.log('Received result:', result);
             
-            // Set the display format based on the response
-            setDisplayFormat(result.format ?? null);
+            // Set the display format based on the response. Responses without rows
+            // (e.g. multi-city comparisons) are shown as their text summary.
+            const hasRows = Array.isArray(result.data) && result.data.length > 0;
+            setDisplayFormat(hasRows ? (result.format ?? null) : 'text');
             
             if (result.text_summary) {
                 setTextSummary(result.text_summary);
             }
             
-            if (result.data && Array.isArray(result.data)) {
+            if (hasRows) {
                 // Map the data to the expected format
                 const mappedData = result.data.map((item: WeatherForecast) => ({
                     date: item.date,
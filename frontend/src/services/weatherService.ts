@@ -1,66 +1,108 @@
-import { WeatherData, WeatherChartData, WeatherTableData } from '../types/weather';
+import { WeatherData, WeatherForecast, WeatherChartData, WeatherTableData, WeatherColumns } from '../types/weather';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// Ask the weather endpoints for one array per field instead of a list of rows
+const COLUMNAR_JSON = 'application/vnd.weatherai.columnar+json';
+// How long a fetched range is reused before it is requested again
+const CACHE_TTL_MS = 60 * 1000;
+const CACHE_MAX_ENTRIES = 32;
+
+interface CacheEntry {
+    expires: number;
+    columns: Promise<WeatherColumns>;
+}
+
 class WeatherService {
-    async getWeatherData(city: string): Promise<WeatherData> {
-        const response = await fetch(`${API_BASE_URL}/api/weather/forecast?city=${encodeURIComponent(city)}&days=7`);
-        if (!response.ok) {
-            throw new Error('Failed to fetch weather data');
+    // Fetched (and in-flight) columns by endpoint, city and range. Keeping the promise means
+    // the chart, table and cards of the same city share a single request.
+    private cache = new Map<string, CacheEntry>();
+
+    private fetchColumns(key: string, url: string, errorMessage: string): Promise<WeatherColumns> {
+        const now = Date.now();
+        const cached = this.cache.get(key);
+        if (cached && cached.expires > now) {
+            return cached.columns;
         }
-        const data = await response.json();
-        // Map backend response to frontend WeatherData
-        return {
-            city: data.city,
-            forecast: data.forecast.map((item: any) => ({
-                date: item.date,
-                temperature: item.temperature,
-                humidity: item.humidity,
-                windSpeed: item.windSpeed,
-                pressure: item.pressure,
-                description: item.description,
-                icon: item.icon,
-                city: item.city
-            }))
-        };
+        const columns = fetch(url, { headers: { Accept: COLUMNAR_JSON } }).then(response => {
+            if (!response.ok) {
+                throw new Error(errorMessage);
+            }
+            return response.json() as Promise<WeatherColumns>;
+        });
+        this.cache.delete(key);
+        this.cache.set(key, { expires: now + CACHE_TTL_MS, columns });
+        // Failed requests are not cached, the next call tries again
+        columns.catch(() => {
+            if (this.cache.get(key)?.columns === columns) {
+                this.cache.delete(key);
+            }
+        });
+        // Maps iterate in insertion order, so the first key is the oldest entry
+        while (this.cache.size > CACHE_MAX_ENTRIES) {
+            this.cache.delete(this.cache.keys().next().value as string);
+        }
+        return columns;
     }
 
-    async getWeatherChart(city: string): Promise<WeatherChartData> {
-        // Use the same forecast endpoint and map to chart data
-        const response = await fetch(`${API_BASE_URL}/api/weather/forecast?city=${encodeURIComponent(city)}&days=7`);
-        if (!response.ok) {
-            throw new Error('Failed to fetch weather chart data');
+    getForecastColumns(city: string, days: number = 7): Promise<WeatherColumns> {
+        return this.fetchColumns(
+            `forecast:${city.trim().toLowerCase()}:${days}`,
+            `${API_BASE_URL}/api/weather/forecast?city=${encodeURIComponent(city)}&days=${days}`,
+            'Failed to fetch weather data'
+        );
+    }
+
+    getHistoricalColumns(city: string, days: number = 7): Promise<WeatherColumns> {
+        return this.fetchColumns(
+            `historical:${city.trim().toLowerCase()}:${days}`,
+            `${API_BASE_URL}/api/weather/historical?city=${encodeURIComponent(city)}&days=${days}`,
+            'Failed to fetch historical weather data'
+        );
+    }
+
+    clearCache(): void {
+        this.cache.clear();
+    }
+
+    private toWeatherData(city: string, data: WeatherColumns): WeatherData {
+        const { columns } = data;
+        const forecast: WeatherForecast[] = [];
+        for (let i = 0; i < data.length; i++) {
+            forecast.push({
+                date: columns.date[i],
+                temperature: columns.temperature[i],
+                humidity: columns.humidity[i],
+                windSpeed: columns.windSpeed[i],
+                pressure: columns.pressure[i],
+                description: columns.description ? columns.description[i] : '',
+                icon: columns.icon ? columns.icon[i] : '',
+                city: columns.city ? columns.city[i] : data.city || city
+            });
         }
-        const data = await response.json();
-        const dates: string[] = [];
-        const temperatures: number[] = [];
-        const humidity: number[] = [];
-        const windSpeed: number[] = [];
-        const pressure: number[] = [];
-        data.forecast.forEach((item: any) => {
-            dates.push(item.date);
-            temperatures.push(item.temperature);
-            humidity.push(item.humidity);
-            windSpeed.push(item.windSpeed);
-            pressure.push(item.pressure);
-        });
-        return { dates, temperatures, humidity, windSpeed, pressure };
+        return { city: data.city || city, forecast };
+    }
+
+    async getWeatherData(city: string): Promise<WeatherData> {
+        return this.toWeatherData(city, await this.getForecastColumns(city));
+    }
+
+    async getWeatherChart(city: string): Promise<WeatherChartData> {
+        // The columns are the chart series, no per-row mapping needed
+        const { columns } = await this.getForecastColumns(city);
+        return {
+            dates: columns.date,
+            temperatures: columns.temperature,
+            humidity: columns.humidity,
+            windSpeed: columns.windSpeed,
+            pressure: columns.pressure
+        };
     }
 
     async getWeatherTable(city: string): Promise<WeatherTableData[]> {
-        // Use the same forecast endpoint and map to table data
-        const response = await fetch(`${API_BASE_URL}/api/weather/forecast?city=${encodeURIComponent(city)}&days=7`);
-        if (!response.ok) {
-            throw new Error('Failed to fetch weather table data');
-        }
-        const data = await response.json();
-        return data.forecast.map((item: any) => ({
-            date: item.date,
-            temperature: item.temperature,
-            humidity: item.humidity,
-            windSpeed: item.windSpeed,
-            pressure: item.pressure,
-            description: item.description
+        const { forecast } = await this.getWeatherData(city);
+        return forecast.map(({ date, temperature, humidity, windSpeed, pressure, description }) => ({
+            date, temperature, humidity, windSpeed, pressure, description
         }));
     }
 
@@ -77,25 +119,7 @@ class WeatherService {
     }
 
     async getHistoricalWeather(city: string, days: number = 7): Promise<WeatherData> {
-        const response = await fetch(`${API_BASE_URL}/api/weather/historical?city=${encodeURIComponent(city)}&days=${days}`);
-        if (!response.ok) {
-            throw new Error('Failed to fetch historical weather data');
-        }
-        const data = await response.json();
-        // Map backend response to frontend WeatherData
-        return {
-            city: city,
-            forecast: data.map((item: any) => ({
-                date: item.date,
-                temperature: item.temperature,
-                humidity: item.humidity,
-                windSpeed: item.windSpeed,
-                pressure: item.pressure,
-                description: item.description,
-                icon: item.icon,
-                city: item.city
-            }))
-        };
+        return this.toWeatherData(city, await this.getHistoricalColumns(city, days));
     }
 
     async getSampleQueries(): Promise<string[]> {
@@ -107,4 +131,4 @@ class WeatherService {
     }
 }
 
-export const weatherService = new WeatherService(); 
\ No newline at end of file
+export const weatherService = new WeatherService();
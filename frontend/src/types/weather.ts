@@ -14,6 +14,24 @@ export interface WeatherData {
     forecast: WeatherForecast[];
 }
 
+// Columnar payload of the weather endpoints: one array per field, all of `length` items.
+// `city` is hoisted out of the columns when every row belongs to the same city.
+export interface WeatherColumns {
+    city: string | null;
+    length: number;
+    columns: {
+        date: string[];
+        temperature: number[];
+        humidity: number[];
+        windSpeed: number[];
+        pressure: number[];
+        description: string[];
+        icon: string[];
+        city?: string[];
+        [field: string]: (string | number | null)[] | undefined;
+    };
+}
+
 export interface WeatherChartData {
     dates: string[];
     temperatures: number[];